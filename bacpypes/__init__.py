@@ -42,6 +42,7 @@ import constructeddata
 import basetypes
 
 import object
+import objectstore
 
 import apdu
 
@@ -6,28 +6,75 @@ Analysis - Decoding pcap files
 
 import sys
 import time
+import errno
+import asyncore
+import mmap
+import heapq
+import bisect
+import signal
 import socket
 import struct
+import multiprocessing
 
-pcap = None
+from collections import deque, namedtuple, OrderedDict, Counter
+
+numpy = None
+try:
+    import numpy
+except ImportError:
+    pass
+
+pyarrow = None
 try:
-    import pcap
-except:
+    import pyarrow
+except ImportError:
     pass
 
-from debugging import ModuleLogger, DebugContents, bacpypes_debugging
+from debugging import ModuleLogger, DebugContents, bacpypes_debugging, OctetRing
 
-from pdu import PDU, Address
-from bvll import BVLPDU, bvl_pdu_types, ForwardedNPDU, \
+from core import run, deferred
+from task import RecurringTask
+from packettrace import PACKET_TRACE_MAGIC, UDP_FRAME, TCP_DATA, _file_header, _record_header, \
+    udp_frame, tcp_frame, read_packet_trace, parse_packet_trace_record
+
+from pdu import PDU, Address, unpack_ip_addr
+from bvll import BVLCI, BVLPDU, bvl_pdu_types, ForwardedNPDU, \
     DistributeBroadcastToNetwork, OriginalUnicastNPDU, OriginalBroadcastNPDU
 from npdu import NPDU, npdu_types
 from apdu import APDU, apdu_types, confirmed_request_types, unconfirmed_request_types, complex_ack_types, error_types, \
-    ConfirmedRequestPDU, UnconfirmedRequestPDU, SimpleAckPDU, ComplexAckPDU, SegmentAckPDU, ErrorPDU, RejectPDU, AbortPDU
+    ConfirmedRequestPDU, UnconfirmedRequestPDU, SimpleAckPDU, ComplexAckPDU, SegmentAckPDU, ErrorPDU, RejectPDU, AbortPDU, \
+    WhoIsRequest
 
 # some debugging
 _debug = 0
 _log = ModuleLogger(globals())
 
+# pcap and pcapng magic numbers
+PCAP_MAGIC = 0xA1B2C3D4
+PCAP_NSEC_MAGIC = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# pcapng block types that carry packets
+PCAPNG_IDB = 1
+PCAPNG_OPB = 2
+PCAPNG_SPB = 3
+PCAPNG_EPB = 6
+
+# number of records given to a worker process at a time
+DECODE_CHUNK_RECORDS = 20000
+
+# the UDP header
+_udp_header = struct.Struct('!HHH')
+
+# BVLL functions that carry an NPDU and the offset to it
+_bvll_npdu_offsets = {
+    BVLCI.forwardedNPDU: 10,
+    BVLCI.distributeBroadcastToNetwork: 4,
+    BVLCI.originalUnicastNPDU: 4,
+    BVLCI.originalBroadcastNPDU: 4,
+    }
+
 # protocol map
 _protocols={socket.IPPROTO_TCP:'tcp',
            socket.IPPROTO_UDP:'udp',
@@ -342,42 +389,662 @@ def decode_packet(data):
         # success
         return npdu
 
+#
+#   PacketHeaders
+#
+#   The offsets and a few interesting octets of the layers of a BACnet/IP
+#   packet, fields that do not apply to the packet are None.
+#
+
+PacketHeaders = namedtuple('PacketHeaders',
+    'ipOffset udpOffset sourcePort destinationPort '
+    'bvlciFunction npduOffset npduNetMessage apduOffset apduType apduService'
+    )
+
+#
+#   packet_headers
+#
+
+def packet_headers(data):
+    """Look at just enough of the packet to find its layers, return a
+    PacketHeaders tuple or None if it is not a BACnet/IP packet."""
+    try:
+        # assume it is ethernet, there could be a VLAN header
+        ip = 14
+        ether_type = (ord(data[12]) << 8) + ord(data[13])
+        if ether_type == 0x8100:
+            ip = 18
+            ether_type = (ord(data[16]) << 8) + ord(data[17])
+        if ether_type != 0x0800:
+            return None
+
+        # look for UDP
+        if ord(data[ip + 9]) != socket.IPPROTO_UDP:
+            return None
+        udp = ip + 4 * (ord(data[ip]) & 0x0F)
+        source_port, destination_port, length = _udp_header.unpack_from(data, udp)
+
+        # check for empty
+        start = udp + 8
+        if (length <= 8) or (start >= len(data)):
+            return None
+
+        # check for a BVLL header
+        if data[start] == '\x81':
+            function = ord(data[start + 1])
+            if function not in _bvll_npdu_offsets:
+                return PacketHeaders(ip, udp, source_port, destination_port,
+                    function, None, None, None, None, None)
+            npdu = start + _bvll_npdu_offsets[function]
+        else:
+            function = None
+            npdu = start
+
+        # check for version number
+        if data[npdu] != '\x01':
+            return None
+
+        # skip over the addresses and hop count
+        control = ord(data[npdu + 1])
+        apdu = npdu + 2
+        if control & 0x20:
+            apdu += 3 + ord(data[apdu + 2])
+        if control & 0x08:
+            apdu += 3 + ord(data[apdu + 2])
+        if control & 0x20:
+            apdu += 1
+
+        # network layer message
+        if control & 0x80:
+            return PacketHeaders(ip, udp, source_port, destination_port,
+                function, npdu, ord(data[apdu]), None, None, None)
+
+        # the service choice follows the invoke ID and segment numbers
+        octet = ord(data[apdu])
+        apdu_type = octet >> 4
+        if apdu_type == 0:
+            service = ord(data[apdu + (5 if octet & 0x08 else 3)])
+        elif apdu_type == 1:
+            service = ord(data[apdu + 1])
+        elif apdu_type == 3:
+            service = ord(data[apdu + (4 if octet & 0x08 else 2)])
+        elif apdu_type in (2, 5):
+            service = ord(data[apdu + 2])
+        else:
+            service = None
+
+        return PacketHeaders(ip, udp, source_port, destination_port,
+            function, npdu, None, apdu, apdu_type, service)
+
+    except (IndexError, struct.error):
+        return None
+
+#
+#   PacketFilter
+#
+
+@bacpypes_debugging
+class PacketFilter(DebugContents):
+
+    """A pre-filter applied to the PacketHeaders of a packet before it is
+    decoded.  Each kind of filter that is given must match, the APDU types
+    and classes match when either one does."""
+
+    _debug_contents = ('ports', 'bvlciFunctions', 'apduTypes', 'apduServices')
+
+    def __init__(self, ports=None, bvlciFunctions=None, apduTypes=None, apduClasses=None):
+        if _debug: PacketFilter._debug("__init__ ports=%r bvlciFunctions=%r apduTypes=%r apduClasses=%r", ports, bvlciFunctions, apduTypes, apduClasses)
+
+        self.ports = set(ports or ())
+        self.bvlciFunctions = set(bvlciFunctions or ())
+        self.apduTypes = set(apduTypes or ())
+        self.apduServices = set()
+
+        # classes with a service choice match the type and service, the
+        # others like SimpleAckPDU match the type
+        for klass in (apduClasses or ()):
+            if hasattr(klass, 'serviceChoice'):
+                self.apduServices.add((klass.pduType, klass.serviceChoice))
+            else:
+                self.apduTypes.add(klass.pduType)
+
+    def __call__(self, headers):
+        if self.ports and (headers.sourcePort not in self.ports) \
+                and (headers.destinationPort not in self.ports):
+            return False
+        if self.bvlciFunctions and (headers.bvlciFunction not in self.bvlciFunctions):
+            return False
+        if self.apduTypes or self.apduServices:
+            if (headers.apduType not in self.apduTypes) and \
+                    ((headers.apduType, headers.apduService) not in self.apduServices):
+                return False
+        return True
+
+#
+#   _lazy_attribute
+#
+
+class _lazy_attribute(object):
+
+    """Compute the value of an attribute the first time it is referenced
+    and save it in the object so the function is not called again."""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.__name__ = fn.__name__
+        self.__doc__ = fn.__doc__
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = obj.__dict__[self.__name__] = self.fn(obj)
+        return value
+
+#
+#   LazyPacket
+#
+
+@bacpypes_debugging
+class LazyPacket(DebugContents):
+
+    """A view of a packet that decodes each layer the first time it is
+    referenced.  The addresses come from the IP, UDP and BVLL headers
+    unless there are network layer addresses, other attributes come from
+    the completely decoded packet in the pdu attribute."""
+
+    _debug_contents = ('headers', 'pduSource', 'pduDestination')
+
+    def __init__(self, data, headers=None):
+        if _debug: LazyPacket._debug("__init__ ...")
+
+        self.data = data
+        self.headers = headers or packet_headers(data)
+
+    @property
+    def bvlciFunction(self):
+        return self.headers.bvlciFunction
+
+    @property
+    def npduNetMessage(self):
+        return self.headers.npduNetMessage
+
+    @property
+    def apduType(self):
+        return self.headers.apduType
+
+    @property
+    def apduService(self):
+        return self.headers.apduService
+
+    def _apdu_octet(self, offset):
+        return ord(self.data[self.headers.apduOffset + offset])
+
+    @property
+    def apduInvokeID(self):
+        apdu_type = self.headers.apduType
+        if apdu_type == ConfirmedRequestPDU.pduType:
+            return self._apdu_octet(2)
+        elif (apdu_type is None) or (apdu_type == UnconfirmedRequestPDU.pduType):
+            return None
+        return self._apdu_octet(1)
+
+    @property
+    def apduSeg(self):
+        if self.headers.apduType in (ConfirmedRequestPDU.pduType, ComplexAckPDU.pduType):
+            return (self._apdu_octet(0) & 0x08) != 0
+        return False
+
+    @property
+    def apduMor(self):
+        if self.headers.apduType in (ConfirmedRequestPDU.pduType, ComplexAckPDU.pduType):
+            return (self._apdu_octet(0) & 0x04) != 0
+        return False
+
+    @property
+    def apduSeq(self):
+        apdu_type = self.headers.apduType
+        if apdu_type == SegmentAckPDU.pduType:
+            return self._apdu_octet(2)
+        if not self.apduSeg:
+            return None
+        return self._apdu_octet(3 if apdu_type == ConfirmedRequestPDU.pduType else 2)
+
+    @property
+    def apduSrv(self):
+        if self.headers.apduType in (SegmentAckPDU.pduType, AbortPDU.pduType):
+            return (self._apdu_octet(0) & 0x01) != 0
+        return None
+
+    @_lazy_attribute
+    def ethernet(self):
+        return decode_ethernet(self.data)
+
+    @_lazy_attribute
+    def ip(self):
+        return decode_ip(self.data[self.headers.ipOffset:])
+
+    @_lazy_attribute
+    def udp(self):
+        return decode_udp(self.data[self.headers.udpOffset:])
+
+    def _network_addresses(self):
+        """Return true if the NPDU has addresses, for an APDU or a network
+        layer message, so the addresses come from the decoded packet."""
+        headers = self.headers
+        return (headers.npduOffset is not None) and (ord(self.data[headers.npduOffset + 1]) & 0x28)
+
+    @_lazy_attribute
+    def pduSource(self):
+        if self._network_addresses():
+            return self.pdu.pduSource
+
+        # lift the address for forwarded NPDU's
+        headers = self.headers
+        if headers.bvlciFunction == BVLCI.forwardedNPDU:
+            return Address(unpack_ip_addr(self.data[headers.npduOffset - 6:headers.npduOffset]))
+
+        ip = headers.ipOffset
+        return Address((socket.inet_ntoa(self.data[ip + 12:ip + 16]), headers.sourcePort))
+
+    @_lazy_attribute
+    def pduDestination(self):
+        if self._network_addresses():
+            return self.pdu.pduDestination
+
+        headers = self.headers
+        ip = headers.ipOffset
+        return Address((socket.inet_ntoa(self.data[ip + 16:ip + 20]), headers.destinationPort))
+
+    @_lazy_attribute
+    def pdu(self):
+        pdu = decode_packet(self.data)
+        if pdu:
+            for attr in ('_index', '_timestamp'):
+                if attr in self.__dict__:
+                    setattr(pdu, attr, self.__dict__[attr])
+        return pdu
+
+    def __getattr__(self, attr):
+        # private and special names are not passed along
+        if attr.startswith('_'):
+            raise AttributeError, attr
+
+        return getattr(self.pdu, attr)
+
+#
+#   PcapReader
+#
+
+@bacpypes_debugging
+class PcapReader(DebugContents):
+
+    """Read the records of a pcap or pcapng file without libpcap.  The file
+    is memory mapped so the records are read as the operating system pages
+    them in and the reader can be positioned at any record offset, which is
+    how a capture is split up between decoding processes.  The frames in a
+    binary packet trace dump are read the same way."""
+
+    _debug_contents = ('fname', 'format', 'state')
+
+    def __init__(self, fname):
+        if _debug: PcapReader._debug("__init__ %r", fname)
+
+        self.fname = fname
+        self.file = open(fname, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            self.file.close()
+            raise ValueError, "empty or unreadable capture file: %r" % (fname,)
+
+        # figure out the format from the magic number
+        if len(self.data) < 12:
+            self.close()
+            raise ValueError, "not a pcap or pcapng file: %r" % (fname,)
+        magic = struct.unpack_from('<I', self.data, 0)[0]
+
+        if magic in (PCAP_MAGIC, PCAP_NSEC_MAGIC):
+            endian = '<'
+        elif struct.unpack_from('>I', self.data, 0)[0] in (PCAP_MAGIC, PCAP_NSEC_MAGIC):
+            endian = '>'
+            magic = struct.unpack_from('>I', self.data, 0)[0]
+        elif magic == PCAPNG_SHB:
+            endian = None
+        elif self.data[:4] == PACKET_TRACE_MAGIC:
+            endian = False
+        else:
+            self.close()
+            raise ValueError, "not a pcap or pcapng file: %r" % (fname,)
+
+        if endian is False:
+            self.format = 'bptr'
+            self.start = _file_header.size
+
+            # the records are all the same, there is no state
+            self.state = (None, ())
+
+        elif endian:
+            self.format = 'pcap'
+            self.start = 24
+
+            # the state is the byte order and the timestamp resolution
+            self.state = (endian, (1e9 if magic == PCAP_NSEC_MAGIC else 1e6,))
+        else:
+            self.format = 'pcapng'
+            self.start = 0
+
+            # the section header sets the state as it is read
+            self.state = (None, ())
+
+    def close(self):
+        if _debug: PcapReader._debug("close")
+
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    def _headers(self, start, end, state):
+        """Generate (offset, next_offset, state, timestamp, first, last) for
+        each block or record from the start offset up to the end offset by
+        reading only the headers, where the packet data is from the first
+        to the last offset and the timestamp is None for blocks without a
+        packet."""
+        data = self.data
+        end = len(data) if end is None else min(end, len(data))
+        endian, resolutions = state
+        offset = start
+
+        if self.format == 'pcap':
+            header = struct.Struct(endian + 'IIII')
+            resolution = resolutions[0]
+
+            while offset + 16 <= end:
+                ts_sec, ts_frac, incl_len, orig_len = header.unpack_from(data, offset)
+                next_offset = offset + 16 + incl_len
+                if next_offset > len(data):
+                    if _debug: PcapReader._debug("    - truncated record at %d", offset)
+                    break
+
+                yield offset, next_offset, state, ts_sec + ts_frac / resolution, offset + 16, next_offset
+                offset = next_offset
+            return
+
+        if self.format == 'bptr':
+            while offset + _record_header.size <= end:
+                timestamp, kind, reserved, length = _record_header.unpack_from(data, offset)
+                body_offset = offset + _record_header.size
+                next_offset = body_offset + length
+                if next_offset > len(data):
+                    if _debug: PcapReader._debug("    - truncated record at %d", offset)
+                    break
+
+                # frames are packets, transactions are skipped
+                if kind not in (UDP_FRAME, TCP_DATA):
+                    timestamp = None
+
+                yield offset, next_offset, state, timestamp, body_offset, next_offset
+                offset = next_offset
+            return
+
+        while offset + 12 <= end:
+            # a section header block sets the byte order
+            block_type = struct.unpack_from('<I', data, offset)[0]
+            if block_type == PCAPNG_SHB:
+                byte_order = struct.unpack_from('<I', data, offset + 8)[0]
+                endian = '<' if byte_order == PCAPNG_BYTE_ORDER_MAGIC else '>'
+                resolutions = ()
+                state = (endian, resolutions)
+            elif endian is None:
+                raise ValueError, "pcapng block before a section header"
+            else:
+                block_type = struct.unpack_from(endian + 'I', data, offset)[0]
+
+            block_len = struct.unpack_from(endian + 'I', data, offset + 4)[0]
+            next_offset = offset + block_len
+            if (block_len < 12) or (next_offset > len(data)):
+                if _debug: PcapReader._debug("    - truncated block at %d", offset)
+                break
+
+            timestamp = first = last = None
+            if block_type == PCAPNG_IDB:
+                resolutions = resolutions + (self._if_tsresol(offset + 16, next_offset - 4, endian),)
+                state = (endian, resolutions)
+
+            elif block_type == PCAPNG_EPB:
+                if_id, ts_high, ts_low, cap_len = struct.unpack_from(endian + 'IIII', data, offset + 8)
+                resolution = resolutions[if_id] if if_id < len(resolutions) else 1e6
+                timestamp = ((ts_high << 32) | ts_low) / resolution
+                first, last = offset + 28, offset + 28 + cap_len
+
+            elif block_type == PCAPNG_OPB:
+                if_id, drops, ts_high, ts_low, cap_len = struct.unpack_from(endian + 'HHIII', data, offset + 8)
+                resolution = resolutions[if_id] if if_id < len(resolutions) else 1e6
+                timestamp = ((ts_high << 32) | ts_low) / resolution
+                first, last = offset + 28, offset + 28 + cap_len
+
+            elif block_type == PCAPNG_SPB:
+                # no timestamp, no captured length other than the block
+                orig_len = struct.unpack_from(endian + 'I', data, offset + 8)[0]
+                cap_len = min(orig_len, block_len - 16)
+                timestamp = 0.0
+                first, last = offset + 12, offset + 12 + cap_len
+
+            yield offset, next_offset, state, timestamp, first, last
+            offset = next_offset
+
+    def _blocks(self, start, end, state):
+        """Generate (offset, next_offset, state, packet) for each block or
+        record from the start offset up to the end offset, where packet is
+        a (timestamp, data) tuple or None for blocks without a packet."""
+        data = self.data
+
+        for offset, next_offset, state, timestamp, first, last in self._headers(start, end, state):
+            if timestamp is None:
+                packet = None
+            elif self.format == 'bptr':
+                # frames are given their headers back
+                kind = _record_header.unpack_from(data, offset)[1]
+                timestamp, kind, source, destination, pdu_data = \
+                    parse_packet_trace_record(timestamp, kind, data[first:last])
+                if kind == UDP_FRAME:
+                    packet = (timestamp, udp_frame(pdu_data, source, destination))
+                else:
+                    packet = (timestamp, tcp_frame(pdu_data, source, destination))
+            else:
+                packet = (timestamp, data[first:last])
+
+            yield offset, next_offset, state, packet
+
+    def _if_tsresol(self, offset, end, endian):
+        """Return the timestamp resolution from the interface options."""
+        data = self.data
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(endian + 'HH', data, offset)
+            if code == 0:
+                break
+            if code == 9 and length >= 1:
+                value = ord(data[offset + 4])
+                if value & 0x80:
+                    return float(2 ** (value & 0x7F))
+                return float(10 ** value)
+            offset += 4 + ((length + 3) & ~3)
+
+        # the default is microseconds
+        return 1e6
+
+    def records(self, start=None, end=None, state=None):
+        """Generate (timestamp, data) for the records that start at or after
+        the start offset and before the end offset."""
+        if _debug: PcapReader._debug("records %r %r %r", start, end, state)
+
+        if start is None:
+            start, state = self.start, self.state
+
+        for offset, next_offset, state, packet in self._blocks(start, end, state):
+            if packet:
+                yield packet
+
+    def chunks(self, count=DECODE_CHUNK_RECORDS, lowest=False):
+        """Generate (start, end, state) ranges of the file with about count
+        packet records in each, suitable for records().  When lowest is
+        true the ranges also have the lowest timestamp of their records.
+        Only the headers are read, the packets are left in the file."""
+        if _debug: PcapReader._debug("chunks %r lowest=%r", count, lowest)
+
+        start, state = self.start, self.state
+        records = 0
+        low = float('inf')
+        for offset, next_offset, block_state, timestamp, first, last in self._headers(start, None, state):
+            if timestamp is not None:
+                records += 1
+                if timestamp < low:
+                    low = timestamp
+            if records >= count:
+                yield (start, next_offset, state, low) if lowest else (start, next_offset, state)
+                start, state = next_offset, block_state
+                records = 0
+                low = float('inf')
+
+        if start < len(self.data):
+            yield (start, len(self.data), state, low) if lowest else (start, len(self.data), state)
+
 #
 #   decode_file
 #
 
 @bacpypes_debugging
-def decode_file(fname):
-    """Given the name of a pcap file, open it, decode the contents and yield each packet."""
-    if _debug: decode_file._debug("decode_file %r", fname)
-
-    if not pcap:
-        raise RuntimeError, "failed to import pcap"
-
-    # create a pcap object
-    p = pcap.pcapObject()
-    p.open_offline(fname)
-
-    i = 0
-    while 1:
-        # the object acts like an iterator
-        pkt = p.next()
-        if not pkt:
-            break
-
-        # returns a tuple
-        pktlen, data, timestamp = pkt
-        pkt = decode_packet(data)
-        if not pkt:
-            continue
-
-        # save the index and timestamp in the packet
+def decode_file(fname, processes=None, prefilter=None, lazy=False):
+    """Given the name of a pcap or pcapng file, open it, decode the contents
+    and yield each packet.  When processes is given the records are decoded
+    by a pool of that many worker processes and yielded in timestamp order.
+
+    The prefilter is called with the PacketHeaders of each packet and the
+    packet is skipped unless it returns true, when lazy is true LazyPacket
+    objects are yielded rather than decoded PDU's."""
+    if _debug: decode_file._debug("decode_file %r processes=%r prefilter=%r lazy=%r", fname, processes, prefilter, lazy)
+
+    if processes:
+        packets = _decode_parallel(fname, processes, prefilter, lazy)
+    else:
+        packets = _decode_sequential(fname, prefilter, lazy)
+
+    for i, pkt in enumerate(packets):
+        # save the index in the packet
         pkt._index = i
+
+        yield pkt
+
+def _decode_records(records, prefilter=None, lazy=False):
+    """Decode the records and generate the packets with their timestamp."""
+    for timestamp, data in records:
+        if prefilter or lazy:
+            headers = packet_headers(data)
+            if not headers:
+                continue
+            if prefilter and not prefilter(headers):
+                continue
+
+        if lazy:
+            pkt = LazyPacket(data, headers)
+        else:
+            pkt = decode_packet(data)
+            if not pkt:
+                continue
+
+        # save the timestamp in the packet
         pkt._timestamp = timestamp
 
         yield pkt
 
-        i += 1
+def _decode_sequential(fname, prefilter, lazy):
+    """Decode the records of the file in this process."""
+    reader = PcapReader(fname)
+    try:
+        for pkt in _decode_records(reader.records(), prefilter, lazy):
+            yield pkt
+    finally:
+        reader.close()
+
+# each worker process keeps its reader open between chunks
+_worker_readers = {}
+
+def _decode_chunk(args):
+    """Decode a range of records in a worker process and return the packets
+    sorted by timestamp."""
+    fname, start, end, state, prefilter, lazy = args
+
+    reader = _worker_readers.get(fname)
+    if not reader:
+        reader = _worker_readers[fname] = PcapReader(fname)
+
+    packets = list(_decode_records(reader.records(start, end, state), prefilter, lazy))
+    packets.sort(key=lambda pkt: pkt._timestamp)
+
+    return packets
+
+def _decode_worker_init():
+    """The workers are forked with the TERM handler from the core module,
+    which only stops run(), so put back the default and let the pool
+    terminate them."""
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+@bacpypes_debugging
+def _decode_parallel(fname, processes, prefilter, lazy):
+    """Spread the chunks of the file across a pool of processes, keeping a
+    few more chunks in flight than there are processes, and merge the
+    results back together in timestamp order.  The prefilter is passed to
+    the processes so it must be something that can be pickled.
+
+    The lowest timestamp of each chunk is found when the file is split, so
+    a packet is only released when no chunk still to come has an earlier
+    one.  The order is the same as sorting all of the packets by timestamp,
+    packets with the same timestamp stay in file order."""
+    if _debug: _decode_parallel._debug("_decode_parallel %r %r %r %r", fname, processes, prefilter, lazy)
+
+    reader = PcapReader(fname)
+
+    # the ranges and the lowest timestamp of each chunk and the ones after it
+    ranges = []
+    lows = []
+    for start, end, state, low in reader.chunks(lowest=True):
+        ranges.append((start, end, state))
+        lows.append(low)
+    for i in range(len(lows) - 2, -1, -1):
+        lows[i] = min(lows[i], lows[i + 1])
+    lows.append(float('inf'))
+
+    pool = multiprocessing.Pool(processes, _decode_worker_init)
+    try:
+        pending = deque()
+        heap = []
+        sequence = 0
+
+        chunks = iter(ranges)
+        for index in range(len(ranges)):
+            # keep the pool busy
+            for args in chunks:
+                pending.append(pool.apply_async(_decode_chunk, ((fname,) + args + (prefilter, lazy),)))
+                if len(pending) >= 2 * processes:
+                    break
+
+            # collect the results in file order
+            for pkt in pending.popleft().get():
+                heapq.heappush(heap, (pkt._timestamp, sequence, pkt))
+                sequence += 1
+
+            # nothing still to come is earlier than this
+            low_water = lows[index + 1]
+            while heap and (heap[0][0] <= low_water):
+                yield heapq.heappop(heap)[2]
+
+        while heap:
+            yield heapq.heappop(heap)[2]
+
+    finally:
+        pool.terminate()
+        reader.close()
 
 #
 #   Tracer
@@ -409,14 +1076,14 @@ class Tracer(DebugContents):
 #
 
 @bacpypes_debugging
-def trace(fname, tracers):
-    if _debug: trace._debug("trace %r %r", fname, tracers)
+def trace(fname, tracers, processes=None, prefilter=None, lazy=False):
+    if _debug: trace._debug("trace %r %r processes=%r prefilter=%r lazy=%r", fname, tracers, processes, prefilter, lazy)
 
     # make a list of tracers
     currentTracers = [traceClass() for traceClass in tracers]
 
     # decode the file
-    for pkt in decode_file(fname):
+    for pkt in decode_file(fname, processes, prefilter, lazy):
         for i, tracer in enumerate(currentTracers):
             # give the packet to the tracer
             tracer.currentState(pkt)
@@ -425,6 +1092,719 @@ def trace(fname, tracers):
             if not tracer.currentState:
                 currentTracers[i] = tracers[i]()
 
+#
+#   Transaction
+#
+
+class Transaction(DebugContents):
+
+    """A confirmed request and the response to it.  The latency is the
+    time to the first response, the duration is the time to the last
+    segment of a segmented response.  The response type is None when the
+    request was never answered."""
+
+    _debug_contents = ('client', 'server', 'invokeID', 'service',
+        'requestTime', 'retries', 'requestSegments',
+        'responseType', 'responseTime', 'responseSegments', 'completeTime',
+        )
+
+    def __init__(self, client, server, invokeID, service, requestTime):
+        self.client = client
+        self.server = server
+        self.invokeID = invokeID
+        self.service = service
+        self.requestTime = requestTime
+        self.lastTime = requestTime
+        self.retries = 0
+        self.requestSegments = 1
+        self.responseType = None
+        self.responseTime = None
+        self.responseSegments = 0
+        self.completeTime = None
+
+    @property
+    def latency(self):
+        if self.responseTime is None:
+            return None
+        return self.responseTime - self.requestTime
+
+    @property
+    def duration(self):
+        if self.completeTime is None:
+            return None
+        return self.completeTime - self.requestTime
+
+#
+#   DeviceStatistics
+#
+
+# upper bounds of the latency histogram buckets in seconds, there is one
+# more bucket for everything longer
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class DeviceStatistics(DebugContents):
+
+    """The transaction counts and latency histogram of a device that
+    responds to confirmed requests."""
+
+    _debug_contents = ('address', 'requests', 'retries', 'timeouts',
+        'simpleAcks', 'complexAcks', 'errors', 'rejects', 'aborts',
+        'histogram',
+        )
+
+    def __init__(self, address, buckets=LATENCY_BUCKETS):
+        self.address = address
+        self.buckets = buckets
+        self.requests = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.simpleAcks = 0
+        self.complexAcks = 0
+        self.errors = 0
+        self.rejects = 0
+        self.aborts = 0
+        self.latencyTotal = 0.0
+        self.histogram = [0] * (len(buckets) + 1)
+
+    def record(self, txn):
+        """Add a finished transaction."""
+        self.requests += 1
+        self.retries += txn.retries
+
+        response_type = txn.responseType
+        if response_type is None:
+            self.timeouts += 1
+            return
+        elif response_type == SimpleAckPDU.pduType:
+            self.simpleAcks += 1
+        elif response_type == ComplexAckPDU.pduType:
+            self.complexAcks += 1
+        elif response_type == ErrorPDU.pduType:
+            self.errors += 1
+        elif response_type == RejectPDU.pduType:
+            self.rejects += 1
+        elif response_type == AbortPDU.pduType:
+            self.aborts += 1
+
+        latency = txn.latency
+        self.latencyTotal += latency
+        self.histogram[bisect.bisect_left(self.buckets, latency)] += 1
+
+    @property
+    def responses(self):
+        return self.requests - self.timeouts
+
+    @property
+    def mean(self):
+        if not self.responses:
+            return None
+        return self.latencyTotal / self.responses
+
+    def percentile(self, p):
+        """Return the upper bound of the bucket that has the p'th percentile
+        latency, or None if it is in the last bucket or there are none."""
+        total = sum(self.histogram)
+        if not total:
+            return None
+
+        count = 0
+        for i, n in enumerate(self.histogram):
+            count += n
+            if count * 100.0 >= p * total:
+                break
+
+        if i < len(self.buckets):
+            return self.buckets[i]
+        return None
+
+#
+#   TransactionMatcher
+#
+
+@bacpypes_debugging
+class TransactionMatcher(DebugContents):
+
+    """Match confirmed requests of every service with their responses in a
+    single pass over the packets.  A repeated request with the same client,
+    server and invoke ID is a retry, the segments of a request or response
+    are counted, and a request that has not been answered within the window
+    is finished as a timeout so memory is bounded by the traffic in the
+    window.  Finished transactions are given to transaction_complete()."""
+
+    _debug_contents = ('window', 'pending', 'devices')
+
+    # APDU types of the packets that are interesting
+    apduTypes = (ConfirmedRequestPDU.pduType, SimpleAckPDU.pduType, ComplexAckPDU.pduType,
+        ErrorPDU.pduType, RejectPDU.pduType, AbortPDU.pduType)
+
+    def __init__(self, window=60.0, buckets=LATENCY_BUCKETS):
+        if _debug: TransactionMatcher._debug("__init__ window=%r buckets=%r", window, buckets)
+
+        self.window = window
+        self.buckets = buckets
+
+        # transactions in progress, oldest activity first
+        self.pending = OrderedDict()
+
+        # statistics by server address
+        self.devices = {}
+
+    def feed(self, pkt):
+        """Look at a decoded or lazy packet."""
+        apdu_type = pkt.apduType
+        now = pkt._timestamp
+
+        # finish the transactions that have gone quiet
+        self.expire(now)
+
+        if apdu_type == ConfirmedRequestPDU.pduType:
+            key = (pkt.pduSource, pkt.pduDestination, pkt.apduInvokeID)
+            txn = self.pending.pop(key, None)
+
+            if txn and (txn.service == pkt.apduService) and (txn.responseType is None):
+                if pkt.apduSeg and pkt.apduSeq:
+                    txn.requestSegments += 1
+                else:
+                    txn.retries += 1
+            else:
+                # the invoke ID is being reused for something new
+                if txn:
+                    self.finish(txn)
+                txn = Transaction(pkt.pduSource, pkt.pduDestination,
+                    pkt.apduInvokeID, pkt.apduService, now)
+
+        elif apdu_type in self.apduTypes:
+            key = (pkt.pduDestination, pkt.pduSource, pkt.apduInvokeID)
+            txn = self.pending.pop(key, None)
+            if (not txn) and (apdu_type == AbortPDU.pduType) and (not pkt.apduSrv):
+                # aborted by the client
+                key = (pkt.pduSource, pkt.pduDestination, pkt.apduInvokeID)
+                txn = self.pending.pop(key, None)
+            if not txn:
+                if _debug: TransactionMatcher._debug("    - no request: %r", key)
+                return
+
+            if txn.responseType is None:
+                txn.responseType = apdu_type
+                txn.responseTime = now
+            txn.responseSegments += 1
+
+            # more segments to come
+            if (apdu_type == ComplexAckPDU.pduType) and pkt.apduMor:
+                pass
+            else:
+                txn.completeTime = now
+                self.finish(txn)
+                return
+
+        else:
+            return
+
+        # put it at the end of the line
+        txn.lastTime = now
+        self.pending[key] = txn
+
+    def expire(self, now):
+        """Finish the transactions that have had no activity in the window."""
+        limit = now - self.window
+        while self.pending:
+            key, txn = next(self.pending.iteritems())
+            if txn.lastTime >= limit:
+                break
+
+            del self.pending[key]
+            self.finish(txn)
+
+    def flush(self):
+        """Finish all of the pending transactions, like at the end of a file."""
+        if _debug: TransactionMatcher._debug("flush")
+
+        while self.pending:
+            key, txn = self.pending.popitem(last=False)
+            self.finish(txn)
+
+    def finish(self, txn):
+        """Update the statistics of the server and pass it along."""
+        stats = self.devices.get(txn.server)
+        if not stats:
+            stats = self.devices[txn.server] = DeviceStatistics(txn.server, self.buckets)
+        stats.record(txn)
+
+        self.transaction_complete(txn)
+
+    def transaction_complete(self, txn):
+        """Called with each finished transaction, override this to look at
+        them individually."""
+        pass
+
+#
+#   match_transactions
+#
+
+@bacpypes_debugging
+def match_transactions(fname, matcher=None, processes=None):
+    """Match the transactions in a capture file and return the matcher."""
+    if _debug: match_transactions._debug("match_transactions %r %r processes=%r", fname, matcher, processes)
+
+    if matcher is None:
+        matcher = TransactionMatcher()
+
+    prefilter = PacketFilter(apduTypes=TransactionMatcher.apduTypes)
+    for pkt in decode_file(fname, processes, prefilter, lazy=True):
+        matcher.feed(pkt)
+    matcher.flush()
+
+    return matcher
+
+#
+#   Columnar Export
+#
+#   The columns of an exported capture, the NumPy type and the value used
+#   for a missing field.  Arrow tables use nulls for missing fields.
+#
+
+capture_columns = (
+    ('timestamp', 'f8', float('nan')),
+    ('pduSource', 'S32', ''),
+    ('pduDestination', 'S32', ''),
+    ('bvlciFunction', 'i2', -1),
+    ('npduNetMessage', 'i2', -1),
+    ('apduType', 'i2', -1),
+    ('apduService', 'i2', -1),
+    ('apduInvokeID', 'i2', -1),
+    ('objectType', 'S32', ''),
+    ('objectInstance', 'i4', -1),
+    ('propertyIdentifier', 'S40', ''),
+    ('latency', 'f8', float('nan')),
+    )
+
+# APDU types of a response to a confirmed request
+_response_types = (SimpleAckPDU.pduType, ComplexAckPDU.pduType,
+    ErrorPDU.pduType, RejectPDU.pduType, AbortPDU.pduType)
+
+#
+#   capture_to_columns
+#
+
+@bacpypes_debugging
+def capture_to_columns(fname, processes=None, prefilter=None):
+    """Decode a capture and return a dictionary of column lists, None is
+    a missing field.  The latency is the time from a confirmed request to
+    the first response with the same addresses and invoke ID and it is
+    recorded in both rows."""
+    if _debug: capture_to_columns._debug("capture_to_columns %r processes=%r prefilter=%r", fname, processes, prefilter)
+
+    columns = dict((name, []) for name, dtype, missing in capture_columns)
+    timestamps = columns['timestamp']
+    latencies = columns['latency']
+
+    # rows of requests waiting for a response
+    requests = {}
+
+    for pkt in decode_file(fname, processes, prefilter, lazy=True):
+        headers = pkt.headers
+        apdu = pkt.pdu if headers.apduType is not None else None
+
+        objectIdentifier = getattr(apdu, 'objectIdentifier', None)
+        if objectIdentifier:
+            objectType, objectInstance = str(objectIdentifier[0]), objectIdentifier[1]
+        else:
+            objectType = objectInstance = None
+        propertyIdentifier = getattr(apdu, 'propertyIdentifier', None)
+
+        timestamps.append(pkt._timestamp)
+        columns['pduSource'].append(str(pkt.pduSource))
+        columns['pduDestination'].append(str(pkt.pduDestination))
+        columns['bvlciFunction'].append(headers.bvlciFunction)
+        columns['npduNetMessage'].append(headers.npduNetMessage)
+        columns['apduType'].append(headers.apduType)
+        columns['apduService'].append(headers.apduService)
+        columns['apduInvokeID'].append(getattr(apdu, 'apduInvokeID', None))
+        columns['objectType'].append(objectType)
+        columns['objectInstance'].append(objectInstance)
+        columns['propertyIdentifier'].append(None if propertyIdentifier is None else str(propertyIdentifier))
+        latencies.append(None)
+
+        # match responses with requests
+        if headers.apduType == ConfirmedRequestPDU.pduType:
+            key = (pkt.pduSource, pkt.pduDestination, apdu.apduInvokeID)
+            if key not in requests:
+                requests[key] = len(timestamps) - 1
+        elif headers.apduType in _response_types:
+            key = (pkt.pduDestination, pkt.pduSource, apdu.apduInvokeID)
+            row = requests.pop(key, None)
+            if row is not None:
+                latencies[row] = latencies[-1] = timestamps[-1] - timestamps[row]
+
+    return columns
+
+#
+#   columns_to_numpy
+#
+
+def columns_to_numpy(columns):
+    """Return a NumPy structured array of the columns."""
+    if not numpy:
+        raise RuntimeError, "failed to import numpy"
+
+    dtype = [(name, coltype) for name, coltype, missing in capture_columns]
+    array = numpy.zeros(len(columns['timestamp']), dtype=dtype)
+    for name, coltype, missing in capture_columns:
+        array[name] = [missing if value is None else value for value in columns[name]]
+
+    return array
+
+#
+#   columns_to_arrow
+#
+
+def columns_to_arrow(columns):
+    """Return an Arrow table of the columns."""
+    if not pyarrow:
+        raise RuntimeError, "failed to import pyarrow"
+
+    names = []
+    arrays = []
+    for name, coltype, missing in capture_columns:
+        if coltype[0] == 'S':
+            arrowtype = pyarrow.string()
+        else:
+            arrowtype = pyarrow.from_numpy_dtype(coltype)
+
+        names.append(name)
+        arrays.append(pyarrow.array(columns[name], type=arrowtype))
+
+    return pyarrow.Table.from_arrays(arrays, names)
+
+#
+#   export_capture
+#
+
+@bacpypes_debugging
+def export_capture(fname, processes=None, prefilter=None, format=None):
+    """Decode a capture into a NumPy structured array when the format is
+    'numpy' or an Arrow table when it is 'arrow'.  By default it is an
+    Arrow table when pyarrow is available."""
+    if _debug: export_capture._debug("export_capture %r processes=%r prefilter=%r format=%r", fname, processes, prefilter, format)
+
+    if format is None:
+        format = 'arrow' if pyarrow else 'numpy'
+    if format not in ('numpy', 'arrow'):
+        raise ValueError, "format must be 'numpy' or 'arrow'"
+
+    columns = capture_to_columns(fname, processes, prefilter)
+    if format == 'arrow':
+        return columns_to_arrow(columns)
+    else:
+        return columns_to_numpy(columns)
+
+#
+#   Live Capture
+#
+
+# ARP hardware types of interfaces with ethernet headers
+ARPHRD_ETHER = 1
+ARPHRD_LOOPBACK = 772
+
+# packet types of frames sent by this host
+PACKET_OUTGOING = 4
+
+#
+#   PacketRing
+#
+
+_packet_ring_timestamp = struct.Struct('<d')
+
+@bacpypes_debugging
+class PacketRing(DebugContents):
+
+    """A buffer of (timestamp, data) records between capturing packets and
+    decoding them, bounded by the total number of octets.  When it is full
+    the oldest records are dropped and counted, the high water mark is the
+    most octets it has held."""
+
+    _debug_contents = ('size', 'dropped', 'highWater')
+
+    def __init__(self, size=16777216):
+        if _debug: PacketRing._debug("__init__ size=%r", size)
+
+        self.size = size
+        self.ring = OctetRing(size)
+        self.highWater = 0
+
+    @property
+    def dropped(self):
+        return self.ring.dropped
+
+    def put(self, timestamp, data):
+        ring = self.ring
+        ring.put(_packet_ring_timestamp.pack(timestamp) + data)
+
+        used = ring.used()
+        if used > self.highWater:
+            self.highWater = used
+
+    def get(self):
+        data = self.ring.get()
+        return (_packet_ring_timestamp.unpack_from(data)[0], data[_packet_ring_timestamp.size:])
+
+    def __len__(self):
+        return len(self.ring)
+
+#
+#   UDPTap
+#
+
+class UDPTap:
+
+    """A passive tap for a UDPDirector, the datagrams it receives and sends
+    are put in the ring as packets."""
+
+    def __init__(self, ring):
+        self.ring = ring
+
+    def __call__(self, data, source, destination):
+        self.ring.put(time.time(), udp_frame(data, source, destination))
+
+#
+#   RawSocketCapture
+#
+
+@bacpypes_debugging
+class RawSocketCapture(asyncore.dispatcher):
+
+    """Capture the frames of an interface, or all of them when it is None
+    or 'any', with a raw AF_PACKET socket (Linux, root) and put them in the ring.  The socket is
+    drained each time it is readable so the kernel buffer stays empty and
+    the decoding happens later."""
+
+    def __init__(self, ring, interface=None, rcvbuf=None):
+        if _debug: RawSocketCapture._debug("__init__ %r interface=%r rcvbuf=%r", ring, interface, rcvbuf)
+        asyncore.dispatcher.__init__(self)
+
+        if not hasattr(socket, 'AF_PACKET'):
+            raise RuntimeError, "AF_PACKET not supported"
+
+        self.ring = ring
+        self.interface = interface
+
+        # capture everything, the headers are checked when decoding
+        self.create_socket(socket.AF_PACKET, socket.SOCK_RAW)
+        if rcvbuf:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        if interface and (interface != 'any'):
+            self.bind((interface, 0))
+
+    def create_socket(self, family, type):
+        # asyncore does not know about the protocol
+        sock = socket.socket(family, type, socket.htons(0x0003))
+        sock.setblocking(0)
+        self.set_socket(sock)
+
+    def handle_connect(self):
+        pass
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        ring = self.ring
+        while True:
+            try:
+                data, addr = self.socket.recvfrom(65536)
+            except socket.error as err:
+                if err.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    RawSocketCapture._error("handle_read socket error: %s", err)
+                break
+
+            # only ethernet framing, loopback frames are seen going out
+            # and coming back in
+            ifname, proto, pkttype, hatype, hwaddr = addr
+            if hatype == ARPHRD_LOOPBACK:
+                if pkttype == PACKET_OUTGOING:
+                    continue
+            elif hatype != ARPHRD_ETHER:
+                continue
+
+            ring.put(time.time(), data)
+
+    def handle_close(self):
+        if _debug: RawSocketCapture._debug("handle_close")
+        self.close()
+
+#
+#   LiveTrace
+#
+
+@bacpypes_debugging
+class LiveTrace(RecurringTask, DebugContents):
+
+    """Decode the packets in the ring and give them to the tracers, like
+    trace() does for a file, and to the monitors that have a feed()
+    method like TransactionMatcher and RollingSummary.  No more than
+    budget packets are decoded before letting the capture run again."""
+
+    _debug_contents = ('ring', 'packets', 'tracers', 'monitors')
+
+    def __init__(self, ring, tracers=(), monitors=(), prefilter=None, lazy=False, interval=10, budget=1000):
+        if _debug: LiveTrace._debug("__init__ %r %r %r prefilter=%r lazy=%r interval=%r budget=%r", ring, tracers, monitors, prefilter, lazy, interval, budget)
+        RecurringTask.__init__(self, interval)
+
+        self.ring = ring
+        self.tracers = list(tracers)
+        self.currentTracers = [traceClass() for traceClass in tracers]
+        self.monitors = list(monitors)
+        self.prefilter = prefilter
+        self.lazy = lazy
+        self.budget = budget
+
+        # count the packets decoded
+        self.packets = 0
+
+        self.install_task()
+
+    def process_task(self):
+        ring = self.ring
+        count = min(len(ring), self.budget)
+        if not count:
+            return
+
+        records = (ring.get() for i in range(count))
+        for pkt in _decode_records(records, self.prefilter, self.lazy):
+            pkt._index = self.packets
+            self.packets += 1
+
+            self.feed(pkt)
+
+        # come back after the sockets have been checked
+        if len(ring):
+            deferred(self.process_task)
+
+    def feed(self, pkt):
+        for i, tracer in enumerate(self.currentTracers):
+            # give the packet to the tracer
+            tracer.currentState(pkt)
+
+            # if there is no current state, make a new one
+            if not tracer.currentState:
+                self.currentTracers[i] = self.tracers[i]()
+
+        for monitor in self.monitors:
+            monitor.feed(pkt)
+
+#
+#   RollingSummary
+#
+
+@bacpypes_debugging
+class RollingSummary(RecurringTask, DebugContents):
+
+    """Count the packets in a rolling window of one second slots and
+    publish a summary every period: the PDUs per minute, the Who-Is
+    sources over the storm limit and the top talkers.  The summary is
+    given to the publisher function, or logged when there isn't one."""
+
+    _debug_contents = ('window', 'period', 'top', 'whoIsLimit', 'publisher')
+
+    def __init__(self, window=60, period=10, top=10, whoIsLimit=None, publisher=None):
+        if _debug: RollingSummary._debug("__init__ window=%r period=%r top=%r whoIsLimit=%r publisher=%r", window, period, top, whoIsLimit, publisher)
+        RecurringTask.__init__(self, period * 1000)
+
+        self.window = window
+        self.period = period
+        self.top = top
+        self.whoIsLimit = whoIsLimit
+        self.publisher = publisher
+
+        # slots of [second, packets, Who-Is counter, talker counter]
+        self.slots = deque()
+
+        self.install_task()
+
+    def feed(self, pkt):
+        second = int(pkt._timestamp)
+        slots = self.slots
+        if (not slots) or (slots[-1][0] != second):
+            slots.append([second, 0, Counter(), Counter()])
+            self.expire(second)
+        slot = slots[-1]
+
+        source = str(pkt.pduSource)
+        slot[1] += 1
+        slot[3][source] += 1
+        if (pkt.apduType == UnconfirmedRequestPDU.pduType) and (pkt.apduService == WhoIsRequest.serviceChoice):
+            slot[2][source] += 1
+
+    def expire(self, now):
+        slots = self.slots
+        while slots and (slots[0][0] <= now - self.window):
+            slots.popleft()
+
+    def summary(self, now=None):
+        """Return a dictionary of the counts in the window."""
+        if now is None:
+            now = time.time()
+        self.expire(int(now))
+
+        packets = 0
+        whoIs = Counter()
+        talkers = Counter()
+        for second, count, whoIsCounter, talkerCounter in self.slots:
+            packets += count
+            whoIs.update(whoIsCounter)
+            talkers.update(talkerCounter)
+
+        limit = self.whoIsLimit
+        return {
+            'time': now,
+            'packets': packets,
+            'packetsPerMinute': packets * 60.0 / self.window,
+            'whoIs': sum(whoIs.values()),
+            'whoIsStorms': [(source, count) for source, count in whoIs.most_common()
+                if (limit is not None) and (count > limit)],
+            'topTalkers': talkers.most_common(self.top),
+            }
+
+    def process_task(self):
+        self.publish(self.summary())
+
+    def publish(self, summary):
+        """Called every period with the summary, pass it to the publisher
+        or log it."""
+        if self.publisher:
+            self.publisher(summary)
+            return
+
+        RollingSummary._info("%d PDUs/min, %d Who-Is", summary['packetsPerMinute'], summary['whoIs'])
+        for source, count in summary['whoIsStorms']:
+            RollingSummary._warning("Who-Is storm: %s %d", source, count)
+        for source, count in summary['topTalkers']:
+            RollingSummary._info("    %-24s %d", source, count)
+
+#
+#   trace_live
+#
+
+@bacpypes_debugging
+def trace_live(interface, tracers, prefilter=None, lazy=False, monitors=(), size=16777216, rcvbuf=4194304):
+    """Capture the traffic of the interface, None or 'any' for all of them,
+    and give the packets to the tracers and monitors until the application
+    is stopped.  Returns the LiveTrace."""
+    if _debug: trace_live._debug("trace_live %r %r prefilter=%r lazy=%r monitors=%r size=%r rcvbuf=%r", interface, tracers, prefilter, lazy, monitors, size, rcvbuf)
+
+    ring = PacketRing(size)
+    capture = RawSocketCapture(ring, interface, rcvbuf)
+    live = LiveTrace(ring, tracers, monitors, prefilter, lazy)
+
+    run()
+
+    capture.close()
+    live.suspend_task()
+    if ring.dropped:
+        _log.warning("%d packets dropped", ring.dropped)
+
+    return live
+
 #
 #   __main__
 #
@@ -586,8 +586,6 @@ class RejectReason(Enumerated):
         , 'unrecognizedService':9
         }
 
-expand_enumerations(RejectReason)
-
 @bacpypes_debugging
 class RejectPDU(_APDU):
     pduType = 6
@@ -599,7 +597,7 @@ class RejectPDU(_APDU):
         self.apduType = RejectPDU.pduType
         self.apduInvokeID = invokeID
         if isinstance(reason, str):
-            reason = RejectReason(reason).get_long()
+            reason = RejectReason.interned(reason).get_long()
         self.apduAbortRejectReason = reason
 
         # use the context to fill in most of the fields
@@ -644,8 +642,6 @@ class AbortReason(Enumerated):
         , 'noResponse':65
         }
 
-expand_enumerations(AbortReason)
-
 @bacpypes_debugging
 class AbortPDU(_APDU):
     pduType = 7
@@ -658,7 +654,7 @@ class AbortPDU(_APDU):
         self.apduSrv = srv
         self.apduInvokeID = invokeID
         if isinstance(reason, str):
-            reason = AbortReason(reason).get_long()
+            reason = AbortReason.interned(reason).get_long()
         self.apduAbortRejectReason = reason
 
         # use the context to fill in most of the fields
@@ -705,8 +701,8 @@ class APCISequence(APCI, Sequence):
         # copy the header fields
         apdu.update(self)
         
-        # create a tag list
-        self._tag_list = TagList()
+        # create a tag list, the encoded content of Any values is copied in
+        self._tag_list = EncodingTagList()
         Sequence.encode(self, self._tag_list)
 
         # encode the tag list
@@ -718,9 +714,8 @@ class APCISequence(APCI, Sequence):
         # copy the header fields
         self.update(apdu)
         
-        # create a tag list and decode the rest of the data
-        self._tag_list = TagList()
-        self._tag_list.decode(apdu)
+        # the tags are decoded from the rest of the data as they are needed
+        self._tag_list = TagStream(apdu)
 
         # pass the taglist to the Sequence for additional decoding
         Sequence.decode(self, self._tag_list)
@@ -4,6 +4,8 @@
 Application Module
 """
 
+import types
+
 from debugging import ModuleLogger, Logging
 from comm import ApplicationServiceElement, bind
 
@@ -17,8 +19,9 @@ from netservice import NetworkServiceAccessPoint, NetworkServiceElement
 from bvllservice import BIPSimple, BIPForeign, AnnexJCodec, UDPMultiplexer
 
 from object import Property, PropertyError, DeviceObject, registered_object_types, register_object_type
+from objectstore import ObjectStore, VirtualObjectStore
 from apdu import ConfirmedRequestPDU, SimpleAckPDU, RejectPDU, RejectReason
-from apdu import IAmRequest, ReadPropertyACK, Error
+from apdu import IAmRequest, IHaveRequest, ReadPropertyACK, Error
 from errors import ExecutionError
 
 from apdu import \
@@ -76,6 +79,340 @@ class CurrentTimeProperty(Property):
     def WriteProperty(self, obj, value, arrayIndex=None, priority=None):
         raise ExecutionError(errorClass='property', errorCode='writeAccessDenied')
 
+#
+#   ObjectList
+#
+
+class ObjectList(ArrayOf(ObjectIdentifier), Logging):
+
+    """The object list of a local device.  The identifiers are kept in slots
+    with an index of the slot of each one, so finding an identifier is a
+    dict lookup, appending is a list append and deleting leaves an empty
+    slot rather than moving the rest of the list along.  While there are
+    empty slots the position of an array index is found with a binary
+    indexed tree of the slots in use, in log n steps.  The list is
+    compacted when half of the slots are empty, or when the tree has been
+    searched for one in every 32 slots, so reading through the list after
+    deleting some objects goes back to a list lookup.  The encoding of each
+    identifier is kept so the whole list is encoded by joining them.
+
+    The identifiers of virtual objects come after the slots, they are read
+    from the table of the virtual object store and are changed by adding
+    and deleting the objects in the store."""
+
+    def __init__(self, value=None):
+        if _debug: ObjectList._debug("__init__ %r", value)
+
+        if value is None:
+            value = []
+        elif not isinstance(value, types.ListType):
+            raise TypeError, "invalid constructor datatype"
+
+        # the table of virtual objects and the encoding of its identifiers
+        # in the encoding of the whole list
+        self.table = None
+        self._tableEncoded = None
+
+        self._set_list(value)
+
+    def _set_list(self, value):
+        # the identifiers and None for the empty slots
+        self._slots = []
+
+        # the slot of each identifier by its integer value
+        self._positions = {}
+
+        # the encoding of the identifiers in the slots that have been encoded
+        self._parts = []
+
+        # the number of empty slots, the tree of the slots in use and the
+        # number of times it has been searched
+        self._empty = 0
+        self._tree = None
+        self._lookups = 0
+
+        # the encoding of the whole list, None when it has to be joined again
+        self._encoded = None
+
+        for objid in value:
+            self.append(objid)
+
+    def _get_value(self):
+        # the same list as the other arrays, the length then the elements
+        value = [len(self)]
+        if self._empty:
+            value.extend(objid for objid in self._slots if objid is not None)
+        else:
+            value.extend(self._slots)
+        if self.table is not None:
+            value.extend(ObjectIdentifier(int(objid_value)).value for objid_value in self.table.identifiers)
+        return value
+
+    def _set_value(self, value):
+        self._set_list(value[1:])
+
+    value = property(_get_value, _set_value)
+
+    def _build_tree(self):
+        """Build the tree of the slots in use."""
+        n = len(self._slots)
+        tree = [0] * (n + 1)
+        for i in xrange(1, n + 1):
+            if self._slots[i - 1] is not None:
+                tree[i] += 1
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def _count(self, slot):
+        """Return the number of slots in use up to and including this one."""
+        if not self._empty:
+            return slot + 1
+
+        tree = self._tree
+        i = slot + 1
+        count = 0
+        while i:
+            count += tree[i]
+            i -= (i & -i)
+        return count
+
+    def _slot(self, item):
+        """Return the slot of an array index."""
+        if self._empty:
+            # reading through the list pays for compacting it
+            self._lookups += 1
+            if self._lookups > (len(self._slots) >> 5):
+                self._compact()
+
+        if not self._empty:
+            return item - 1
+
+        # binary search down the tree for the slot of the item'th identifier
+        tree = self._tree
+        n = len(tree) - 1
+        mask = 1
+        while mask * 2 <= n:
+            mask *= 2
+
+        position = 0
+        while mask:
+            i = position + mask
+            if (i <= n) and (tree[i] < item):
+                position = i
+                item -= tree[i]
+            mask >>= 1
+
+        return position
+
+    def _compact(self):
+        """Drop the empty slots."""
+        if _debug: ObjectList._debug("_compact")
+
+        slots = []
+        parts = []
+        positions = {}
+        for slot, objid in enumerate(self._slots):
+            if objid is None:
+                continue
+            positions[ObjectIdentifier.packed(objid)] = len(slots)
+            slots.append(objid)
+
+            # the encoded slots are at the front so they still are
+            if slot < len(self._parts):
+                parts.append(self._parts[slot])
+
+        self._slots = slots
+        self._parts = parts
+        self._positions = positions
+        self._empty = 0
+        self._tree = None
+        self._lookups = 0
+
+    def append(self, value):
+        objid_value = ObjectIdentifier.packed(value)
+        if objid_value in self._positions:
+            raise ValueError, "%r already in the list" % (value,)
+
+        slot = len(self._slots)
+        self._slots.append(value)
+        self._positions[objid_value] = slot
+        self._encoded = None
+
+        # the tree gets a node for the new slot, one in use
+        if self._tree is not None:
+            i = slot + 1
+            self._tree.append(1 + self._count(slot - 1) - self._count(slot - (i & -i)))
+
+    def __len__(self):
+        if self.table is not None:
+            return len(self._slots) - self._empty + len(self.table)
+        return len(self._slots) - self._empty
+
+    def __getitem__(self, item):
+        length = len(self._slots) - self._empty
+
+        # the virtual objects are after the slots
+        if self.table is not None:
+            table_length = len(self.table)
+            if (item > length) and (item <= length + table_length):
+                return ObjectIdentifier(int(self.table.identifiers[item - length - 1])).value
+            if item == 0:
+                return length + table_length
+
+        # no wrapping index
+        if (item < 0) or (item > length):
+            raise IndexError, "index out of range"
+        if item == 0:
+            return length
+        if not self._empty:
+            return self._slots[item - 1]
+
+        slot = self._slot(item)
+        return self._slots[slot]
+
+    def __setitem__(self, item, value):
+        # no wrapping index
+        if (item < 1) or (item > len(self)):
+            raise IndexError, "index out of range"
+        if item > len(self._slots) - self._empty:
+            raise ValueError, "virtual objects are changed in the object store"
+
+        objid_value = ObjectIdentifier.packed(value)
+        slot = self._slot(item)
+        if self._positions.get(objid_value, slot) != slot:
+            raise ValueError, "%r already in the list" % (value,)
+
+        del self._positions[ObjectIdentifier.packed(self._slots[slot])]
+        self._positions[objid_value] = slot
+        self._slots[slot] = value
+        if slot < len(self._parts):
+            self._parts[slot] = encode_object_identifier_tag(objid_value)
+        self._encoded = None
+
+    def __delitem__(self, item):
+        # no wrapping index
+        if (item < 1) or (item > len(self)):
+            raise IndexError, "index out of range"
+        if item > len(self._slots) - self._empty:
+            raise ValueError, "virtual objects are deleted from the object store"
+
+        slot = self._slot(item)
+        del self._positions[ObjectIdentifier.packed(self._slots[slot])]
+        self._slots[slot] = None
+        if slot < len(self._parts):
+            self._parts[slot] = ''
+        self._encoded = None
+
+        # the first empty slot needs the tree
+        if not self._empty:
+            self._empty = 1
+            self._build_tree()
+        else:
+            self._empty += 1
+
+            # take it out of the tree
+            tree = self._tree
+            i = slot + 1
+            while i < len(tree):
+                tree[i] -= 1
+                i += (i & -i)
+
+        # compact when half the slots are empty
+        if self._empty * 2 > len(self._slots):
+            self._compact()
+
+    def index(self, value):
+        try:
+            objid_value = ObjectIdentifier.packed(value)
+        except (TypeError, ValueError):
+            raise ValueError, "%r not in array" % (value,)
+
+        slot = self._positions.get(objid_value)
+        if slot is not None:
+            return self._count(slot)
+
+        if self.table is not None:
+            i = self.table.position(objid_value)
+            if i is not None:
+                return len(self._slots) - self._empty + i + 1
+
+        raise ValueError, "%r not in array" % (value,)
+
+    def __contains__(self, value):
+        try:
+            objid_value = ObjectIdentifier.packed(value)
+        except (TypeError, ValueError):
+            return False
+
+        if objid_value in self._positions:
+            return True
+        return (self.table is not None) and (self.table.find(objid_value) is not None)
+
+    def get_encoded(self):
+        """Return the encoding of the identifiers as a string."""
+        if self.table is not None:
+            table_encoded = self.table.get_encoded()
+            if table_encoded is not self._tableEncoded:
+                self._encoded = None
+                self._tableEncoded = table_encoded
+        elif self._tableEncoded is not None:
+            self._encoded = None
+            self._tableEncoded = None
+
+        if self._encoded is None:
+            # encode the identifiers appended since the last time
+            parts = self._parts
+            for objid in self._slots[len(parts):]:
+                if objid is None:
+                    parts.append('')
+                else:
+                    parts.append(encode_object_identifier_tag(ObjectIdentifier.packed(objid)))
+
+            self._encoded = ''.join(parts)
+            if self._tableEncoded:
+                self._encoded += self._tableEncoded
+
+        return self._encoded
+
+    def encode(self, taglist):
+        if _debug: ObjectList._debug("encode %r", taglist)
+
+        # the list is going into a PDU, copy the encoding
+        if isinstance(taglist, EncodingTagList):
+            taglist.append_encoded(self.get_encoded())
+            return
+
+        # decode the tags from the encoding rather than building them from
+        # the values one at a time
+        data = self.get_encoded()
+        offset = 0
+        while offset < len(data):
+            tag, offset = decode_tag(data, offset)
+            taglist.append(tag)
+
+    def encode_item(self, item, taglist):
+        if _debug: ObjectList._debug("encode_item %r %r", item, taglist)
+
+        if item == 0:
+            helper = Unsigned(len(self))
+        else:
+            helper = ObjectIdentifier(self[item])
+
+        tag = Tag()
+        helper.encode(tag)
+        taglist.append(tag)
+
+    def decode(self, taglist):
+        if _debug: ObjectList._debug("decode %r", taglist)
+
+        # decode it like any other array
+        arry = ArrayOf(ObjectIdentifier)()
+        arry.decode(taglist)
+
+        self._set_list(arry.value[1:])
+
 #
 #   LocalDeviceObject
 #
@@ -122,7 +459,7 @@ class LocalDeviceObject(DeviceObject, Logging):
         # create a default implementation of an object list for local devices.
         # If it is specified in the kwargs, that overrides this default.
         if ('objectList' not in kwargs):
-            self.objectList = ArrayOf(ObjectIdentifier)([self.objectIdentifier])
+            self.objectList = ObjectList([self.objectIdentifier])
 
             # if the object has a property list and one wasn't provided
             # in the kwargs, then it was created by default and the objectList
@@ -138,6 +475,9 @@ class LocalDeviceObject(DeviceObject, Logging):
 
 class Application(ApplicationServiceElement, Logging):
 
+    # the kind of object store, a subclass can use a different one
+    objectStoreClass = ObjectStore
+
     def __init__(self, localDevice, localAddress, aseID=None):
         if _debug: Application._debug("__init__ %r %r aseID=%r", localDevice, localAddress, aseID)
         ApplicationServiceElement.__init__(self, aseID)
@@ -151,62 +491,93 @@ class Application(ApplicationServiceElement, Logging):
         else:
             self.localAddress = Address(localAddress)
         
-        # local objects by ID and name
-        self.objectName = {localDevice.objectName:localDevice}
-        self.objectIdentifier = {localDevice.objectIdentifier:localDevice}
+        # local objects, starting with the device
+        self.objectStore = self.objectStoreClass()
+        self.objectStore.add_object(localDevice)
+
+        # local objects by ID, by the integer value of their ID and by name
+        self.objectName = self.objectStore.objectName
+        self.objectIdentifier = self.objectStore.objectIdentifier
+        self.objectIdentifierIndex = self.objectStore.objectIdentifierIndex
 
     def add_object(self, obj):
         """Add an object to the local collection."""
         if _debug: Application._debug("add_object %r", obj)
 
-        # extract the object name and identifier
-        object_name = obj.objectName
-        if not object_name:
-            raise RuntimeError, "object name required"
-        object_identifier = obj.objectIdentifier
-        if not object_identifier:
-            raise RuntimeError, "object identifier required"
+        # put it in the store, which checks it
+        self.objectStore.add_object(obj)
+
+        # append the new object's identifier to the device's object list
+        self.localDevice.objectList.append(obj.objectIdentifier)
 
-        # make sure it hasn't already been defined
-        if object_name in self.objectName:
-            raise RuntimeError, "already an object with name '%s'" % (object_name,)
-        if object_identifier in self.objectIdentifier:
-            raise RuntimeError, "already an object with identifier %s" % (object_identifier,)
+    def add_objects(self, objs):
+        """Add a list of objects to the local collection, none of them are
+        added if any of them are not valid."""
+        if _debug: Application._debug("add_objects (%d)", len(objs))
 
-        # now put it in local dictionaries
-        self.objectName[object_name] = obj
-        self.objectIdentifier[object_identifier] = obj
+        # put them in the store, which checks them first
+        object_identifiers = self.objectStore.add_objects(objs)
 
-        # append the new object's identifier to the device's object list
-        self.localDevice.objectList.append(object_identifier)
+        # append their identifiers to the device's object list
+        object_list = self.localDevice.objectList
+        for object_identifier in object_identifiers:
+            object_list.append(object_identifier)
+
+    def add_virtual_objects(self, rows):
+        """Add virtual objects from (objectIdentifier, objectName, value)
+        rows, the object store must be a VirtualObjectStore."""
+        if _debug: Application._debug("add_virtual_objects (%d)", len(rows))
+
+        # the rows are kept in the table of the store
+        if not isinstance(self.objectStore, VirtualObjectStore):
+            raise RuntimeError, "virtual objects need a VirtualObjectStore"
+
+        # the object list reads the identifiers from the table
+        object_list = self.localDevice.objectList
+        if not isinstance(object_list, ObjectList):
+            raise RuntimeError, "virtual objects need an ObjectList"
+
+        # put them in the store, which checks them first
+        self.objectStore.add_rows(rows)
+        object_list.table = self.objectStore.table
 
     def delete_object(self, obj):
-        """Add an object to the local collection."""
+        """Delete an object from the local collection."""
         if _debug: Application._debug("delete_object %r", obj)
 
-        # extract the object name and identifier
-        object_name = obj.objectName
-        object_identifier = obj.objectIdentifier
+        # the identifier of a virtual object goes with its row
+        virtual = getattr(obj, '_objectStore', None) is not None
 
         # delete it from the application
-        del self.objectName[object_name]
-        del self.objectIdentifier[object_identifier]
+        self.objectStore.delete_object(obj)
 
         # remove the object's identifier from the device's object list
-        indx = self.localDevice.objectList.index(object_identifier)
-        del self.localDevice.objectList[indx]
+        if not virtual:
+            object_identifier = obj.objectIdentifier
+            indx = self.localDevice.objectList.index(object_identifier)
+            del self.localDevice.objectList[indx]
 
     def get_object_id(self, objid):
-        """Return a local object or None."""
-        return self.objectIdentifier.get(objid, None)
+        """Return a local object or None, the identifier can be a tuple, an
+        ObjectIdentifier or its integer value."""
+        return self.objectStore.get_object_id(objid)
 
     def get_object_name(self, objname):
         """Return a local object or None."""
-        return self.objectName.get(objname, None)
+        return self.objectStore.get_object_name(objname)
 
     def iter_objects(self):
         """Iterate over the objects."""
-        return self.objectIdentifier.itervalues()
+        return self.objectStore.iter_objects()
+
+    def iter_objects_of_type(self, objectType, low=None, high=None):
+        """Iterate over the objects of a type, optionally in a range of
+        instance numbers."""
+        return self.objectStore.iter_objects_of_type(objectType, low, high)
+
+    def iter_objects_with_prefix(self, prefix):
+        """Iterate over the objects with names that start with the prefix."""
+        return self.objectStore.iter_objects_with_prefix(prefix)
 
     #-----
     
@@ -269,6 +640,40 @@ class Application(ApplicationServiceElement, Logging):
         # away it goes
         self.request(iAm)
 
+    def do_WhoHasRequest(self, apdu):
+        """Respond to a Who-Has request."""
+        if _debug: Application._debug("do_WhoHasRequest %r", apdu)
+
+        # may be a restriction
+        if apdu.limits is not None:
+            device_instance = self.localDevice.objectIdentifier[1]
+            if (device_instance < apdu.limits.deviceInstanceRangeLowLimit):
+                return
+            if (device_instance > apdu.limits.deviceInstanceRangeHighLimit):
+                return
+
+        # find the object by its identifier or its name
+        if apdu.object.objectIdentifier is not None:
+            obj = self.get_object_id(apdu.object.objectIdentifier)
+        elif apdu.object.objectName is not None:
+            obj = self.get_object_name(apdu.object.objectName)
+        else:
+            obj = None
+        if _debug: Application._debug("    - object: %r", obj)
+        if not obj:
+            return
+
+        # create an I-Have "response" back to the source
+        iHave = IHaveRequest()
+        iHave.pduDestination = apdu.pduSource
+        iHave.deviceIdentifier = self.localDevice.objectIdentifier
+        iHave.objectIdentifier = obj.objectIdentifier
+        iHave.objectName = obj.objectName
+        if _debug: Application._debug("    - iHave: %r", iHave)
+
+        # away it goes
+        self.request(iHave)
+
     def do_ReadPropertyRequest(self, apdu):
         """Return the value of some property of one of our objects."""
         if _debug: Application._debug("do_ReadPropertyRequest %r", apdu)
@@ -289,31 +694,9 @@ class Application(ApplicationServiceElement, Logging):
             resp = Error(errorClass='object', errorCode='unknownObject', context=apdu)
         else:
             try:
-                # get the datatype
-                datatype = obj.get_datatype(apdu.propertyIdentifier)
-                if _debug: Application._debug("    - datatype: %r", datatype)
-
-                # get the value
-                value = obj.ReadProperty(apdu.propertyIdentifier, apdu.propertyArrayIndex)
+                # get the value cast into an Any, static values are already encoded
+                value = obj.ReadPropertyToAny(apdu.propertyIdentifier, apdu.propertyArrayIndex)
                 if _debug: Application._debug("    - value: %r", value)
-                if value is None:
-                    raise PropertyError, apdu.propertyIdentifier
-
-                # change atomic values into something encodeable
-                if issubclass(datatype, Atomic):
-                    value = datatype(value)
-                elif issubclass(datatype, Array) and (apdu.propertyArrayIndex is not None):
-                    if apdu.propertyArrayIndex == 0:
-                        value = Unsigned(value)
-                    elif issubclass(datatype.subtype, Atomic):
-                        value = datatype.subtype(value)
-                    elif not isinstance(value, datatype.subtype):
-                        raise TypeError, "invalid result datatype, expecting %s and got %s" \
-                            % (datatype.subtype.__name__, type(value).__name__)
-                elif not isinstance(value, datatype):
-                    raise TypeError, "invalid result datatype, expecting %s and got %s" \
-                        % (datatype.__name__, type(value).__name__)
-                if _debug: Application._debug("    - encodeable value: %r", value)
 
                 # this is a ReadProperty ack
                 resp = ReadPropertyACK(context=apdu)
@@ -322,8 +705,7 @@ class Application(ApplicationServiceElement, Logging):
                 resp.propertyArrayIndex = apdu.propertyArrayIndex
 
                 # save the result in the property value
-                resp.propertyValue = Any()
-                resp.propertyValue.cast_in(value)
+                resp.propertyValue = value
 
             except PropertyError:
                 resp = Error(errorClass='object', errorCode='unknownProperty', context=apdu)
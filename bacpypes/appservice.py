@@ -11,6 +11,8 @@ from debugging import ModuleLogger, DebugContents, bacpypes_debugging
 
 from comm import Client, ServiceAccessPoint, ApplicationServiceElement
 from task import OneShotTask
+from packettrace import packetTrace, CLIENT_TRANSACTION, SERVER_TRANSACTION
+from metrics import counter, histogram
 
 from apdu import *
 
@@ -18,6 +20,26 @@ from apdu import *
 _debug = 0
 _log = ModuleLogger(globals())
 
+# metrics, the counters by peer keep the most recently used peers
+PEER_METRICS_LIMIT = 256
+
+_packetsReceived = counter('bacpypes_packets_received_total', "Packets received by each layer", ('layer',)).labels('application')
+_packetsSent = counter('bacpypes_packets_sent_total', "Packets sent by each layer", ('layer',)).labels('application')
+_decodeErrors = counter('bacpypes_decode_errors_total', "Packets that could not be decoded by each layer", ('layer',)).labels('application')
+_transactions = counter('bacpypes_transactions_total', "Transactions that have ended", ('role', 'state'))
+_transactionSeconds = histogram('bacpypes_transaction_seconds', "How long transactions took to end", ('role', 'state'))
+_retries = counter('bacpypes_transaction_retries_total', "Requests and segments sent again to each peer", ('role', 'peer'), limit=PEER_METRICS_LIMIT)
+_timeouts = counter('bacpypes_transaction_timeouts_total', "Transaction timers that expired for each peer", ('role', 'peer'), limit=PEER_METRICS_LIMIT)
+
+_clientCompleted = _transactions.labels('client', 'completed')
+_clientAborted = _transactions.labels('client', 'aborted')
+_serverCompleted = _transactions.labels('server', 'completed')
+_serverAborted = _transactions.labels('server', 'aborted')
+_clientCompletedSeconds = _transactionSeconds.labels('client', 'completed')
+_clientAbortedSeconds = _transactionSeconds.labels('client', 'aborted')
+_serverCompletedSeconds = _transactionSeconds.labels('server', 'completed')
+_serverAbortedSeconds = _transactionSeconds.labels('server', 'aborted')
+
 #
 #   DeviceInfo
 #
@@ -83,6 +105,7 @@ class SSM(OneShotTask, DebugContents):
         self.ssmSAP = sap                   # reference to the service access point
         self.remoteDevice = None            # remote device
         self.invokeID = None                # invoke ID
+        self.startTime = _time()            # when the transaction started
 
         self.state = IDLE                   # initial state
         self.segmentAPDU = None             # refers to request or response
@@ -265,11 +288,19 @@ class ClientSSM(SSM):
 
         # pass the change down
         SSM.set_state(self, newState, timer)
+        packetTrace.transaction(CLIENT_TRANSACTION, self.remoteDevice, self.invokeID, newState)
 
         # completed or aborted, remove tracking
         if (newState == COMPLETED) or (newState == ABORTED):
             self.ssmSAP.clientTransactions.remove(self)
 
+            if newState == COMPLETED:
+                _clientCompleted.inc()
+                _clientCompletedSeconds.observe(_time() - self.startTime)
+            else:
+                _clientAborted.inc()
+                _clientAbortedSeconds.observe(_time() - self.startTime)
+
     def request(self, apdu):
         """This function is called by client transaction functions when it wants
         to send a message to the device."""
@@ -386,6 +417,7 @@ class ClientSSM(SSM):
     def process_task(self):
         """This function is called when something has taken too long."""
         if _debug: ClientSSM._debug("process_task")
+        _timeouts.labels('client', self.remoteDevice.address).inc()
 
         if self.state == SEGMENTED_REQUEST:
             self.segmented_request_timeout()
@@ -494,6 +526,7 @@ class ClientSSM(SSM):
         # try again
         if self.segmentRetryCount < self.ssmSAP.retryCount:
             if _debug: ClientSSM._debug("    - retry segmented request")
+            _retries.labels('client', self.remoteDevice.address).inc()
 
             self.segmentRetryCount += 1
             self.start_timer(self.ssmSAP.segmentTimeout)
@@ -570,6 +603,7 @@ class ClientSSM(SSM):
         self.retryCount += 1
         if self.retryCount < self.ssmSAP.retryCount:
             if _debug: ClientSSM._debug("    - no response, try again (%d < %d)", self.retryCount, self.ssmSAP.retryCount)
+            _retries.labels('client', self.remoteDevice.address).inc()
 
             # save the retry count, indication acts like the request is coming
             # from the application so the retryCount gets re-initialized.
@@ -664,11 +698,19 @@ class ServerSSM(SSM):
 
         # pass the change down
         SSM.set_state(self, newState, timer)
+        packetTrace.transaction(SERVER_TRANSACTION, self.remoteDevice, self.invokeID, newState)
 
         # completed or aborted, remove tracking
         if (newState == COMPLETED) or (newState == ABORTED):
             self.ssmSAP.serverTransactions.remove(self)
 
+            if newState == COMPLETED:
+                _serverCompleted.inc()
+                _serverCompletedSeconds.observe(_time() - self.startTime)
+            else:
+                _serverAborted.inc()
+                _serverAbortedSeconds.observe(_time() - self.startTime)
+
     def request(self, apdu):
         """This function is called by transaction functions to send
         to the application."""
@@ -798,6 +840,7 @@ class ServerSSM(SSM):
         complete the request, or the client failed to ack the segments of a
         segmented response."""
         if _debug: ServerSSM._debug("process_task")
+        _timeouts.labels('server', self.remoteDevice.address).inc()
 
         if self.state == SEGMENTED_REQUEST:
             self.segmented_request_timeout()
@@ -1011,6 +1054,8 @@ class ServerSSM(SSM):
 
         # try again
         if self.segmentRetryCount < self.ssmSAP.retryCount:
+            _retries.labels('server', self.remoteDevice.address).inc()
+
             self.segmentRetryCount += 1
             self.start_timer(self.ssmSAP.segmentTimeout)
             self.FillWindow(self.initialSequenceNumber)
@@ -1081,15 +1126,22 @@ class StateMachineAccessPoint(DeviceInfo, Client, ServiceAccessPoint):
         """Packets coming up the stack are APDU's."""
         if _debug: StateMachineAccessPoint._debug("confirmation %r", pdu)
 
+        _packetsReceived.inc()
+
         # make a more focused interpretation
         atype = apdu_types.get(pdu.apduType)
         if not atype:
             StateMachineAccessPoint._warning("    - unknown apduType: %r", pdu.apduType)
+            _decodeErrors.inc()
             return
             
         # decode it
-        apdu = atype()
-        apdu.decode(pdu)
+        try:
+            apdu = atype()
+            apdu.decode(pdu)
+        except Exception:
+            _decodeErrors.inc()
+            raise
         if _debug: StateMachineAccessPoint._debug("    - apdu: %r", apdu)
         
         if isinstance(apdu, ConfirmedRequestPDU):
@@ -1171,6 +1223,11 @@ class StateMachineAccessPoint(DeviceInfo, Client, ServiceAccessPoint):
         else:
             raise RuntimeError, "invalid APDU (8)"
         
+    def request(self, apdu):
+        """Count the packets going down the stack."""
+        _packetsSent.inc()
+        Client.request(self, apdu)
+
     def sap_indication(self, apdu):
         """This function is called when the application is requesting
         a new transaction as a client."""
@@ -1252,6 +1309,7 @@ class ApplicationServiceAccessPoint(ApplicationServiceElement, ServiceAccessPoin
                 xpdu = atype()
                 xpdu.decode(apdu)
             except Exception as err:
+                _decodeErrors.inc()
                 ApplicationServiceAccessPoint._exception("confirmed request decoding error: %r", err)
                 return
             
@@ -1265,6 +1323,7 @@ class ApplicationServiceAccessPoint(ApplicationServiceElement, ServiceAccessPoin
                 xpdu = atype()
                 xpdu.decode(apdu)
             except Exception as err:
+                _decodeErrors.inc()
                 ApplicationServiceAccessPoint._exception("unconfirmed request decoding error: %r", err)
                 return
                 
@@ -1323,6 +1382,7 @@ class ApplicationServiceAccessPoint(ApplicationServiceElement, ServiceAccessPoin
                 xpdu = atype()
                 xpdu.decode(apdu)
             except Exception as err:
+                _decodeErrors.inc()
                 ApplicationServiceAccessPoint._exception("unconfirmed request decoding error: %r", err)
                 return
 
@@ -1336,6 +1396,7 @@ class ApplicationServiceAccessPoint(ApplicationServiceElement, ServiceAccessPoin
                 xpdu = atype()
                 xpdu.decode(apdu)
             except Exception as err:
+                _decodeErrors.inc()
                 ApplicationServiceAccessPoint._exception("error PDU decoding error: %r", err)
                 xpdu = Error(errorClass=0, errorCode=0)
 
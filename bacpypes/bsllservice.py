@@ -5,6 +5,7 @@ BACnet Streaming Link Layer Service
 """
 
 import random
+import struct
 
 from debugging import ModuleLogger, DebugContents, bacpypes_debugging
 from errors import *
@@ -26,32 +27,39 @@ _log = ModuleLogger(globals())
 #
 
 @bacpypes_debugging
-def _Packetize(data):
-    if _debug: _Packetize._debug("_Packetize %r", data)
+def _Packetize(data, offset=0):
+    """Return the (start, end) span of the next packet in the data at or
+    after the offset, or None if there isn't a complete one."""
+    if _debug: _Packetize._debug("_Packetize %r %r", data, offset)
 
-    # look for the type field
-    start_ind = data.find('\x83')
-    if start_ind == -1:
-        return None
+    while 1:
+        # look for the type field
+        start_ind = data.find('\x83', offset)
+        if start_ind == -1:
+            return None
 
-    # chop off everything up to the start, it's garbage
-    if start_ind > 0:
-        if _debug: _Packetize._debug("    - garbage: %r", data[:start_ind])
-        data = data[start_ind:]
+        # everything up to the start is garbage
+        if _debug and (start_ind > offset):
+            _Packetize._debug("    - garbage: %r", data[offset:start_ind])
 
-    # make sure we have at least a complete header
-    if len(data) < 4:
-        return None
+        # make sure we have at least a complete header
+        if len(data) - start_ind < 4:
+            return None
 
-    # get the length, make sure we have the whole packet
-    total_len = (ord(data[2]) << 8) + ord(data[3])
-    if len(data) < total_len:
-        return None
+        # get the length, a short one is more garbage
+        total_len = struct.unpack_from('>H', data, start_ind + 2)[0]
+        if total_len < 4:
+            offset = start_ind + 1
+            continue
+
+        # make sure we have the whole packet
+        if len(data) - start_ind < total_len:
+            return None
 
-    packet_slice = (data[:total_len], data[total_len:])
-    if _debug: _Packetize._debug("    - packet_slice: %r", packet_slice)
+        packet_span = (start_ind, start_ind + total_len)
+        if _debug: _Packetize._debug("    - packet_span: %r", packet_span)
 
-    return packet_slice
+        return packet_span
 
 #
 #   _StreamToPacket
@@ -62,7 +70,7 @@ class _StreamToPacket(StreamToPacket):
 
     def __init__(self):
         if _debug: _StreamToPacket._debug("__init__")
-        StreamToPacket.__init__(self, _Packetize)
+        StreamToPacket.__init__(self, spanFn=_Packetize)
 
     def indication(self, pdu):
         if _debug: _StreamToPacket._debug("indication %r", pdu)
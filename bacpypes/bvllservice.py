@@ -12,6 +12,7 @@ from errors import *
 import udp
 
 from task import OneShotTask, RecurringTask
+from metrics import counter, gauge
 
 from comm import Client, Server, bind, \
     ServiceAccessPoint, ApplicationServiceElement
@@ -22,6 +23,12 @@ from bvll import *
 _debug = 0
 _log = ModuleLogger(globals())
 
+# metrics
+_packetsReceived = counter('bacpypes_packets_received_total', "Packets received by each layer", ('layer',)).labels('bvll')
+_packetsSent = counter('bacpypes_packets_sent_total', "Packets sent by each layer", ('layer',)).labels('bvll')
+_decodeErrors = counter('bacpypes_decode_errors_total', "Packets that could not be decoded by each layer", ('layer',)).labels('bvll')
+_fdtSize = gauge('bacpypes_bbmd_fdt_entries', "Foreign device table entries of each BBMD", ('address',))
+
 #
 #   _Multiplex Client and Server
 #
@@ -51,8 +58,8 @@ class _MultiplexServer(Server):
 @bacpypes_debugging
 class UDPMultiplexer:
 
-    def __init__(self, addr=None, noBroadcast=False):
-        if _debug: UDPMultiplexer._debug("__init__ %r noBroadcast=%r", addr, noBroadcast)
+    def __init__(self, addr=None, noBroadcast=False, batch=False, rcvbuf=None, reuseport=False):
+        if _debug: UDPMultiplexer._debug("__init__ %r noBroadcast=%r batch=%r rcvbuf=%r reuseport=%r", addr, noBroadcast, batch, rcvbuf, reuseport)
 
         # check for some options
         specialBroadcast = False
@@ -82,13 +89,14 @@ class UDPMultiplexer:
 
         # create and bind the direct address
         self.direct = _MultiplexClient(self)
-        self.directPort = udp.UDPDirector(self.addrTuple)
+        # the multiplexer keeps no per-peer state, so there are no actors
+        self.directPort = udp.UDPDirector(self.addrTuple, actorClass=None, batch=batch, rcvbuf=rcvbuf, reuseport=reuseport)
         bind(self.direct, self.directPort)
 
         # create and bind the broadcast address
         if specialBroadcast and (not noBroadcast):
             self.broadcast = _MultiplexClient(self)
-            self.broadcastPort = udp.UDPDirector(self.addrBroadcastTuple, reuse=True)
+            self.broadcastPort = udp.UDPDirector(self.addrBroadcastTuple, reuse=True, actorClass=None, batch=batch, rcvbuf=rcvbuf)
             bind(self.direct, self.broadcastPort)
         else:
             self.broadcast = None
@@ -100,15 +108,24 @@ class UDPMultiplexer:
     def indication(self, server, pdu):
         if _debug: UDPMultiplexer._debug("indication %r %r", server, pdu)
 
+        dest = self.address_tuple(pdu.pduDestination)
+        if _debug: UDPMultiplexer._debug("    - requesting: %r", dest)
+        xpdu = PDU(pdu, destination=dest)
+
+        # check for a fan-out of the same data to a list of destinations
+        if pdu.pduDestinations is not None:
+            xpdu.pduDestinations = [self.address_tuple(addr) for addr in pdu.pduDestinations]
+            if _debug: UDPMultiplexer._debug("    - fan-out: %r", xpdu.pduDestinations)
+
+        self.directPort.indication(xpdu)
+
+    def address_tuple(self, addr):
+        """Return the IP address tuple for a local station or broadcast."""
         # check for a broadcast message
-        if pdu.pduDestination.addrType == Address.localBroadcastAddr:
-            dest = self.addrBroadcastTuple
-            if _debug: UDPMultiplexer._debug("    - requesting local broadcast: %r", dest)
+        if addr.addrType == Address.localBroadcastAddr:
+            return self.addrBroadcastTuple
         else:
-            dest = unpack_ip_addr(pdu.pduDestination.addrAddr)
-            if _debug: UDPMultiplexer._debug("    - requesting local station: %r", dest)
-
-        self.directPort.indication(PDU(pdu, destination=dest))
+            return unpack_ip_addr(addr.addrAddr)
 
     def confirmation(self, client, pdu):
         if _debug: UDPMultiplexer._debug("confirmation %r %r", client, pdu)
@@ -250,18 +267,25 @@ class AnnexJCodec(Client, Server):
         bvlpdu.encode(pdu)
         
         # send it downstream
+        _packetsSent.inc()
         self.request(pdu)
 
     def confirmation(self, pdu):
         if _debug: AnnexJCodec._debug("confirmation %r", pdu)
 
+        _packetsReceived.inc()
+
         # interpret as a BVLL PDU
-        bvlpdu = BVLPDU()
-        bvlpdu.decode(pdu)
+        try:
+            bvlpdu = BVLPDU()
+            bvlpdu.decode(pdu)
 
-        # get the class related to the function
-        rpdu = bvl_pdu_types[bvlpdu.bvlciFunction]()
-        rpdu.decode(bvlpdu)
+            # get the class related to the function
+            rpdu = bvl_pdu_types[bvlpdu.bvlciFunction]()
+            rpdu.decode(bvlpdu)
+        except Exception:
+            _decodeErrors.inc()
+            raise
 
         # send it upstream
         self.response(rpdu)
@@ -547,10 +571,19 @@ class BIPBBMD(BIPSAP, Client, Server, RecurringTask, DebugContents):
         self.bbmdAddress = addr
         self.bbmdBDT = []
         self.bbmdFDT = []
+        _fdtSize.labels(addr).set_function(self.bbmdFDT.__len__)
 
         # install so process_task runs
         self.install_task()
 
+    def close(self):
+        """Stop aging the foreign device table and forget its size gauge."""
+        if _debug: BIPBBMD._debug("close")
+
+        if self.isScheduled:
+            self.suspend_task()
+        _fdtSize.remove(self.bbmdAddress)
+
     def indication(self, pdu):
         if _debug: BIPBBMD._debug("indication %r", pdu)
 
@@ -578,18 +611,8 @@ class BIPBBMD(BIPSAP, Client, Server, RecurringTask, DebugContents):
             xpdu = ForwardedNPDU(self.bbmdAddress, pdu, user_data=pdu.pduUserData)
             if _debug: BIPBBMD._debug("    - forwarded xpdu: %r", xpdu)
 
-            # send it to the peers
-            for bdte in self.bbmdBDT:
-                if bdte != self.bbmdAddress:
-                    xpdu.pduDestination = Address( ((bdte.addrIP|~bdte.addrMask), bdte.addrPort) )
-                    BIPBBMD._debug("        - sending to peer: %r", xpdu.pduDestination)
-                    self.request(xpdu)
-
-            # send it to the registered foreign devices
-            for fdte in self.bbmdFDT:
-                xpdu.pduDestination = fdte.fdAddress
-                if _debug: BIPBBMD._debug("        - sending to foreign device: %r", xpdu.pduDestination)
-                self.request(xpdu)
+            # send it to the peers and the registered foreign devices
+            self.forward(xpdu, self.peer_destinations() + self.foreign_destinations())
 
         else:
             BIPBBMD._warning("invalid destination address: %r", pdu.pduDestination)
@@ -636,16 +659,12 @@ class BIPBBMD(BIPSAP, Client, Server, RecurringTask, DebugContents):
             if _debug: BIPBBMD._debug("    - forwarded xpdu: %r", xpdu)
 
             # look for self as first entry in the BDT
+            destinations = []
             if self.bbmdBDT and (self.bbmdBDT[0] == self.bbmdAddress):
-                xpdu.pduDestination = LocalBroadcast()
-                if _debug: BIPBBMD._debug("        - local broadcast")
-                self.request(xpdu)
+                destinations.append(LocalBroadcast())
 
             # send it to the registered foreign devices
-            for fdte in self.bbmdFDT:
-                xpdu.pduDestination = fdte.fdAddress
-                if _debug: BIPBBMD._debug("        - sending to foreign device: %r", xpdu.pduDestination)
-                self.request(xpdu)
+            self.forward(xpdu, destinations + self.foreign_destinations())
 
         elif isinstance(pdu, RegisterForeignDevice):
             # process the request
@@ -694,23 +713,15 @@ class BIPBBMD(BIPSAP, Client, Server, RecurringTask, DebugContents):
             xpdu = ForwardedNPDU(pdu.pduSource, pdu, user_data=pdu.pduUserData)
             if _debug: BIPBBMD._debug("    - forwarded xpdu: %r", xpdu)
 
-            # send it to the peers
-            for bdte in self.bbmdBDT:
-                if bdte == self.bbmdAddress:
-                    xpdu.pduDestination = LocalBroadcast()
-                    if _debug: BIPBBMD._debug("        - local broadcast")
-                    self.request(xpdu)
-                else:
-                    xpdu.pduDestination = Address( ((bdte.addrIP|~bdte.addrMask), bdte.addrPort) )
-                    if _debug: BIPBBMD._debug("        - sending to peer: %r", xpdu.pduDestination)
-                    self.request(xpdu)
+            # send it to the peers, a local broadcast for this BBMD
+            destinations = []
+            if self.bbmdAddress in self.bbmdBDT:
+                destinations.append(LocalBroadcast())
+            destinations.extend(self.peer_destinations())
 
             # send it to the other registered foreign devices
-            for fdte in self.bbmdFDT:
-                if fdte.fdAddress != pdu.pduSource:
-                    xpdu.pduDestination = fdte.fdAddress
-                    if _debug: BIPBBMD._debug("        - sending to foreign device: %r", xpdu.pduDestination)
-                    self.request(xpdu)
+            destinations.extend(self.foreign_destinations(exclude=pdu.pduSource))
+            self.forward(xpdu, destinations)
 
         elif isinstance(pdu, OriginalUnicastNPDU):
             # build a vanilla PDU
@@ -732,22 +743,43 @@ class BIPBBMD(BIPSAP, Client, Server, RecurringTask, DebugContents):
             xpdu = ForwardedNPDU(pdu.pduSource, pdu, user_data=pdu.pduUserData)
             if _debug: BIPBBMD._debug("    - forwarded xpdu: %r", xpdu)
 
-            # send it to the peers
-            for bdte in self.bbmdBDT:
-                if bdte != self.bbmdAddress:
-                    xpdu.pduDestination = Address( ((bdte.addrIP|~bdte.addrMask), bdte.addrPort) )
-                    if _debug: BIPBBMD._debug("        - sending to peer: %r", xpdu.pduDestination)
-                    self.request(xpdu)
-
-            # send it to the registered foreign devices
-            for fdte in self.bbmdFDT:
-                xpdu.pduDestination = fdte.fdAddress
-                if _debug: BIPBBMD._debug("        - sending to foreign device: %r", xpdu.pduDestination)
-                self.request(xpdu)
+            # send it to the peers and the registered foreign devices
+            self.forward(xpdu, self.peer_destinations() + self.foreign_destinations())
 
         else:
             BIPBBMD._warning("invalid pdu type: %s", type(pdu))
 
+    def peer_destinations(self):
+        """Return the directed broadcast addresses of the other BDT peers."""
+        return [Address( ((bdte.addrIP|~bdte.addrMask), bdte.addrPort) )
+            for bdte in self.bbmdBDT
+            if bdte != self.bbmdAddress
+            ]
+
+    def foreign_destinations(self, exclude=None):
+        """Return the addresses of the registered foreign devices."""
+        return [fdte.fdAddress
+            for fdte in self.bbmdFDT
+            if (exclude is None) or (fdte.fdAddress != exclude)
+            ]
+
+    def forward(self, xpdu, destinations):
+        """Send a forwarded NPDU to a list of destinations.  The PDU is
+        passed downstream once with the list as its destinations, and the
+        first one as its destination, so it is encoded once and the same
+        datagram is sent to each of them."""
+        if _debug: BIPBBMD._debug("forward %r %r", xpdu, destinations)
+
+        # nothing to do
+        if not destinations:
+            return
+
+        xpdu.pduDestination = destinations[0]
+        xpdu.pduDestinations = destinations
+
+        # send it downstream
+        self.request(xpdu)
+
     def register_foreign_device(self, addr, ttl):
         """Add a foreign device to the FDT."""
         if _debug: BIPBBMD._debug("register_foreign_device %r %r", addr, ttl)
@@ -52,6 +52,10 @@ class PCI(DebugContents):
 
     _debug_contents = ('pduUserData+', 'pduSource', 'pduDestination')
 
+    # the same data sent to more than one destination, a list of addresses
+    # of the same kind as the destination or None
+    pduDestinations = None
+
     def __init__(self, *args, **kwargs):
         if _debug: PCI._debug("__init__ %r %r", args, kwargs)
 
@@ -80,6 +84,8 @@ class PCI(DebugContents):
         self.pduUserData = pci.pduUserData
         self.pduSource = pci.pduSource
         self.pduDestination = pci.pduDestination
+        if pci.pduDestinations is not None:
+            self.pduDestinations = pci.pduDestinations
 
     def pci_contents(self, use_dict=None, as_class=dict):
         """Return the contents of an object as a dict."""
@@ -6,7 +6,7 @@ Command Logging
 
 import logging
 
-from debugging import Logging, LoggingFormatter, ModuleLogger
+from debugging import Logging, LoggingFormatter, ModuleLogger, update_debugging
 from comm import PDU, Client, Server
 
 # some debugging
@@ -95,6 +95,7 @@ class CommandLogging(Logging):
 
                 # add it to the logger
                 logger.addHandler(handler)
+                update_debugging()
                 if not addr:
                     response = "handler to %s added" % (loggerName,)
                 else:
@@ -111,6 +112,7 @@ class CommandLogging(Logging):
 
                 # remove it from the logger
                 logger.removeHandler(handler)
+                update_debugging()
                 if not addr:
                     response = "handler to %s removed" % (loggerName,)
                 else:
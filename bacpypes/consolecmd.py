@@ -15,7 +15,7 @@ import logging
 
 from threading import Thread
 
-from debugging import Logging, function_debugging, ModuleLogger
+from debugging import Logging, function_debugging, ModuleLogger, update_debugging
 from consolelogging import ConsoleLogHandler
 
 import core
@@ -195,6 +195,7 @@ class ConsoleCmd(cmd.Cmd, Thread, Logging):
 
             # remove it from the logger
             logger.removeHandler(handler)
+            update_debugging()
             self.stdout.write("handler to %s removed\n" % loggerName)
         self.stdout.write("\n")
 
@@ -9,7 +9,7 @@ import types
 import logging
 import argparse
 
-from debugging import bacpypes_debugging, LoggingFormatter, ModuleLogger
+from debugging import bacpypes_debugging, LoggingFormatter, ModuleLogger, update_debugging
 
 from ConfigParser import ConfigParser
 
@@ -60,6 +60,11 @@ def ConsoleLogHandler(loggerRef='', level=logging.DEBUG, color=None):
     # make sure the logger has at least this level
     loggerRef.setLevel(level)
 
+    # turn on the debugging functions below it
+    update_debugging()
+
+    return hdlr
+
 #
 #   ArgumentParser
 #
@@ -243,10 +243,10 @@ class Sequence(object):
                     taglist.Pop()
 
                 try:
-                    # make a backup of the tag list in case the structure manages to
-                    # decode some content but not all of it.  This is not supposed to
-                    # happen if the ASN.1 has been formed correctly.
-                    backup = taglist.tagList[:]
+                    # save the position in the tag list in case the structure manages
+                    # to decode some content but not all of it.  This is not supposed
+                    # to happen if the ASN.1 has been formed correctly.
+                    backup = taglist.save_position()
 
                     # build a value and decode it
                     value = element.klass()
@@ -262,7 +262,7 @@ class Sequence(object):
                         setattr(self, element.name, None)
 
                         # restore the backup
-                        taglist.tagList = backup
+                        taglist.restore_position(backup)
                     else:
                         raise
 
@@ -415,9 +415,9 @@ def SequenceOf(klass):
         def decode(self, taglist):
             if _debug: _SequenceOf._debug("(%r)decode %r", self.__class__.__name__, taglist)
 
-            while len(taglist) != 0:
+            while 1:
                 tag = taglist.Peek()
-                if tag.tagClass == Tag.closingTagClass:
+                if (tag is None) or (tag.tagClass == Tag.closingTagClass):
                     return
 
                 if issubclass(self.subtype, (Atomic, AnyAtomic)):
@@ -611,9 +611,9 @@ def ArrayOf(klass):
             # start with an empty array
             self.value = [0]
             
-            while len(taglist) != 0:
+            while 1:
                 tag = taglist.Peek()
-                if tag.tagClass == Tag.closingTagClass:
+                if (tag is None) or (tag.tagClass == Tag.closingTagClass):
                     break
 
                 if issubclass(self.subtype, (Atomic, AnyAtomic)):
@@ -969,43 +969,120 @@ class Choice(object):
 #   Any
 #
 
+# the kinds of values cast_out() keeps, the rest are decoded each time
+_immutable_types = (types.NoneType, bool, int, long, float, str, unicode, tuple)
+
 @bacpypes_debugging
-class Any:
+class Any(object):
+
+    """Content of any type, the tags of the encoded value.  When it is
+    decoded from a tag stream it keeps the encoded data and the tags are
+    only decoded when the content is cast out, the value cast out for each
+    class is kept so casting the same way again returns the same value."""
 
     def __init__(self, *args):
-        self.tagList = TagList()
+        self._tagList = TagList()
+
+        # the encoded data and the start and end of the content when it
+        # has not been decoded into tags
+        self._span = None
+
+        # values cast out, by class
+        self._values = {}
 
         # cast in the args
         for arg in args:
             self.cast_in(arg)
 
+    def _get_tag_list(self):
+        # decode the tags, the content might be changed through the list
+        if self._span:
+            data, start, end = self._span
+            self._tagList = TagList()
+            while start < end:
+                tag, start = decode_tag(data, start, end)
+                self._tagList.append(tag)
+            self._span = None
+        self._values = {}
+
+        return self._tagList
+
+    def _set_tag_list(self, taglist):
+        self._tagList = taglist
+        self._span = None
+        self._values = {}
+
+    tagList = property(_get_tag_list, _set_tag_list)
+
     def encode(self, taglist):
         if _debug: Any._debug("encode %r", taglist)
 
-        taglist.extend(self.tagList)
+        if self._span:
+            data, start, end = self._span
+
+            # copy the encoded data when the list is going into a PDU
+            if isinstance(taglist, EncodingTagList):
+                taglist.append_encoded(data[start:end])
+                return
+
+            while start < end:
+                tag, start = decode_tag(data, start, end)
+                taglist.append(tag)
+        else:
+            taglist.extend(self._tagList)
 
     def decode(self, taglist):
         if _debug: Any._debug("decode %r", taglist)
 
+        self._values = {}
+
+        # keep the encoded data rather than decoding the tags
+        if isinstance(taglist, TagStream) and not self._tagList:
+            span = taglist.pop_span()
+            if span:
+                self._span = (taglist.data,) + span
+                return
+
         lvl = 0
-        while len(taglist) != 0:
+        while 1:
             tag = taglist.Peek()
+            if tag is None:
+                break
             if tag.tagClass == Tag.openingTagClass:
                 lvl += 1
             elif tag.tagClass == Tag.closingTagClass:
                 lvl -= 1
                 if lvl < 0: break
 
-            self.tagList.append(taglist.Pop())
+            self._tagList.append(taglist.Pop())
 
         # make sure everything balances
         if lvl > 0:
             raise DecodingError, "mismatched open/close tags"
 
+    def get_encoded(self):
+        """Return the encoding of the content as a string."""
+        if self._span:
+            data, start, end = self._span
+            return data[start:end]
+
+        return encode_tags(self._tagList)
+
+    def set_encoded(self, data):
+        """Make the content the tags encoded in a string."""
+        self._tagList = TagList()
+        self._span = (data, 0, len(data))
+        self._values = {}
+
     def cast_in(self, element):
         """encode the element into the internal tag list."""
         if _debug: Any._debug("cast_in %r", element)
 
+        # an element that keeps its own encoding
+        if hasattr(element, 'get_encoded') and not (self._span or self._tagList):
+            self.set_encoded(element.get_encoded())
+            return
+
         t = TagList()
         if isinstance(element, Atomic):
             tag = Tag()
@@ -1020,17 +1097,37 @@ class Any:
 
         self.tagList.extend(t.tagList)
 
+    def _content(self):
+        """Return a tag list of the content to decode a value from."""
+        if self._span:
+            data, start, end = self._span
+            return TagStream(data, start, end)
+
+        return TagList(self._tagList[:])
+
     def cast_out(self, klass):
         """Interpret the content as a particular class."""
         if _debug: Any._debug("cast_out %r", klass)
 
+        # check for a value already cast out
+        if klass in self._values:
+            return self._values[klass]
+
+        # only keep values the caller can not change
+        value = self._cast_out(klass)
+        if isinstance(value, _immutable_types):
+            self._values[klass] = value
+
+        return value
+
+    def _cast_out(self, klass):
         # check for a sequence element
         if _sequence_of_classes.has_key(klass):
             # build a sequence helper
             helper = klass()
 
             # make a copy of the tag list
-            t = TagList(self.tagList[:])
+            t = self._content()
 
             # let it decode itself
             helper.decode(t)
@@ -1048,7 +1145,7 @@ class Any:
             helper = klass()
 
             # make a copy of the tag list
-            t = TagList(self.tagList[:])
+            t = self._content()
 
             # let it decode itself
             helper.decode(t)
@@ -1061,16 +1158,26 @@ class Any:
             return helper.value[1:]
 
         elif issubclass(klass, (Atomic, AnyAtomic)):
-            # make sure there's only one piece
-            if len(self.tagList) == 0:
-                raise DecodingError, "missing cast component"
-            if len(self.tagList) > 1:
-                raise DecodingError, "too many cast components"
+            # decode the one tag straight from the data
+            if self._span:
+                data, start, end = self._span
+                if start >= end:
+                    raise DecodingError, "missing cast component"
+                tag, start = decode_tag(data, start, end)
+                if start < end:
+                    raise DecodingError, "too many cast components"
+            else:
+                # make sure there's only one piece
+                if len(self._tagList) == 0:
+                    raise DecodingError, "missing cast component"
+                if len(self._tagList) > 1:
+                    raise DecodingError, "too many cast components"
+                tag = self._tagList[0]
 
             if _debug: Any._debug("    - building helper: %r", klass)
 
             # a helper cooperates between the atomic value and the tag
-            helper = klass(self.tagList[0])
+            helper = klass(tag)
 
             # return the value
             return helper.value
@@ -1082,7 +1189,7 @@ class Any:
             value = klass()
 
             # make a copy of the tag list
-            t = TagList(self.tagList[:])
+            t = self._content()
 
             # let it decode itself
             value.decode(t)
@@ -1096,7 +1203,11 @@ class Any:
 
     def is_application_class_null(self):
         if _debug: Any._debug("is_application_class_null")
-        return (len(self.tagList) == 1) and (self.tagList[0].tagClass == Tag.applicationTagClass) and (self.tagList[0].tagNumber == Tag.nullAppTag)
+        if self._span:
+            data, start, end = self._span
+            return (end == start + 1) and (data[start] == '\x00')
+
+        return (len(self._tagList) == 1) and (self._tagList[0].tagClass == Tag.applicationTagClass) and (self._tagList[0].tagNumber == Tag.nullAppTag)
 
     def debug_contents(self, indent=1, file=sys.stdout, _ids=None):
         self.tagList.debug_contents(indent, file, _ids)
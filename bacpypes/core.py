@@ -4,6 +4,7 @@
 Core
 """
 
+import os
 import sys
 import asyncore
 import logging
@@ -12,6 +13,9 @@ import time
 import traceback
 
 from task import TaskManager
+from packettrace import dump_packet_trace
+from metrics import gauge, histogram
+from profiler import LoopProfiler, LoopSampler, SLOW_THRESHOLD
 
 # some debugging
 _log = logging.getLogger(__name__)
@@ -21,6 +25,15 @@ running = False
 taskManager = None
 deferredFns = []
 sleeptime = 0.0
+workerPids = []
+profiler = None
+sampler = None
+
+# metrics
+_deferredQueue = gauge('bacpypes_deferred_functions', "Functions waiting to be called by the core loop")
+_deferredQueue.set_function(lambda: len(deferredFns))
+_deferredBatch = histogram('bacpypes_deferred_batch_size', "Functions called together by each pass of the core loop",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
 
 #
 #   run
@@ -30,7 +43,7 @@ SPIN = 1.0
 
 def run(spin=SPIN):
     _log.debug("run spin=%r", spin)
-    global running, taskManager, deferredFns, sleeptime
+    global running, taskManager, deferredFns, sleeptime, profiler
 
     # reference the task manager (a singleton)
     taskManager = TaskManager()
@@ -43,6 +56,11 @@ def run(spin=SPIN):
 #       _log.debug("time: %r", time.time())
         loopCount += 1
 
+        # the profiler is checked once each pass
+        loopProfiler = profiler
+        if loopProfiler:
+            loopStart = time.time()
+
         # get the next task
         task, delta = taskManager.get_next_task()
         
@@ -50,7 +68,10 @@ def run(spin=SPIN):
             # if there is a task to process, do it
             if task:
                 # _log.debug("task: %r", task)
-                taskManager.process_task(task)
+                if loopProfiler:
+                    loopProfiler.process_task(taskManager, task)
+                else:
+                    taskManager.process_task(task)
 
             # if delta is None, there are no tasks, default to spinning
             if delta is None:
@@ -67,21 +88,34 @@ def run(spin=SPIN):
 #           _log.debug("delta: %r", delta)
 
             # loop for socket activity
-            asyncore.loop(timeout=delta, count=1)
+            if loopProfiler:
+                socketStart = time.time()
+                asyncore.loop(timeout=delta, count=1)
+                socketEnd = time.time()
+            else:
+                asyncore.loop(timeout=delta, count=1)
 
             # check for deferred functions
             while deferredFns:
                 # get a reference to the list
                 fnlist = deferredFns
                 deferredFns = []
+                _deferredBatch.observe(len(fnlist))
                 
                 # call the functions
-                for fn, args, kwargs in fnlist:
-                    # _log.debug("call: %r %r %r", fn, args, kwargs)
-                    fn( *args, **kwargs)
+                if loopProfiler:
+                    for fn, args, kwargs in fnlist:
+                        loopProfiler.call(fn, args, kwargs)
+                else:
+                    for fn, args, kwargs in fnlist:
+                        # _log.debug("call: %r %r %r", fn, args, kwargs)
+                        fn( *args, **kwargs)
                 
                 # done with this list
                 del fnlist
+
+            if loopProfiler:
+                loopProfiler.iteration(loopStart, socketStart, socketEnd)
                 
         except KeyboardInterrupt:
             _log.info("keyboard interrupt")
@@ -153,6 +187,13 @@ def stop(*args):
 
     running = False
 
+    # pass it along to the worker processes
+    for pid in workerPids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+
     # trigger the task manager event
     if taskManager and taskManager.trigger:
         taskManager.trigger.set()
@@ -161,6 +202,30 @@ def stop(*args):
 if hasattr(signal, 'SIGTERM'):
     signal.signal(signal.SIGTERM, stop)
 
+#
+#   fork_workers
+#
+
+def fork_workers(count):
+    """Fork count - 1 worker processes and return the index of this process,
+    zero for the parent.  Call this before building the stack and calling
+    run() so each process has its own sockets and task manager, objects
+    created before the fork are shared copy-on-write.  They are not kept
+    in step, a write in one process is not seen by the others."""
+    _log.debug("fork_workers %r", count)
+    global workerPids
+
+    for index in range(1, count):
+        pid = os.fork()
+        if pid == 0:
+            # workers do not have workers
+            del workerPids[:]
+            return index
+
+        workerPids.append(pid)
+
+    return 0
+
 #
 #   print_stack
 #
@@ -168,7 +233,7 @@ if hasattr(signal, 'SIGTERM'):
 def print_stack(sig, frame):
     """Signal handler to print a stack trace and some interesting values."""
     _log.debug("print_stack, %r, %r", sig, frame)
-    global running, deferredFns, sleeptime
+    global running, deferredFns, sleeptime, workerPids, profiler, sampler
 
     sys.stderr.write("==== USR1 Signal, %s\n" % time.strftime("%d-%b-%Y %H:%M:%S"))
 
@@ -176,6 +241,7 @@ def print_stack(sig, frame):
     sys.stderr.write("    running: %r\n" % (running,))
     sys.stderr.write("    deferredFns: %r\n" % (deferredFns,))
     sys.stderr.write("    sleeptime: %r\n" % (sleeptime,))
+    sys.stderr.write("    workerPids: %r\n" % (workerPids,))
 
     sys.stderr.write("---------- stack\n")
     traceback.print_stack(frame)
@@ -194,6 +260,23 @@ def print_stack(sig, frame):
         for k, v in f.f_locals.items():
             sys.stderr.write("    %s: %r\n" % (k, v))
 
+    # where the time has been going
+    if profiler:
+        sys.stderr.write("---------- profiler\n")
+        profiler.report(sys.stderr)
+    if sampler:
+        sys.stderr.write("---------- sampler, %d samples\n" % (sampler.samples,))
+        for name, count in sampler.top():
+            sys.stderr.write("    %-48s %d\n" % (name, count))
+
+    # write out the packet trace for post-mortem analysis
+    sys.stderr.write("---------- packet trace\n")
+    try:
+        fname = dump_packet_trace()
+        sys.stderr.write("    %s\n" % (fname,))
+    except (IOError, OSError) as err:
+        sys.stderr.write("    failed: %s\n" % (err,))
+
     sys.stderr.flush()
 
 # set a USR1 signal handler to print a stack trace
@@ -221,3 +304,41 @@ def enable_sleeping(stime=0.001):
 
     # set the sleep time
     sleeptime = stime
+
+#
+#   enable_profiling
+#
+
+def enable_profiling(threshold=SLOW_THRESHOLD, sample=None):
+    """Time the parts of the loop and log the callbacks that take longer
+    than the threshold, when sample is given it is the interval in seconds
+    of a sampling profiler of the loop.  Returns the LoopProfiler."""
+    _log.debug("enable_profiling threshold=%r sample=%r", threshold, sample)
+    global profiler, sampler
+
+    # stop the current ones
+    disable_profiling()
+
+    profiler = LoopProfiler(threshold)
+    profiler.start()
+
+    if sample:
+        sampler = LoopSampler(sample)
+        sampler.start()
+
+    return profiler
+
+#
+#   disable_profiling
+#
+
+def disable_profiling():
+    _log.debug("disable_profiling")
+    global profiler, sampler
+
+    if profiler:
+        profiler.stop()
+        profiler = None
+    if sampler:
+        sampler.stop()
+        sampler = None
@@ -5,10 +5,14 @@ Debugging
 """
 
 import sys
+import time
 import types
+import struct
 import logging
 import cStringIO
 
+from functools import partial
+
 # set the level of the root logger
 _root = logging.getLogger()
 _root.setLevel(1)
@@ -246,6 +250,30 @@ class LoggingFormatter(logging.Formatter):
 
         return msg
 
+#
+#   _NullLogger
+#
+#   The debug and trace functions of a class or function that is not being
+#   debugged are the bound methods of this object, so calling them costs
+#   a call and nothing else, no log record is created.
+#
+
+class _NullLogger(object):
+
+    def debug(self, *args, **kwargs):
+        pass
+
+    def trace(self, *args, **kwargs):
+        pass
+
+_null_logger = _NullLogger()
+
+# objects with a debugging logger by name, the names by trace source and
+# the trace source of each name
+_debugging_objects = {}
+_trace_sources = []
+_trace_ids = {}
+
 #
 #   bacpypes_debugging
 #
@@ -257,15 +285,291 @@ def bacpypes_debugging(obj):
     
     # make it available to instances
     obj._logger = logger
-    obj._debug = logger.debug
     obj._info = logger.info
     obj._warning = logger.warning
     obj._error = logger.error
     obj._exception = logger.exception
     obj._fatal = logger.fatal
 
+    # the debug function is only the logger when there is a handler
+    _debugging_objects[logger.name] = obj
+    _set_debugging(obj)
+
+    # binary trace records identify the object by number, one for each
+    # logger name no matter how many times it is used
+    obj._traceID = _trace_ids.setdefault(logger.name, len(_trace_sources))
+    if obj._traceID == len(_trace_sources):
+        _trace_sources.append(logger.name)
+    obj._tracing = False
+    obj._trace = _null_logger.trace
+
     return obj
 
+#
+#   _set_debugging
+#
+
+def _set_debugging(obj):
+    """Check the logger of the object and its parents for a handler that
+    would show debugging messages."""
+    logger = obj._logger
+    enabled = False
+    while logger and not enabled:
+        enabled = any((hdlr.level <= logging.DEBUG) for hdlr in logger.handlers)
+        logger = logger.parent if logger.propagate else None
+
+    # flag checked by the hot paths, debug function called by the rest
+    obj._debugging = enabled
+    obj._debug = obj._logger.debug if enabled else _null_logger.debug
+
+#
+#   update_debugging
+#
+
+def update_debugging():
+    """Update the per-object debugging flags, call this after changing the
+    handlers of a logger, their levels, or the propagate attribute of a
+    logger without ConsoleLogHandler()."""
+    for obj in _debugging_objects.values():
+        _set_debugging(obj)
+
+#
+#   OctetRing
+#
+#   A buffer of variable length records bounded by the total number of
+#   octets.  The records are copied into a preallocated bytearray as a
+#   length followed by the data and never wrap around the end, when there
+#   is not enough room after the last record the next one starts over at
+#   the front.  The oldest records are dropped to make room, at least a
+#   sixty-fourth of the ring at a time so a full ring is not dropping one
+#   record for every one it adds.
+#
+
+_ring_header = struct.Struct('<I')
+
+class OctetRing(object):
+
+    def __init__(self, size=1048576):
+        self.size = size
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+
+        # offset of the oldest record, the next record, and the end of the
+        # records at the back of the buffer when the next ones have wrapped
+        self.head = 0
+        self.tail = 0
+        self.end = size
+
+        # the number of records in the ring, written and dropped
+        self.length = 0
+        self.count = 0
+        self.dropped = 0
+
+    def _reserve(self, length):
+        """Return the offset of room for a record of this many octets,
+        header included, dropping the oldest records to make it."""
+        head, tail = self.head, self.tail
+        if tail > head:
+            if tail + length <= self.size:
+                return tail
+        elif (head - tail >= length) and self.length:
+            return tail
+
+        buffer, end, count = self.buffer, self.end, self.length
+        unpack_from, header_size = _ring_header.unpack_from, _ring_header.size
+        room = max(length, self.size >> 6)
+        while True:
+            if not count:
+                head = tail = 0
+                end = self.size
+                break
+
+            if tail > head:
+                if tail + length <= self.size:
+                    break
+
+                # start over at the front
+                end = tail
+                tail = 0
+            elif head - tail >= room:
+                break
+            else:
+                # drop the oldest
+                head += header_size + unpack_from(buffer, head)[0]
+                if head == end:
+                    head = 0
+                    end = self.size
+                count -= 1
+                self.dropped += 1
+
+        self.head, self.tail, self.end, self.length = head, tail, end, count
+        return tail
+
+    def _drop(self):
+        """Remove the oldest record and return the offset of its data."""
+        offset = self.head + _ring_header.size
+        head = offset + _ring_header.unpack_from(self.buffer, self.head)[0]
+        if head == self.end:
+            head = 0
+            self.end = self.size
+
+        self.head = head
+        self.length -= 1
+        return offset
+
+    def put(self, data):
+        """Copy the data into the ring, returns False if it is larger than
+        the whole ring."""
+        length = _ring_header.size + len(data)
+        if length > self.size:
+            self.dropped += 1
+            return False
+
+        offset = self._reserve(length)
+        _ring_header.pack_into(self.buffer, offset, len(data))
+        self.view[offset + _ring_header.size:offset + length] = data
+
+        self.tail = offset + length
+        self.length += 1
+        self.count += 1
+        return True
+
+    def put_struct(self, fmt, *args):
+        """Pack the values into the ring with a struct.Struct, without
+        building a string first."""
+        length = _ring_header.size + fmt.size
+        if length > self.size:
+            self.dropped += 1
+            return False
+
+        offset = self._reserve(length)
+        _ring_header.pack_into(self.buffer, offset, fmt.size)
+        fmt.pack_into(self.buffer, offset + _ring_header.size, *args)
+
+        self.tail = offset + length
+        self.length += 1
+        self.count += 1
+        return True
+
+    def get(self):
+        """Remove the oldest record and return it, IndexError when the ring
+        is empty."""
+        if not self.length:
+            raise IndexError, "ring is empty"
+
+        offset = self._drop()
+        return str(self.buffer[offset:offset + _ring_header.unpack_from(self.buffer, offset - _ring_header.size)[0]])
+
+    def clear(self):
+        self.head = self.tail = self.length = 0
+        self.end = self.size
+
+    def used(self):
+        """Return the number of octets in use, headers included."""
+        if not self.length:
+            return 0
+        if self.tail > self.head:
+            return self.tail - self.head
+        return self.end - self.head + self.tail
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        """Generate the records oldest first, leaving them in the ring."""
+        buffer = self.buffer
+        offset, end, length = self.head, self.end, self.length
+        for i in range(length):
+            if offset == end:
+                offset = 0
+            start = offset + _ring_header.size
+            offset = start + _ring_header.unpack_from(buffer, offset)[0]
+            yield str(buffer[start:offset])
+
+#
+#   TraceRing
+#
+#   A fixed size buffer of binary trace records, each one is a timestamp,
+#   the trace source (a class or function), an event and an integer value.
+#
+
+TRACE_RECORD = struct.Struct('<dHHi')
+TRACE_MAGIC = 'BTRC'
+
+# event names by number
+trace_events = []
+
+def trace_event(name):
+    """Return the number of the trace event, adding it if necessary."""
+    if name not in trace_events:
+        trace_events.append(name)
+    return trace_events.index(name)
+
+class TraceRing(OctetRing):
+
+    def __init__(self, size=65536):
+        """The size is the number of records."""
+        OctetRing.__init__(self, size * (_ring_header.size + TRACE_RECORD.size))
+
+    def record(self, source, event, value=0):
+        self.put_struct(TRACE_RECORD, time.time(), source, event, value)
+
+    def records(self):
+        """Generate (timestamp, source, event, value) tuples oldest first,
+        the source and event are names."""
+        for data in self:
+            timestamp, source, event, value = TRACE_RECORD.unpack(data)
+            yield (timestamp, _trace_sources[source], trace_events[event], value)
+
+    def dump(self, file):
+        """Write the source and event names and the records to a file."""
+        names = '\n'.join(_trace_sources) + '\0' + '\n'.join(trace_events)
+        records = list(self)
+
+        file.write(TRACE_MAGIC + struct.pack('<II', len(names), len(records)) + names)
+        file.write(''.join(records))
+
+#
+#   load_trace
+#
+
+def load_trace(file):
+    """Read a file written by TraceRing.dump() and return a list of the
+    (timestamp, source, event, value) tuples."""
+    if file.read(4) != TRACE_MAGIC:
+        raise ValueError, "not a trace file"
+    names_len, count = struct.unpack('<II', file.read(8))
+    sources, events = file.read(names_len).split('\0')
+    sources = sources.split('\n')
+    events = events.split('\n')
+
+    data = file.read(count * TRACE_RECORD.size)
+    records = []
+    for i in range(count):
+        timestamp, source, event, value = TRACE_RECORD.unpack_from(data, i * TRACE_RECORD.size)
+        records.append((timestamp, sources[source], events[event], value))
+
+    return records
+
+#
+#   enable_tracing
+#
+
+def enable_tracing(name, ring):
+    """Send the trace records of the objects with the logger name, or whose
+    logger is a child of it, to the ring."""
+    for loggerName, obj in _debugging_objects.items():
+        if (not name) or (loggerName == name) or loggerName.startswith(name + '.'):
+            obj._tracing = True
+            obj._trace = partial(ring.record, obj._traceID)
+
+def disable_tracing(name):
+    """Stop tracing the objects with the logger name or its children."""
+    for loggerName, obj in _debugging_objects.items():
+        if (not name) or (loggerName == name) or loggerName.startswith(name + '.'):
+            obj._tracing = False
+            obj._trace = _null_logger.trace
+
 #
 #   _LoggingMetaclass
 #
@@ -0,0 +1,440 @@
+#!/usr/bin/python
+
+"""
+Metrics - counters, gauges and histograms of what the stack is doing, and
+a small HTTP server that runs in the core event loop and provides them in
+the Prometheus text format.
+"""
+
+import asyncore
+import socket
+
+from bisect import bisect_left
+from collections import OrderedDict
+
+from debugging import ModuleLogger, DebugContents, bacpypes_debugging
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+# default histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# content type of the text format
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+#
+#   _format_value
+#
+
+def _format_value(value):
+    """Format a sample value the way the text format expects."""
+    if isinstance(value, float):
+        if value != value:
+            return 'NaN'
+        if value == float('inf'):
+            return '+Inf'
+        if value == float('-inf'):
+            return '-Inf'
+        return repr(value)
+    return str(value)
+
+#
+#   _format_labels
+#
+
+def _format_labels(names, values, extra=None):
+    """Format the label names and values as {name="value",...}."""
+    pairs = zip(names, values)
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+
+    return '{' + ','.join('%s="%s"' % (name, value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"'))
+        for name, value in pairs) + '}'
+
+#
+#   CounterValue
+#
+
+class CounterValue(object):
+
+    """The value of a counter, or of one set of label values of a counter.
+    Keep a reference to it and call inc() in the code being measured."""
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name):
+        yield (name, None, self.value)
+
+#
+#   GaugeValue
+#
+
+class GaugeValue(object):
+
+    """The value of a gauge, either set by the code being measured or
+    returned by a function when the metrics are collected, which costs
+    nothing until then."""
+
+    __slots__ = ('value', 'function')
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_function(self, fn):
+        self.function = fn
+
+    def get(self):
+        if self.function:
+            return self.function()
+        return self.value
+
+    def samples(self, name):
+        yield (name, None, self.get())
+
+#
+#   HistogramValue
+#
+
+class HistogramValue(object):
+
+    """The counts of the observations that are less than or equal to each
+    of the bucket bounds, the last count is for the rest."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield (name + '_bucket', ('le', _format_value(float(bound))), total)
+        yield (name + '_bucket', ('le', '+Inf'), self.count)
+        yield (name + '_sum', None, self.sum)
+        yield (name + '_count', None, self.count)
+
+#
+#   Metric
+#
+
+@bacpypes_debugging
+class Metric(DebugContents):
+
+    """A named metric with a value for each set of label values, a metric
+    without labels has just the one value.  With a limit, the least
+    recently used set of label values is forgotten to make room for a new
+    one, so labels like the address of a peer do not grow without bound."""
+
+    _debug_contents = ('name', 'labelNames', 'limit')
+
+    metricType = None
+    valueClass = None
+
+    def __init__(self, name, help, labels=(), registry=None, limit=None):
+        if _debug: Metric._debug("__init__ %r %r labels=%r registry=%r limit=%r", name, help, labels, registry, limit)
+
+        self.name = name
+        self.help = help
+        self.labelNames = tuple(labels)
+        self.limit = limit
+        self.values = OrderedDict() if limit else {}
+
+        # a metric without labels passes its functions along to its value
+        if not self.labelNames:
+            self.value = self.values[()] = self.new_value()
+
+        # add it to the registry
+        (registry or defaultRegistry).register(self)
+
+    def new_value(self):
+        return self.valueClass()
+
+    def labels(self, *values):
+        """Return the value for this set of label values, callers in the
+        hot path look it up once and keep it unless there is a limit."""
+        if len(values) != len(self.labelNames):
+            raise ValueError, "%s has labels %r" % (self.name, self.labelNames)
+        values = tuple(str(value) for value in values)
+
+        if self.limit:
+            # move it to the most recently used end
+            value = self.values.pop(values, None)
+            if value is None:
+                value = self.new_value()
+                if len(self.values) >= self.limit:
+                    self.values.popitem(last=False)
+            self.values[values] = value
+            return value
+
+        value = self.values.get(values)
+        if value is None:
+            value = self.values[values] = self.new_value()
+        return value
+
+    def remove(self, *values):
+        """Forget the value for this set of label values."""
+        self.values.pop(tuple(str(value) for value in values), None)
+
+    def samples(self):
+        """Generate (name, labels, value) for each sample."""
+        for values, value in sorted(self.values.items()):
+            for name, extra, sample in value.samples(self.name):
+                yield (name, _format_labels(self.labelNames, values, extra), sample)
+
+#
+#   Counter
+#
+
+class Counter(Metric):
+
+    metricType = 'counter'
+    valueClass = CounterValue
+
+    def inc(self, amount=1):
+        self.value.value += amount
+
+#
+#   Gauge
+#
+
+class Gauge(Metric):
+
+    metricType = 'gauge'
+    valueClass = GaugeValue
+
+    def set(self, value):
+        self.value.value = value
+
+    def inc(self, amount=1):
+        self.value.value += amount
+
+    def dec(self, amount=1):
+        self.value.value -= amount
+
+    def set_function(self, fn):
+        self.value.function = fn
+
+#
+#   Histogram
+#
+
+class Histogram(Metric):
+
+    metricType = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS, registry=None, limit=None):
+        self.buckets = tuple(sorted(buckets))
+        Metric.__init__(self, name, help, labels, registry, limit)
+
+    def new_value(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.value.observe(value)
+
+#
+#   Registry
+#
+
+@bacpypes_debugging
+class Registry(DebugContents):
+
+    """The metrics that are provided together."""
+
+    _debug_contents = ('metrics',)
+
+    def __init__(self):
+        if _debug: Registry._debug("__init__")
+
+        self.metrics = {}
+
+    def register(self, metric):
+        if _debug: Registry._debug("register %r", metric)
+
+        if metric.name in self.metrics:
+            raise ValueError, "metric already registered: %r" % (metric.name,)
+        self.metrics[metric.name] = metric
+
+    def unregister(self, metric):
+        if _debug: Registry._debug("unregister %r", metric)
+
+        del self.metrics[metric.name]
+
+    def get(self, metricClass, name, help, labels=(), **kwargs):
+        """Return the metric with this name, making it if it does not exist
+        yet, so more than one module can add to the same metric."""
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = metricClass(name, help, labels, registry=self, **kwargs)
+        elif (metric.__class__ is not metricClass) or (metric.labelNames != tuple(labels)):
+            raise ValueError, "metric %r is a different %s" % (name, metric.metricType)
+        return metric
+
+    def exposition(self):
+        """Return the metrics in the Prometheus text format."""
+        if _debug: Registry._debug("exposition")
+
+        lines = []
+        for name in sorted(self.metrics):
+            metric = self.metrics[name]
+            lines.append('# HELP %s %s' % (name, metric.help.replace('\\', '\\\\').replace('\n', '\\n')))
+            lines.append('# TYPE %s %s' % (name, metric.metricType))
+            for sample_name, labels, value in metric.samples():
+                lines.append('%s%s %s' % (sample_name, labels, _format_value(value)))
+        lines.append('')
+
+        return '\n'.join(lines)
+
+#
+#   defaultRegistry
+#
+
+defaultRegistry = Registry()
+
+def counter(name, help, labels=(), limit=None):
+    """Return the counter with this name in the default registry."""
+    return defaultRegistry.get(Counter, name, help, labels, limit=limit)
+
+def gauge(name, help, labels=(), limit=None):
+    """Return the gauge with this name in the default registry."""
+    return defaultRegistry.get(Gauge, name, help, labels, limit=limit)
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS, limit=None):
+    """Return the histogram with this name in the default registry."""
+    return defaultRegistry.get(Histogram, name, help, labels, buckets=buckets, limit=limit)
+
+#
+#   MetricsRequest
+#
+
+@bacpypes_debugging
+class MetricsRequest(asyncore.dispatcher):
+
+    """Read one HTTP request, write the response and close."""
+
+    def __init__(self, sock, registry, path):
+        if _debug: MetricsRequest._debug("__init__ %r %r %r", sock, registry, path)
+        asyncore.dispatcher.__init__(self, sock)
+
+        self.registry = registry
+        self.path = path
+        self.requestData = ''
+        self.responseData = None
+
+    def readable(self):
+        return self.responseData is None
+
+    def handle_read(self):
+        data = self.recv(4096)
+        if _debug: MetricsRequest._debug("handle_read %d octets", len(data))
+        if not data:
+            return
+
+        self.requestData += data
+        if ('\r\n\r\n' not in self.requestData) and ('\n\n' not in self.requestData):
+            if len(self.requestData) > 16384:
+                self.respond('413 Request Entity Too Large', 'request too large\n')
+            return
+
+        # the method and path are on the first line
+        request_line = self.requestData.split('\n', 1)[0].split()
+        if len(request_line) < 2:
+            self.respond('400 Bad Request', 'bad request\n')
+        elif request_line[0] != 'GET':
+            self.respond('405 Method Not Allowed', 'method not allowed\n')
+        elif request_line[1].split('?', 1)[0] != self.path:
+            self.respond('404 Not Found', 'not found\n')
+        else:
+            self.respond('200 OK', self.registry.exposition())
+
+    def respond(self, status, body):
+        if _debug: MetricsRequest._debug("respond %r", status)
+
+        self.responseData = 'HTTP/1.0 %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s' \
+            % (status, CONTENT_TYPE, len(body), body)
+
+    def writable(self):
+        return bool(self.responseData)
+
+    def handle_write(self):
+        sent = self.send(self.responseData)
+        if _debug: MetricsRequest._debug("handle_write %d octets", sent)
+
+        self.responseData = self.responseData[sent:]
+        if not self.responseData:
+            self.close()
+
+    def handle_close(self):
+        if _debug: MetricsRequest._debug("handle_close")
+
+        self.close()
+
+#
+#   MetricsServer
+#
+
+@bacpypes_debugging
+class MetricsServer(asyncore.dispatcher):
+
+    """Listen for HTTP requests for the metrics.  The requests are handled
+    by the same asyncore loop as the rest of the stack, collecting the
+    metrics happens between packets so there is no locking."""
+
+    def __init__(self, address=('', 9100), registry=None, path='/metrics'):
+        if _debug: MetricsServer._debug("__init__ %r registry=%r path=%r", address, registry, path)
+        asyncore.dispatcher.__init__(self)
+
+        self.registry = registry or defaultRegistry
+        self.path = path
+
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind(address)
+        self.listen(5)
+
+        # the port may have been picked by the system
+        self.address = self.socket.getsockname()
+
+    def readable(self):
+        return 1
+
+    def writable(self):
+        return 0
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is None:
+            return
+        sock, addr = pair
+        if _debug: MetricsServer._debug("handle_accept %r", addr)
+
+        MetricsRequest(sock, self.registry, self.path)
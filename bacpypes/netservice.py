@@ -14,11 +14,17 @@ from comm import Client, Server, bind, \
 
 from npdu import *
 from apdu import APDU as _APDU
+from metrics import counter
 
 # some debuging
 _debug = 0
 _log = ModuleLogger(globals())
 
+# metrics
+_packetsReceived = counter('bacpypes_packets_received_total', "Packets received by each layer", ('layer',)).labels('network')
+_packetsSent = counter('bacpypes_packets_sent_total', "Packets sent by each layer", ('layer',)).labels('network')
+_decodeErrors = counter('bacpypes_decode_errors_total', "Packets that could not be decoded by each layer", ('layer',)).labels('network')
+
 # router status values
 ROUTER_AVAILABLE = 0            # normal
 ROUTER_BUSY = 1                 # router is busy
@@ -75,8 +81,14 @@ class NetworkAdapter(Client, DebugContents):
         """Decode upstream PDUs and pass them up to the service access point."""
         if _debug: NetworkAdapter._debug("confirmation %r (net=%r)", pdu, self.adapterNet)
 
+        _packetsReceived.inc()
+
         npdu = NPDU(user_data=pdu.pduUserData)
-        npdu.decode(pdu)
+        try:
+            npdu.decode(pdu)
+        except Exception:
+            _decodeErrors.inc()
+            raise
         self.adapterSAP.process_npdu(self, npdu)
 
     def process_npdu(self, npdu):
@@ -85,6 +97,8 @@ class NetworkAdapter(Client, DebugContents):
 
         pdu = PDU(user_data=npdu.pduUserData)
         npdu.encode(pdu)
+
+        _packetsSent.inc()
         self.request(pdu)
 
     def EstablishConnectionToNetwork(self, net):
@@ -29,6 +29,21 @@ class PropertyError(AttributeError):
 # a dictionary of object types and classes
 registered_object_types = {}
 
+# properties with values that do not change once the object is running, the
+# encoding of their values is kept until they are written
+static_properties = set([
+    'objectIdentifier', 'objectName', 'objectType', 'description',
+    'profileName', 'propertyList', 'units', 'deviceType', 'stateText',
+    'inactiveText', 'activeText', 'numberOfStates', 'minPresValue',
+    'maxPresValue', 'resolution', 'vendorName', 'vendorIdentifier',
+    'modelName', 'firmwareRevision', 'applicationSoftwareVersion',
+    'location', 'protocolVersion', 'protocolRevision',
+    'protocolServicesSupported', 'protocolObjectTypesSupported',
+    'maxApduLengthAccepted', 'segmentationSupported',
+    'maxSegmentsAccepted', 'apduSegmentTimeout', 'apduTimeout',
+    'numberOfApduRetries',
+    ])
+
 #
 #   register_object_type
 #
@@ -131,6 +146,10 @@ class Property(Logging):
         self.mutable = mutable
         self.default = default
 
+        # the encoding can be kept when the value comes from the object
+        self.static = (identifier in static_properties) \
+            and (self.__class__.ReadProperty.im_func is Property.ReadProperty.im_func)
+
     def ReadProperty(self, obj, arrayIndex=None):
         if _debug:
             Property._debug("ReadProperty(%s) %s arrayIndex=%r",
@@ -185,6 +204,9 @@ class Property(Logging):
             if _debug: Property._debug("    - forwarding to array")
             arry[arrayIndex] = value
 
+            # forget the encoding
+            obj._encoded.pop(self.identifier, None)
+
             return
         elif value is not None:
             # coerce the value
@@ -194,6 +216,9 @@ class Property(Logging):
         # seems to be OK
         obj._values[self.identifier] = value
 
+        # forget the encoding
+        obj._encoded.pop(self.identifier, None)
+
 #
 #   StandardProperty
 #
@@ -290,6 +315,121 @@ class ObjectIdentifierProperty(ReadableProperty, Logging):
         
         return Property.WriteProperty( self, obj, value, arrayIndex, priority, direct )
 
+#
+#   VirtualValueProperty
+#
+
+class VirtualValueProperty(Property, Logging):
+
+    """The value of a virtual object is not kept in the object, it is a
+    number in a slot of the table of the object store the object came from,
+    so it is not lost when the object is thrown away."""
+
+    def __init__(self, identifier, datatype, mutable=True):
+        if _debug: VirtualValueProperty._debug("__init__ %s %s mutable=%r", identifier, datatype, mutable)
+
+        Property.__init__(self, identifier, datatype, optional=False, mutable=mutable)
+
+    def to_slot(self, value):
+        """Return the number in the slot for a value of the property."""
+        if issubclass(self.datatype, Enumerated):
+            value = self.datatype(value).get_long()
+
+        return float(value)
+
+    def from_slot(self, value):
+        """Return the value of the property from the number in the slot."""
+        if issubclass(self.datatype, (Real, Double)):
+            pass
+        elif issubclass(self.datatype, Boolean):
+            value = bool(value)
+        elif issubclass(self.datatype, Enumerated):
+            value = self.datatype(int(value)).value
+        else:
+            value = int(value)
+
+        return value
+
+    def ReadProperty(self, obj, arrayIndex=None):
+        if _debug: VirtualValueProperty._debug("ReadProperty(%s) %s arrayIndex=%r", self.identifier, obj, arrayIndex)
+
+        if arrayIndex is not None:
+            raise ExecutionError(errorClass='property', errorCode='propertyIsNotAnArray')
+
+        # a deleted object has no store
+        if obj._objectStore is None:
+            raise ExecutionError(errorClass='object', errorCode='unknownObject')
+
+        try:
+            value = obj._objectStore.get_value(obj._objectValue)
+        except KeyError:
+            raise ExecutionError(errorClass='object', errorCode='unknownObject')
+
+        return self.from_slot(value)
+
+    def WriteProperty(self, obj, value, arrayIndex=None, priority=None, direct=False):
+        if _debug:
+            VirtualValueProperty._debug("WriteProperty(%s) %s %r arrayIndex=%r priority=%r direct=%r",
+                self.identifier, obj, value, arrayIndex, priority, direct
+                )
+
+        if (not direct):
+            if value is None:
+                raise ValueError, "%s value required" % (self.identifier,)
+            if not self.mutable:
+                raise ExecutionError(errorClass='property', errorCode='writeAccessDenied')
+
+        if arrayIndex is not None:
+            raise ExecutionError(errorClass='property', errorCode='propertyIsNotAnArray')
+
+        # a deleted object has no store
+        if obj._objectStore is None:
+            raise ExecutionError(errorClass='object', errorCode='unknownObject')
+
+        try:
+            obj._objectStore.set_value(obj._objectValue, self.to_slot(value))
+        except KeyError:
+            raise ExecutionError(errorClass='object', errorCode='unknownObject')
+
+#
+#   virtual_object_class
+#
+
+# the virtual object classes by object type and vendor identifier
+virtual_object_types = {}
+
+# the datatypes of values that can be kept in a slot
+virtual_value_datatypes = (Real, Double, Unsigned, Integer, Enumerated, Boolean)
+
+@function_debugging
+def virtual_object_class(object_type, vendor_id=0):
+    """Return the class of the virtual objects of an object type, it is
+    the class of the object type with the presentValue kept in the table of
+    the object store, or None if the object type is unknown."""
+    if _debug: virtual_object_class._debug("virtual_object_class %r vendor_id=%r", object_type, vendor_id)
+
+    cls = virtual_object_types.get((object_type, vendor_id))
+    if cls:
+        return cls
+
+    base = get_object_class(object_type, vendor_id)
+    if not base:
+        return None
+
+    # the same properties with the value in the slot
+    _properties = dict(base._properties)
+    prop = _properties.get('presentValue')
+    if prop and issubclass(prop.datatype, virtual_value_datatypes):
+        _properties['presentValue'] = VirtualValueProperty('presentValue', prop.datatype, mutable=prop.mutable)
+    else:
+        raise RuntimeError, "%s present value cannot be virtual" % (object_type,)
+
+    # not registered, requests for the object type still get the base class
+    cls = type(base)('Virtual' + base.__name__, (base,), {'_properties': _properties})
+    virtual_object_types[(object_type, vendor_id)] = cls
+
+    return cls
+
 #
 #   Object
 #
@@ -320,6 +460,9 @@ class Object(Logging):
         # start with a clean dict of values
         self._values = {}
 
+        # the encodings of static property values, by array index
+        self._encoded = {}
+
         # start with a clean array of property identifiers
         if 'propertyList' in initargs:
             propertyList = None
@@ -393,7 +536,12 @@ class Object(Logging):
         prop = self._attr_to_property(attr)
         if _debug: Object._debug("    - deferring to %r", prop)
 
-        return prop.WriteProperty(self, value, direct=True)
+        rslt = prop.WriteProperty(self, value, direct=True)
+
+        # forget the encoding
+        self._encoded.pop(attr, None)
+
+        return rslt
 
     def ReadProperty(self, propid, arrayIndex=None):
         if _debug: Object._debug("ReadProperty %r arrayIndex=%r", propid, arrayIndex)
@@ -415,7 +563,84 @@ class Object(Logging):
             raise PropertyError, propid
 
         # defer to the property to set the value
-        return prop.WriteProperty(self, value, arrayIndex, priority, direct)
+        rslt = prop.WriteProperty(self, value, arrayIndex, priority, direct)
+
+        # forget the encoding, a property that overrides WriteProperty()
+        # might not
+        self._encoded.pop(propid, None)
+
+        return rslt
+
+    def ReadPropertyToAny(self, propid, arrayIndex=None):
+        """Read the property value, with the optional array index, and cast
+        it into an Any.  The encoding of a static property value is kept and
+        returned again until the property is written, unless the object
+        overrides ReadProperty() or get_datatype()."""
+        if _debug: Object._debug("ReadPropertyToAny %r arrayIndex=%r", propid, arrayIndex)
+
+        # the encoding can be kept when the object reads the property the
+        # usual way
+        prop = self._properties.get(propid)
+        static = prop and prop.static \
+            and (getattr(self.ReadProperty, 'im_func', None) is Object.ReadProperty.im_func) \
+            and (getattr(self.get_datatype, 'im_func', None) is Object.get_datatype.im_func)
+
+        # check for an encoding already made
+        if static:
+            encoded = self._encoded.get(propid)
+            if encoded and (arrayIndex in encoded):
+                if _debug: Object._debug("    - encoded value")
+                result = Any()
+                result.set_encoded(encoded[arrayIndex])
+                return result
+
+        # get the datatype
+        datatype = self.get_datatype(propid)
+        if _debug: Object._debug("    - datatype: %r", datatype)
+        if datatype is None:
+            raise ExecutionError(errorClass='property', errorCode='datatypeNotSupported')
+
+        # get the value
+        value = self.ReadProperty(propid, arrayIndex)
+        if _debug: Object._debug("    - value: %r", value)
+        if value is None:
+            raise PropertyError, propid
+
+        # change atomic values into something encodeable
+        if issubclass(datatype, Atomic):
+            value = datatype(value)
+        elif issubclass(datatype, Array) and (arrayIndex is not None):
+            if arrayIndex == 0:
+                value = Unsigned(value)
+            elif issubclass(datatype.subtype, Atomic):
+                value = datatype.subtype(value)
+            elif not isinstance(value, datatype.subtype):
+                raise TypeError, "invalid result datatype, expecting %s and got %s" \
+                    % (datatype.subtype.__name__, type(value).__name__)
+        elif not isinstance(value, datatype):
+            raise TypeError, "invalid result datatype, expecting %s and got %s" \
+                % (datatype.__name__, type(value).__name__)
+        if _debug: Object._debug("    - encodeable value: %r", value)
+
+        # encode the value
+        result = Any()
+        result.cast_in(value)
+
+        # keep the encoding
+        if static:
+            self._encoded.setdefault(propid, {})[arrayIndex] = result.get_encoded()
+
+        return result
+
+    def clear_encoded(self, propid=None):
+        """Forget the encoding of a static property value, or of all of
+        them, after a value has been changed in place rather than written."""
+        if _debug: Object._debug("clear_encoded %r", propid)
+
+        if propid is None:
+            self._encoded.clear()
+        else:
+            self._encoded.pop(propid, None)
 
     def get_datatype(self, propid):
         """Return the datatype for the property of an object."""
@@ -0,0 +1,692 @@
+#!/usr/bin/python
+
+"""
+Object Store - the local objects of an application, found by identifier
+and by name, with indexes of the objects of each type by instance number
+and of the object names so finding the objects of a type, in a range of
+instances or with a name that starts with something does not look at all
+of them.
+
+The virtual object store also has a table of virtual objects, each one is
+a row of arrays with the identifier, name and value of the object, and an
+object is only built when something asks for it.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+from debugging import ModuleLogger, DebugContents, bacpypes_debugging
+
+from primitivedata import ObjectIdentifier, encode_object_identifier_tag
+from object import virtual_object_class
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+#
+#   ObjectStore
+#
+
+@bacpypes_debugging
+class ObjectStore(DebugContents):
+
+    """The objects by identifier, by the integer value of the identifier
+    and by name, and the objects of each type by instance number.  The
+    sorted lists of instance numbers and names are built when they are
+    needed after objects have been added, so adding a lot of objects does
+    not keep sorting them.
+
+    The listeners are called with 'add' or 'delete' and the object when an
+    object is added or deleted."""
+
+    _debug_contents = ('objectName', 'objectIdentifier')
+
+    def __init__(self):
+        if _debug: ObjectStore._debug("__init__")
+
+        # objects by ID, by the integer value of their ID and by name
+        self.objectIdentifier = {}
+        self.objectIdentifierIndex = {}
+        self.objectName = {}
+
+        # objects of each type number by instance number
+        self.objectTypes = {}
+
+        # sorted instance numbers of each type and the sorted names, None
+        # when they have to be sorted again
+        self._instances = {}
+        self._names = None
+
+        # functions called when objects are added and deleted
+        self.listeners = []
+
+    def __len__(self):
+        return len(self.objectIdentifierIndex)
+
+    def add_listener(self, fn):
+        """Call fn(event, obj) when an object is added or deleted."""
+        if _debug: ObjectStore._debug("add_listener %r", fn)
+
+        self.listeners.append(fn)
+
+    def remove_listener(self, fn):
+        if _debug: ObjectStore._debug("remove_listener %r", fn)
+
+        self.listeners.remove(fn)
+
+    def _notify(self, event, obj):
+        for fn in self.listeners:
+            fn(event, obj)
+
+    def _check_object(self, obj, names, values):
+        """Return the name, identifier and its integer value of an object
+        that is not already here, or in the names and values being added."""
+        object_name = obj.objectName
+        if not object_name:
+            raise RuntimeError, "object name required"
+        object_identifier = obj.objectIdentifier
+        if not object_identifier:
+            raise RuntimeError, "object identifier required"
+
+        # make sure it hasn't already been defined
+        if (object_name in self.objectName) or (object_name in names):
+            raise RuntimeError, "already an object with name '%s'" % (object_name,)
+        object_value = ObjectIdentifier.packed(object_identifier)
+        if (object_value in self.objectIdentifierIndex) or (object_value in values):
+            raise RuntimeError, "already an object with identifier %s" % (object_identifier,)
+
+        return object_name, object_identifier, object_value
+
+    def _add(self, obj, object_name, object_identifier, object_value):
+        self.objectName[object_name] = obj
+        self.objectIdentifier[object_identifier] = obj
+        self.objectIdentifierIndex[object_value] = obj
+
+        object_type = object_value >> 22
+        objects = self.objectTypes.get(object_type)
+        if objects is None:
+            objects = self.objectTypes[object_type] = {}
+        objects[object_value & 0x3FFFFF] = obj
+
+        # the sorted lists are built again when they are needed
+        self._instances.pop(object_type, None)
+        self._names = None
+
+    def add_object(self, obj):
+        """Add an object."""
+        if _debug: ObjectStore._debug("add_object %r", obj)
+
+        object_name, object_identifier, object_value = self._check_object(obj, (), ())
+        self._add(obj, object_name, object_identifier, object_value)
+
+        self._notify('add', obj)
+
+    def add_objects(self, objs):
+        """Add a list of objects, they are all checked before any of them
+        are added.  Return the list of their identifiers."""
+        if _debug: ObjectStore._debug("add_objects (%d)", len(objs))
+
+        names = {}
+        values = {}
+        identifiers = []
+        for obj in objs:
+            object_name, object_identifier, object_value = self._check_object(obj, names, values)
+            names[object_name] = obj
+            values[object_value] = obj
+            identifiers.append(object_identifier)
+
+        # add them all at once
+        self.objectName.update(names)
+        self.objectIdentifierIndex.update(values)
+        self.objectIdentifier.update(zip(identifiers, objs))
+
+        for object_value, obj in values.iteritems():
+            object_type = object_value >> 22
+            objects = self.objectTypes.get(object_type)
+            if objects is None:
+                objects = self.objectTypes[object_type] = {}
+            objects[object_value & 0x3FFFFF] = obj
+            self._instances.pop(object_type, None)
+        self._names = None
+
+        if self.listeners:
+            for obj in objs:
+                self._notify('add', obj)
+
+        return identifiers
+
+    def delete_object(self, obj):
+        """Delete an object."""
+        if _debug: ObjectStore._debug("delete_object %r", obj)
+
+        object_name = obj.objectName
+        object_identifier = obj.objectIdentifier
+        object_value = ObjectIdentifier.packed(object_identifier)
+
+        del self.objectName[object_name]
+        del self.objectIdentifier[object_identifier]
+        del self.objectIdentifierIndex[object_value]
+
+        object_type = object_value >> 22
+        object_instance = object_value & 0x3FFFFF
+        objects = self.objectTypes[object_type]
+        del objects[object_instance]
+        if not objects:
+            del self.objectTypes[object_type]
+
+        # sorted lists stay sorted when something is taken out
+        instances = self._instances.get(object_type)
+        if instances is not None:
+            del instances[bisect_left(instances, object_instance)]
+        if self._names is not None:
+            del self._names[bisect_left(self._names, object_name)]
+
+        self._notify('delete', obj)
+
+    def get_object_id(self, objid):
+        """Return an object or None, the identifier can be a tuple, an
+        ObjectIdentifier or its integer value."""
+        try:
+            # the tuple from a decoded request is the key of the objects
+            obj = self.objectIdentifier.get(objid, None)
+            if obj is None:
+                obj = self.objectIdentifierIndex.get(ObjectIdentifier.packed(objid), None)
+        except (TypeError, ValueError):
+            return None
+
+        return obj
+
+    def get_object_name(self, objname):
+        """Return an object or None."""
+        return self.objectName.get(objname, None)
+
+    def iter_objects(self):
+        """Iterate over the objects."""
+        return self.objectIdentifier.itervalues()
+
+    def iter_objects_of_type(self, objectType, low=None, high=None):
+        """Iterate over the objects of a type, the type can be its name or
+        number, in order of their instance numbers and optionally from low
+        to high inclusive."""
+        if _debug: ObjectStore._debug("iter_objects_of_type %r %r %r", objectType, low, high)
+
+        object_type = ObjectIdentifier.packed((objectType, 0)) >> 22
+        objects = self.objectTypes.get(object_type)
+        if not objects:
+            return
+
+        instances = self._instances.get(object_type)
+        if instances is None:
+            instances = self._instances[object_type] = sorted(objects)
+
+        start = 0 if low is None else bisect_left(instances, low)
+        end = len(instances) if high is None else bisect_right(instances, high)
+        for instance in instances[start:end]:
+            yield objects[instance]
+
+    def iter_objects_with_prefix(self, prefix):
+        """Iterate over the objects with names that start with the prefix,
+        in order of their names."""
+        if _debug: ObjectStore._debug("iter_objects_with_prefix %r", prefix)
+
+        if self._names is None:
+            self._names = sorted(self.objectName)
+
+        names = self._names
+        i = bisect_left(names, prefix)
+        matches = []
+        while (i < len(names)) and names[i].startswith(prefix):
+            matches.append(names[i])
+            i += 1
+
+        for name in matches:
+            yield self.objectName[name]
+
+#
+#   _merged
+#
+
+def _merged(arry, positions, items):
+    """Return a copy of the array with each item inserted before its
+    position in the array, the positions are in order.  The runs between
+    them are copied as slices."""
+    if not arry:
+        return array(arry.typecode, items)
+
+    result = array(arry.typecode)
+    last = 0
+    for position, item in zip(positions, items):
+        result.extend(arry[last:position])
+        result.append(item)
+        last = position
+    result.extend(arry[last:])
+    return result
+
+#
+#   VirtualObjectTable
+#
+
+@bacpypes_debugging
+class VirtualObjectTable:
+
+    """The rows of virtual objects in arrays.  The identifier, value and
+    name of a row are appended to the arrays when it is added and stay at
+    that row, the names are in one string with the start and length of
+    each one.  The identifiers are also kept sorted with the row of each
+    one, and the rows are kept in order of their names, so a row is a few
+    dozen octets rather than an object."""
+
+    def __init__(self):
+        if _debug: VirtualObjectTable._debug("__init__")
+
+        # the identifiers and the values of the rows
+        self.rowIdentifiers = array('I')
+        self.values = array('d')
+
+        # the names, where each one starts and how long it is, a deleted
+        # row has a length of zero
+        self.names = ''
+        self.nameStart = array('I')
+        self.nameLength = array('H')
+
+        # the identifiers in order and the row of each one, and the rows in
+        # order of their names
+        self.identifiers = array('I')
+        self.rows = array('I')
+        self.nameOrder = array('I')
+
+        # the number of deleted rows
+        self.deleted = 0
+
+        # the encoding of the identifiers, None when it has to be built
+        self._encoded = None
+
+    def __len__(self):
+        return len(self.identifiers)
+
+    def position(self, value):
+        """Return the position of the integer value of an identifier in the
+        identifier order or None."""
+        identifiers = self.identifiers
+        i = bisect_left(identifiers, value)
+        if (i < len(identifiers)) and (identifiers[i] == value):
+            return i
+        return None
+
+    def find(self, value):
+        """Return the row of the integer value of an identifier or None."""
+        i = self.position(value)
+        if i is None:
+            return None
+        return self.rows[i]
+
+    def identifier(self, row):
+        """Return the integer value of the identifier of a row, the array
+        has them as longs."""
+        return int(self.rowIdentifiers[row])
+
+    def name(self, row):
+        """Return the name of a row."""
+        start = self.nameStart[row]
+        return self.names[start:start + self.nameLength[row]]
+
+    def name_position(self, name):
+        """Return the position in the name order where the name is or
+        would be."""
+        nameOrder = self.nameOrder
+        lo, hi = 0, len(nameOrder)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.name(nameOrder[mid]) < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find_name(self, name):
+        """Return the row with the name or None."""
+        i = self.name_position(name)
+        if i < len(self.nameOrder):
+            row = self.nameOrder[i]
+            if self.name(row) == name:
+                return row
+        return None
+
+    def add_rows(self, rows):
+        """Add (value, name, slot) rows, where the value is the integer value
+        of the identifier.  The rows are appended to the arrays and only the
+        new identifiers and names are sorted and merged into the orders."""
+        if _debug: VirtualObjectTable._debug("add_rows (%d)", len(rows))
+        if not rows:
+            return
+
+        first = len(self.rowIdentifiers)
+        values = [value for value, name, slot in rows]
+        names = [name for value, name, slot in rows]
+        lengths = map(len, names)
+
+        starts = array('I')
+        start = len(self.names)
+        for length in lengths:
+            starts.append(start)
+            start += length
+
+        self.rowIdentifiers.extend(array('I', values))
+        self.values.extend(array('d', [slot for value, name, slot in rows]))
+        self.names += ''.join(names)
+        self.nameStart.extend(starts)
+        self.nameLength.extend(array('H', lengths))
+
+        # merge the new identifiers
+        order = sorted(xrange(len(rows)), key=values.__getitem__)
+        new_values = [values[i] for i in order]
+        positions = [bisect_left(self.identifiers, value) for value in new_values]
+        self.identifiers = _merged(self.identifiers, positions, new_values)
+        self.rows = _merged(self.rows, positions, [first + i for i in order])
+
+        # merge the new names
+        order = sorted(xrange(len(rows)), key=names.__getitem__)
+        if self.nameOrder:
+            positions = [self.name_position(names[i]) for i in order]
+        else:
+            positions = None
+        self.nameOrder = _merged(self.nameOrder, positions, [first + i for i in order])
+
+        self._encoded = None
+
+    def delete_row(self, row):
+        """Delete a row.  It is taken out of the orders and marked, the
+        arrays are only built again without the deleted rows when they are
+        at least half of them."""
+        if _debug: VirtualObjectTable._debug("delete_row %r", row)
+
+        i = self.position(self.rowIdentifiers[row])
+        del self.identifiers[i]
+        del self.rows[i]
+        del self.nameOrder[self.name_position(self.name(row))]
+
+        self.nameLength[row] = 0
+        self.deleted += 1
+        if self.deleted * 2 >= len(self.rowIdentifiers):
+            self.compact()
+
+        self._encoded = None
+
+    def compact(self):
+        """Build the arrays again without the deleted rows, the rows that
+        are left are numbered again in identifier order."""
+        if _debug: VirtualObjectTable._debug("compact")
+
+        rows = self.rows
+        names = [self.name(row) for row in rows]
+        starts = array('I')
+        start = 0
+        for name in names:
+            starts.append(start)
+            start += len(name)
+
+        # the new row of each old one, for the name order
+        renumber = {}
+        for i, row in enumerate(rows):
+            renumber[row] = i
+
+        self.rowIdentifiers = array('I', self.identifiers)
+        self.values = array('d', [self.values[row] for row in rows])
+        self.names = ''.join(names)
+        self.nameStart = starts
+        self.nameLength = array('H', map(len, names))
+        self.rows = array('I', xrange(len(rows)))
+        self.nameOrder = array('I', [renumber[row] for row in self.nameOrder])
+        self.deleted = 0
+
+    def get_encoded(self):
+        """Return the encoding of the identifiers as application tagged
+        object identifiers."""
+        if self._encoded is None:
+            self._encoded = ''.join(map(encode_object_identifier_tag, self.identifiers))
+        return self._encoded
+
+#
+#   VirtualObjectStore
+#
+
+@bacpypes_debugging
+class VirtualObjectStore(ObjectStore):
+
+    """An object store with a table of virtual objects.  When one is asked
+    for, the object is built from its row with the presentValue in the
+    table, and the last cacheSize of them are kept.  The other properties
+    of a virtual object have the defaults of its class, a change to them is
+    lost when the object is thrown away."""
+
+    def __init__(self, cacheSize=1000):
+        if _debug: VirtualObjectStore._debug("__init__ cacheSize=%r", cacheSize)
+        ObjectStore.__init__(self)
+
+        self.table = VirtualObjectTable()
+
+        # the objects that have been built, by the integer value of their
+        # identifiers, and the order they were built
+        self.cacheSize = cacheSize
+        self._objects = {}
+        self._built = deque()
+
+    def __len__(self):
+        return ObjectStore.__len__(self) + len(self.table)
+
+    def _check_object(self, obj, names, values):
+        object_name, object_identifier, object_value = ObjectStore._check_object(self, obj, names, values)
+
+        if self.table.find_name(object_name) is not None:
+            raise RuntimeError, "already an object with name '%s'" % (object_name,)
+        if self.table.find(object_value) is not None:
+            raise RuntimeError, "already an object with identifier %s" % (object_identifier,)
+
+        return object_name, object_identifier, object_value
+
+    def add_rows(self, rows):
+        """Add virtual objects from (objectIdentifier, objectName, value)
+        rows, they are all checked before any of them are added."""
+        if _debug: VirtualObjectStore._debug("add_rows (%d)", len(rows))
+
+        table = self.table
+        existing = len(table)
+        names = set()
+        values = set()
+        checked = []
+
+        # the class of each object type has the property that turns the
+        # value into a number for the slot
+        to_slot = {}
+
+        for object_identifier, object_name, value in rows:
+            if not object_name:
+                raise RuntimeError, "object name required"
+            object_value = ObjectIdentifier.packed(object_identifier)
+
+            object_type = object_value >> 22
+            fn = to_slot.get(object_type)
+            if fn is None:
+                cls = virtual_object_class(ObjectIdentifier(object_value).value[0])
+                if not cls:
+                    raise RuntimeError, "unknown object type: %s" % (object_identifier,)
+                fn = to_slot[object_type] = cls._properties['presentValue'].to_slot
+
+            if (object_name in self.objectName) or (object_name in names) or (existing and (table.find_name(object_name) is not None)):
+                raise RuntimeError, "already an object with name '%s'" % (object_name,)
+            if (object_value in self.objectIdentifierIndex) or (object_value in values) or (existing and (table.find(object_value) is not None)):
+                raise RuntimeError, "already an object with identifier %s" % (object_identifier,)
+
+            names.add(object_name)
+            values.add(object_value)
+            checked.append((object_value, object_name, fn(value)))
+
+        table.add_rows(checked)
+
+        # building the objects is the expensive part, only do it when
+        # someone is listening
+        if self.listeners:
+            for object_value, object_name, slot in checked:
+                self._notify('add', self._build(object_value, table.find(object_value)))
+
+    def _row(self, objid):
+        row = self.table.find(ObjectIdentifier.packed(objid))
+        if row is None:
+            raise KeyError(objid)
+        return row
+
+    def get_value(self, objid):
+        """Return the number in the slot of a virtual object, the identifier
+        can be a tuple, an ObjectIdentifier or its integer value."""
+        return self.table.values[self._row(objid)]
+
+    def set_value(self, objid, value):
+        """Change the number in the slot of a virtual object, enumerated
+        values are their integer values."""
+        self.table.values[self._row(objid)] = value
+
+    def _build(self, object_value, row):
+        """Return the object of a row, building it if it is not cached."""
+        obj = self._objects.get(object_value)
+        if obj is not None:
+            return obj
+        if _debug: VirtualObjectStore._debug("_build %r %r", object_value, row)
+
+        object_identifier = ObjectIdentifier(object_value).value
+        cls = virtual_object_class(object_identifier[0])
+
+        # the value property finds the slot through these
+        obj = cls.__new__(cls)
+        obj._objectStore = self
+        obj._objectValue = object_value
+        obj.__init__(
+            objectIdentifier=object_identifier,
+            objectName=self.table.name(row),
+            presentValue=cls._properties['presentValue'].from_slot(self.table.values[row]),
+            )
+
+        # keep it, forget the oldest ones
+        self._objects[object_value] = obj
+        self._built.append(object_value)
+        while len(self._objects) > self.cacheSize:
+            self._objects.pop(self._built.popleft(), None)
+
+        return obj
+
+    def delete_object(self, obj):
+        """Delete an object, which can be a virtual one."""
+        if _debug: VirtualObjectStore._debug("delete_object %r", obj)
+
+        if getattr(obj, '_objectStore', None) is not self:
+            return ObjectStore.delete_object(self, obj)
+
+        object_value = obj._objectValue
+        row = self.table.find(object_value)
+        if row is None:
+            raise KeyError(obj.objectIdentifier)
+
+        self.table.delete_row(row)
+        self._objects.pop(object_value, None)
+
+        # the object no longer has a row, a new one with the same
+        # identifier is not this one
+        obj._objectStore = None
+
+        self._notify('delete', obj)
+
+    def get_object_id(self, objid):
+        """Return an object or None, virtual objects are built from their
+        rows."""
+        obj = ObjectStore.get_object_id(self, objid)
+        if (obj is None) and len(self.table):
+            try:
+                object_value = ObjectIdentifier.packed(objid)
+            except (TypeError, ValueError):
+                return None
+
+            obj = self._objects.get(object_value)
+            if obj is None:
+                row = self.table.find(object_value)
+                if row is not None:
+                    obj = self._build(object_value, row)
+
+        return obj
+
+    def get_object_name(self, objname):
+        """Return an object or None, virtual objects are built from their
+        rows."""
+        obj = ObjectStore.get_object_name(self, objname)
+        if (obj is None) and len(self.table):
+            row = self.table.find_name(objname)
+            if row is not None:
+                obj = self._build(self.table.identifier(row), row)
+
+        return obj
+
+    def iter_objects(self):
+        """Iterate over the objects and then the virtual objects, which are
+        built as they are reached."""
+        for obj in ObjectStore.iter_objects(self):
+            yield obj
+
+        table = self.table
+        for i in xrange(len(table)):
+            yield self._build(int(table.identifiers[i]), table.rows[i])
+
+    def iter_objects_of_type(self, objectType, low=None, high=None):
+        """Iterate over the objects of a type, with the virtual ones, in
+        order of their instance numbers and optionally from low to high
+        inclusive."""
+        if _debug: VirtualObjectStore._debug("iter_objects_of_type %r %r %r", objectType, low, high)
+
+        object_type = ObjectIdentifier.packed((objectType, 0)) >> 22
+
+        # the rows of the type are next to each other
+        table = self.table
+        first = bisect_left(table.identifiers, (object_type << 22) | (low or 0))
+        last = bisect_right(table.identifiers, (object_type << 22) | (0x3FFFFF if high is None else high))
+
+        # merge them with the other objects
+        objects = ObjectStore.iter_objects_of_type(self, object_type, low, high)
+        obj = next(objects, None)
+        for i in xrange(first, last):
+            object_value = int(table.identifiers[i])
+            while (obj is not None) and (ObjectIdentifier.packed(obj.objectIdentifier) < object_value):
+                yield obj
+                obj = next(objects, None)
+            yield self._build(object_value, table.rows[i])
+
+        while obj is not None:
+            yield obj
+            obj = next(objects, None)
+
+    def iter_objects_with_prefix(self, prefix):
+        """Iterate over the objects with names that start with the prefix,
+        with the virtual ones, in order of their names."""
+        if _debug: VirtualObjectStore._debug("iter_objects_with_prefix %r", prefix)
+
+        table = self.table
+        i = table.name_position(prefix)
+        rows = []
+        while i < len(table.nameOrder):
+            row = table.nameOrder[i]
+            if not table.name(row).startswith(prefix):
+                break
+            rows.append(row)
+            i += 1
+
+        # merge them with the other objects
+        objects = ObjectStore.iter_objects_with_prefix(self, prefix)
+        obj = next(objects, None)
+        for row in rows:
+            object_name = table.name(row)
+            while (obj is not None) and (obj.objectName < object_name):
+                yield obj
+                obj = next(objects, None)
+            yield self._build(table.identifier(row), row)
+
+        while obj is not None:
+            yield obj
+            obj = next(objects, None)
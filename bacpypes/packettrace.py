@@ -0,0 +1,291 @@
+#!/usr/bin/python
+
+"""
+Packet Trace - a fixed size, always on record of the packets and transaction
+state changes at the edges of the stack, written to a file for post-mortem
+analysis when the process is signaled.
+"""
+
+import os
+import socket
+import struct
+
+from time import time as _time
+
+from debugging import ModuleLogger, DebugContents, bacpypes_debugging, OctetRing
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+# record kinds
+UDP_FRAME = 0
+TCP_DATA = 1
+CLIENT_TRANSACTION = 2
+SERVER_TRANSACTION = 3
+
+# binary dump format
+PACKET_TRACE_MAGIC = 'BPTR'
+PACKET_TRACE_VERSION = 1
+_file_header = struct.Struct('<4sHHI')
+_record_header = struct.Struct('<dBBI')
+_frame_body = struct.Struct('!4sH4sH')
+_transaction_body = struct.Struct('<BB')
+
+# pcap file header, microsecond timestamps and Ethernet link type
+_pcap_header = struct.pack('<IHHiIII', 0xA1B2C3D4, 2, 4, 0, 0, 262144, 1)
+_pcap_record = struct.Struct('<IIII')
+
+# globals
+PACKET_TRACE_SIZE = 1048576
+dumpFormat = 'binary'
+dumpDirectory = None
+
+#
+#   _inet_aton
+#
+
+def _inet_aton(host):
+    """Pack an IP address string, the broadcast and wildcard names too."""
+    try:
+        return socket.inet_aton(host)
+    except socket.error:
+        if host == '<broadcast>':
+            return '\xFF\xFF\xFF\xFF'
+        return '\x00\x00\x00\x00'
+
+#
+#   _pack_address
+#
+#   The packed form of the addresses in the frame records, the cache is
+#   cleared when it gets large.
+#
+
+_packed_addresses = {}
+
+def _pack_address(addr):
+    """Pack an IP address tuple as four octets and a port."""
+    packed = _packed_addresses.get(addr)
+    if packed is None:
+        if len(_packed_addresses) >= 1024:
+            _packed_addresses.clear()
+        packed = _packed_addresses[addr] = _inet_aton(addr[0]) + struct.pack('!H', addr[1])
+    return packed
+
+#
+#   udp_frame
+#
+
+def udp_frame(data, source, destination):
+    """Wrap the data sent from the source to the destination, both IP
+    address tuples, in Ethernet, IP and UDP headers so it can be decoded
+    like a captured packet."""
+    udp_len = len(data) + 8
+    return '\x00' * 12 + '\x08\x00' \
+        + struct.pack('!BBHHHBBH4s4s', 0x45, 0, udp_len + 20, 0, 0, 64, socket.IPPROTO_UDP, 0,
+            _inet_aton(source[0]), _inet_aton(destination[0])) \
+        + struct.pack('!HHHH', source[1], destination[1], udp_len, 0) \
+        + data
+
+#
+#   tcp_frame
+#
+
+def tcp_frame(data, source, destination):
+    """Wrap a piece of a TCP stream in Ethernet, IP and a minimal TCP
+    header.  There are no sequence numbers, the segments are in the order
+    they were read or queued and a read larger than an IP packet has the
+    largest length that fits."""
+    return '\x00' * 12 + '\x08\x00' \
+        + struct.pack('!BBHHHBBH4s4s', 0x45, 0, min(len(data) + 40, 65535), 0, 0, 64, socket.IPPROTO_TCP, 0,
+            _inet_aton(source[0]), _inet_aton(destination[0])) \
+        + struct.pack('!HHIIBBHHH', source[1], destination[1], 0, 0, 0x50, 0x18, 65535, 0, 0) \
+        + data
+
+#
+#   PacketTrace
+#
+
+@bacpypes_debugging
+class PacketTrace(DebugContents):
+
+    """A ring of the most recent frames and transaction state changes,
+    bounded by the total number of octets.  Records are packed in the
+    binary dump format and copied into the ring, a size of zero turns it
+    off."""
+
+    _debug_contents = ('size', 'count', 'dropped')
+
+    def __init__(self, size=PACKET_TRACE_SIZE):
+        if _debug: PacketTrace._debug("__init__ size=%r", size)
+
+        self.size = size
+        self.ring = OctetRing(size or 1)
+
+    @property
+    def count(self):
+        return self.ring.count
+
+    @property
+    def dropped(self):
+        return self.ring.dropped
+
+    def frame(self, kind, source, destination, data):
+        """Record a frame or a piece of a stream, the addresses are IP
+        address tuples."""
+        if self.size:
+            self.ring.put(_record_header.pack(_time(), kind, 0, _frame_body.size + len(data))
+                + _pack_address(source) + _pack_address(destination) + data)
+
+    def transaction(self, kind, peer, invokeID, state):
+        """Record a change in the state of a client or server transaction,
+        the peer is an address or the device information of the peer."""
+        if self.size:
+            peer = getattr(peer, 'address', peer)
+            peer = '' if peer is None else str(peer)
+            self.ring.put(_record_header.pack(_time(), kind, 0, _transaction_body.size + len(peer))
+                + _transaction_body.pack(invokeID or 0, state)
+                + peer)
+
+    def records(self):
+        """Generate the records oldest first, like read_packet_trace()."""
+        for data in self.ring:
+            timestamp, kind, reserved, length = _record_header.unpack_from(data)
+            yield parse_packet_trace_record(timestamp, kind, data[_record_header.size:])
+
+    def clear(self):
+        if _debug: PacketTrace._debug("clear")
+
+        self.ring.clear()
+        self.ring.count = 0
+
+    def dump(self, file, format='binary'):
+        """Write the records to a file, 'binary' keeps everything and can be
+        read back by read_packet_trace() or the analysis module, 'pcap' has
+        just the frames."""
+        if _debug: PacketTrace._debug("dump %r %r", file, format)
+
+        # take a copy, a signal handler might be interrupting a record
+        records = list(self.ring)
+
+        if format == 'pcap':
+            file.write(_pcap_header)
+            for data in records:
+                timestamp, kind, reserved, length = _record_header.unpack_from(data)
+                if kind not in (UDP_FRAME, TCP_DATA):
+                    continue
+
+                timestamp, kind, source, destination, data = \
+                    parse_packet_trace_record(timestamp, kind, data[_record_header.size:])
+                if kind == UDP_FRAME:
+                    frame = udp_frame(data, source, destination)
+                else:
+                    frame = tcp_frame(data, source, destination)
+
+                seconds = int(timestamp)
+                file.write(_pcap_record.pack(seconds, int((timestamp - seconds) * 1e6), len(frame), len(frame)))
+                file.write(frame)
+
+        elif format == 'binary':
+            file.write(_file_header.pack(PACKET_TRACE_MAGIC, PACKET_TRACE_VERSION, 0, len(records)))
+            file.write(''.join(records))
+
+        else:
+            raise ValueError, "unknown packet trace format: %r" % (format,)
+
+        return len(records)
+
+#
+#   read_packet_trace
+#
+
+@bacpypes_debugging
+def read_packet_trace(file):
+    """Generate the records of a binary packet trace dump, (timestamp, kind,
+    source, destination, data) for frames and (timestamp, kind, peer,
+    invokeID, state) for transactions where the peer is the string form of
+    the address."""
+    if _debug: read_packet_trace._debug("read_packet_trace %r", file)
+
+    magic, version, reserved, count = _file_header.unpack(file.read(_file_header.size))
+    if magic != PACKET_TRACE_MAGIC:
+        raise ValueError, "not a packet trace file"
+    if version != PACKET_TRACE_VERSION:
+        raise ValueError, "unsupported packet trace version: %r" % (version,)
+
+    for i in range(count):
+        header = file.read(_record_header.size)
+        if len(header) < _record_header.size:
+            break
+        timestamp, kind, reserved, length = _record_header.unpack(header)
+        body = file.read(length)
+        if len(body) < length:
+            break
+
+        yield parse_packet_trace_record(timestamp, kind, body)
+
+def parse_packet_trace_record(timestamp, kind, body):
+    """Turn the body of a binary record back into the record tuple."""
+    if kind in (UDP_FRAME, TCP_DATA):
+        src_ip, src_port, dst_ip, dst_port = _frame_body.unpack_from(body)
+        return (timestamp, kind, (socket.inet_ntoa(src_ip), src_port),
+            (socket.inet_ntoa(dst_ip), dst_port), body[_frame_body.size:])
+    else:
+        invokeID, state = _transaction_body.unpack_from(body)
+        return (timestamp, kind, body[_transaction_body.size:], invokeID, state)
+
+#
+#   packetTrace
+#
+#   This is the ring shared by the directors and the state machine access
+#   points, the modules keep a reference to it so use set_packet_trace()
+#   to change the size (or zero to turn it off) rather than replacing it.
+#
+
+packetTrace = PacketTrace()
+
+#
+#   set_packet_trace
+#
+
+def set_packet_trace(size=PACKET_TRACE_SIZE, format=None, directory=None):
+    """Change the size of the ring in octets, and optionally the dump format
+    and the directory the dumps are written to."""
+    global dumpFormat, dumpDirectory
+    _log.debug("set_packet_trace %r format=%r directory=%r", size, format, directory)
+
+    # copy the most recent records that fit into the new ring
+    ring = OctetRing(size or 1)
+    if size:
+        for data in packetTrace.ring:
+            ring.put(data)
+    ring.dropped = 0
+
+    packetTrace.size = size
+    packetTrace.ring = ring
+    if format:
+        dumpFormat = format
+    if directory:
+        dumpDirectory = directory
+
+#
+#   dump_packet_trace
+#
+
+def dump_packet_trace():
+    """Write the ring to a file named after the process and the time and
+    return the file name, or None when there is nothing to write."""
+    _log.debug("dump_packet_trace")
+
+    if not packetTrace.size:
+        return None
+
+    fname = "bacpypes-%d-%d.%s" % (os.getpid(), int(_time()),
+        'pcap' if dumpFormat == 'pcap' else 'bptr')
+    if dumpDirectory:
+        fname = os.path.join(dumpDirectory, fname)
+
+    with open(fname, 'wb') as file:
+        packetTrace.dump(file, dumpFormat)
+
+    return fname
@@ -7,6 +7,7 @@ Primitive Data
 import sys
 import time
 import re
+import struct
 
 from debugging import ModuleLogger
 
@@ -337,13 +338,21 @@ class ClosingTag(Tag):
 
 class TagList(object):
 
+    """A list of tags that are consumed from the front.  The tags are not
+    removed from the list, the index of the next one is moved along so
+    Peek(), Pop() and push() do not copy the list, and the position can be
+    saved and restored when a decoder needs to back up.  The functions that
+    work with the list as a whole start at the index rather than dropping
+    the consumed tags, which would move the saved positions."""
+
     def __init__(self, arg=None):
         self.tagList = []
+        self.index = 0
 
         if isinstance(arg, types.ListType):
             self.tagList = arg
         elif isinstance(arg, TagList):
-            self.tagList = arg.tagList[:]
+            self.tagList = arg.tagList[arg.index:]
         elif isinstance(arg, PDUData):
             self.decode(arg)
 
@@ -354,15 +363,22 @@ class TagList(object):
         self.tagList.extend(taglist)
 
     def __getitem__(self, item):
-        return self.tagList[item]
+        if isinstance(item, slice):
+            return self.tagList[self.index:][item]
+
+        if item < 0:
+            item += len(self)
+        if (item < 0) or (item >= len(self)):
+            raise IndexError, "tag list index out of range"
+        return self.tagList[self.index + item]
 
     def __len__(self):
-        return len(self.tagList)
+        return len(self.tagList) - self.index
 
     def Peek(self):
         """Return the tag at the front of the list."""
-        if self.tagList:
-            tag = self.tagList[0]
+        if self.index < len(self.tagList):
+            tag = self.tagList[self.index]
         else:
             tag = None
 
@@ -370,22 +386,33 @@ class TagList(object):
 
     def push(self, tag):
         """Return a tag back to the front of the list."""
-        self.tagList = [tag] + self.tagList
+        if self.index and (self.tagList[self.index - 1] is tag):
+            self.index -= 1
+        else:
+            self.tagList.insert(self.index, tag)
 
     def Pop(self):
         """Remove the tag from the front of the list and return it."""
-        if self.tagList:
-            tag = self.tagList[0]
-            del self.tagList[0]
+        if self.index < len(self.tagList):
+            tag = self.tagList[self.index]
+            self.index += 1
         else:
             tag = None
 
         return tag
 
+    def save_position(self):
+        """Return the position of the front of the list."""
+        return self.index
+
+    def restore_position(self, position):
+        """Put back the tags consumed since the position was saved."""
+        self.index = position
+
     def get_context(self, context):
         """Return a tag or a list of tags context encoded."""
         # forward pass
-        i = 0
+        i = self.index
         while i < len(self.tagList):
             tag = self.tagList[i]
 
@@ -433,7 +460,7 @@ class TagList(object):
 
     def encode(self, pdu):
         """encode the tag list into a PDU."""
-        for tag in self.tagList:
+        for tag in self.tagList[self.index:]:
             tag.encode(pdu)
 
     def decode(self, pdu):
@@ -442,9 +469,378 @@ class TagList(object):
             self.tagList.append( Tag(pdu) )
 
     def debug_contents(self, indent=1, file=sys.stdout, _ids=None):
-        for tag in self.tagList:
+        for tag in self.tagList[self.index:]:
             tag.debug_contents(indent+1, file, _ids)
-            
+
+#
+#   decode_tag
+#
+
+_short = struct.Struct('>H')
+_long = struct.Struct('>L')
+
+def decode_tag_header(data, offset, end):
+    """Decode the class, number and length/value/type of the tag that starts
+    at the offset in a string, return them with the offset of the tag data."""
+    if offset >= end:
+        raise DecodingError, "no more packet data"
+
+    octet = ord(data[offset])
+    offset += 1
+
+    # extract the type and the tag number
+    tagClass = (octet >> 3) & 0x01
+    tagNumber = (octet >> 4)
+    if (tagNumber == 0x0F):
+        if offset >= end:
+            raise DecodingError, "no more packet data"
+        tagNumber = ord(data[offset])
+        offset += 1
+
+    # extract the length
+    tagLVT = octet & 0x07
+    if (tagLVT == 5):
+        if offset >= end:
+            raise DecodingError, "no more packet data"
+        tagLVT = ord(data[offset])
+        offset += 1
+        if (tagLVT == 254):
+            if offset + 2 > end:
+                raise DecodingError, "no more packet data"
+            tagLVT = _short.unpack_from(data, offset)[0]
+            offset += 2
+        elif (tagLVT == 255):
+            if offset + 4 > end:
+                raise DecodingError, "no more packet data"
+            tagLVT = _long.unpack_from(data, offset)[0]
+            offset += 4
+    elif (tagLVT == 6):
+        tagClass = Tag.openingTagClass
+        tagLVT = 0
+    elif (tagLVT == 7):
+        tagClass = Tag.closingTagClass
+        tagLVT = 0
+
+    return tagClass, tagNumber, tagLVT, offset
+
+def decode_tag(data, offset=0, end=None):
+    """Decode the tag that starts at the offset in a string and return it
+    with the offset of what follows, the same as Tag.decode() without
+    taking the octets off the front of a PDU one at a time."""
+    if end is None:
+        end = len(data)
+
+    tagClass, tagNumber, tagLVT, offset = decode_tag_header(data, offset, end)
+
+    tag = Tag()
+    tag.tagClass = tagClass
+    tag.tagNumber = tagNumber
+    tag.tagLVT = tagLVT
+
+    # application tagged boolean has no more data
+    if (tagClass == Tag.applicationTagClass) and (tagNumber == Tag.booleanAppTag):
+        tag.tagData = ''
+    else:
+        if offset + tagLVT > end:
+            raise DecodingError, "no more packet data"
+        tag.tagData = data[offset:offset + tagLVT]
+        offset += tagLVT
+
+    return tag, offset
+
+#
+#   TagStream
+#
+
+class TagStream(TagList):
+
+    """A tag list that decodes the tags from the encoded data as they are
+    needed rather than all at once.  The decoders see the same Peek(),
+    Pop() and push() functions, there is no list of the tags that have
+    been consumed and saving the position is keeping the offset.  Tags that
+    have been pushed back, and all of the rest of them when something needs
+    the list as a whole, are kept in the list."""
+
+    def __init__(self, data, offset=0, end=None):
+        TagList.__init__(self)
+
+        if isinstance(data, PDUData):
+            data = data.pduData
+        self.data = data
+        self.offset = offset
+        self.end = len(data) if end is None else end
+
+        # the next tag and the offset after it, once it has been peeked at
+        self._next = None
+
+    def _materialize(self):
+        """Decode the rest of the tags into the list."""
+        if self.index:
+            del self.tagList[:self.index]
+            self.index = 0
+        if self._next:
+            self.tagList.append(self._next[0])
+            self.offset = self._next[1]
+            self._next = None
+        while self.offset < self.end:
+            tag, self.offset = decode_tag(self.data, self.offset, self.end)
+            self.tagList.append(tag)
+
+    def append(self, tag):
+        self._materialize()
+        self.tagList.append(tag)
+
+    def extend(self, taglist):
+        self._materialize()
+        self.tagList.extend(taglist)
+
+    def __getitem__(self, item):
+        self._materialize()
+        return self.tagList[item]
+
+    def __len__(self):
+        """The number of tags left, which decodes the rest of them."""
+        self._materialize()
+        return len(self.tagList) - self.index
+
+    def __nonzero__(self):
+        """True when there are tags left, without decoding the rest."""
+        return self.Peek() is not None
+
+    def Peek(self):
+        """Return the tag at the front of the list."""
+        if self.index < len(self.tagList):
+            return self.tagList[self.index]
+
+        if self._next is None:
+            if self.offset >= self.end:
+                return None
+            self._next = decode_tag(self.data, self.offset, self.end)
+
+        return self._next[0]
+
+    def push(self, tag):
+        """Return a tag back to the front of the list."""
+        if self._next is not None:
+            self.tagList.insert(self.index, self._next[0])
+            self.offset = self._next[1]
+            self._next = None
+        TagList.push(self, tag)
+
+    def Pop(self):
+        """Remove the tag from the front of the list and return it."""
+        if self.index < len(self.tagList):
+            tag = self.tagList[self.index]
+            self.index += 1
+            if self.index == len(self.tagList):
+                del self.tagList[:]
+                self.index = 0
+            return tag
+
+        tag = self.Peek()
+        if tag is not None:
+            self.offset = self._next[1]
+            self._next = None
+
+        return tag
+
+    def pop_span(self):
+        """Remove the tags up to the closing tag of the structure they are
+        in, or the end of the data, without decoding them and return the
+        start and end offsets of their encoding.  This returns None when
+        there are tags that have been pushed back."""
+        if self.index < len(self.tagList):
+            return None
+
+        data = self.data
+        start = offset = self.offset
+        end = self.end
+
+        lvl = 0
+        while offset < end:
+            tagClass, tagNumber, tagLVT, following = decode_tag_header(data, offset, end)
+            if tagClass == Tag.openingTagClass:
+                lvl += 1
+            elif tagClass == Tag.closingTagClass:
+                lvl -= 1
+                if lvl < 0: break
+            elif (tagClass != Tag.applicationTagClass) or (tagNumber != Tag.booleanAppTag):
+                following += tagLVT
+                if following > end:
+                    raise DecodingError, "no more packet data"
+
+            offset = following
+
+        # make sure everything balances
+        if lvl > 0:
+            raise DecodingError, "mismatched open/close tags"
+
+        self.offset = offset
+        self._next = None
+
+        return start, offset
+
+    def save_position(self):
+        """Return the position of the front of the list."""
+        return (self.offset, self.tagList[self.index:])
+
+    def restore_position(self, position):
+        """Put back the tags consumed since the position was saved."""
+        self.offset, tagList = position
+        self.tagList = tagList[:]
+        self.index = 0
+        self._next = None
+
+    def get_context(self, context):
+        self._materialize()
+        return TagList.get_context(self, context)
+
+    def encode(self, pdu):
+        self._materialize()
+        TagList.encode(self, pdu)
+
+    def decode(self, pdu):
+        """Decode the tags from a PDU and add them after the rest, like a
+        TagList does."""
+        self._materialize()
+        TagList.decode(self, pdu)
+
+    def debug_contents(self, indent=1, file=sys.stdout, _ids=None):
+        file.write("%s<tag stream, offset %d of %d, %d tags pushed back>\n" % ("    " * indent,
+            self.offset, self.end, len(self.tagList) - self.index))
+
+#
+#   EncodedTags
+#
+
+class EncodedTags(object):
+
+    """The encoding of one or more tags that is copied into the PDU when
+    the tag list is encoded, rather than decoding the tags to encode them
+    again."""
+
+    __slots__ = ('tagData',)
+
+    def __init__(self, data):
+        self.tagData = data
+
+    def encode(self, pdu):
+        pdu.put_data(self.tagData)
+
+    def debug_contents(self, indent=1, file=sys.stdout, _ids=None):
+        file.write("%s<encoded tags %s>\n" % ("    " * indent, _str_to_hex(self.tagData, '.')))
+
+#
+#   EncodingTagList
+#
+
+class EncodingTagList(TagList):
+
+    """A tag list that is only going to be encoded into a PDU, so parts of
+    it can be tags that are already encoded.  Nothing decodes from this
+    kind of list."""
+
+    def append_encoded(self, data):
+        """Add the encoding of some tags."""
+        self.tagList.append(EncodedTags(data))
+
+#
+#   encode_tags
+#
+
+def encode_tags(tags):
+    """Return the encoding of a list of tags as a string."""
+    pdu = PDUData()
+    for tag in tags:
+        tag.encode(pdu)
+
+    return pdu.pduData
+
+#
+#   Primitive Codecs
+#
+#   The fixed size parts of the encodings are packed and unpacked by struct
+#   objects made once, the smallest number of octets for an integer is
+#   found by comparing with the range of each size, and the encodings of the
+#   small values are looked up.
+#
+
+_octet_chr = [chr(i) for i in range(256)]
+_octet_long = [long(i) for i in range(256)]
+_octet_bits = [[(i >> (7 - j)) & 1 for j in range(8)] for i in range(256)]
+
+_signed_octet = struct.Struct('>b')
+_signed_short = struct.Struct('>h')
+_signed_long = struct.Struct('>l')
+_real = struct.Struct('>f')
+_double = struct.Struct('>d')
+_four_octets = struct.Struct('>BBBB')
+
+def encode_unsigned(value):
+    """Return the fewest octets that encode an unsigned integer."""
+    if 0 <= value < 0x100:
+        return _octet_chr[value]
+    if value < 0x10000:
+        return _short.pack(value)
+    if value < 0x1000000:
+        return _long.pack(value)[1:]
+    return _long.pack(value)
+
+def decode_unsigned(data):
+    """Return the unsigned integer encoded in the octets."""
+    length = len(data)
+    if length == 1:
+        return _octet_long[ord(data)]
+    if length == 2:
+        return long(_short.unpack(data)[0])
+    if length == 4:
+        return long(_long.unpack(data)[0])
+
+    rslt = 0L
+    for c in data:
+        rslt = (rslt << 8) + ord(c)
+    return rslt
+
+def encode_signed(value):
+    """Return the fewest octets that encode a signed integer, the value
+    is truncated to 32 bits."""
+    if -0x80 <= value < 0x80:
+        return _octet_chr[value & 0xFF]
+    if -0x8000 <= value < 0x8000:
+        return _signed_short.pack(value)
+    if -0x800000 <= value < 0x800000:
+        return _signed_long.pack(value)[1:]
+    return _long.pack(value & 0xFFFFFFFF)
+
+def decode_signed(data):
+    """Return the signed integer encoded in the octets."""
+    length = len(data)
+    if length == 1:
+        return _signed_octet.unpack(data)[0]
+    if length == 2:
+        return _signed_short.unpack(data)[0]
+    if length == 4:
+        return _signed_long.unpack(data)[0]
+
+    rslt = ord(data[0])
+    if (rslt & 0x80) != 0:
+        rslt = (-1 << 8) | rslt
+
+    for c in data[1:]:
+        rslt = (rslt << 8) | ord(c)
+    return rslt
+
+# an application tagged object identifier, the tag and the value
+_object_identifier_tag = struct.Struct('>BL')
+
+def encode_object_identifier_tag(value):
+    """Return the encoding of an application tagged object identifier,
+    tag and all, from its integer value."""
+    return _object_identifier_tag.pack(0xC4, value)
+
+# encoded bit strings of up to eight bits, by the tuple of bits
+_bit_string_cache = {}
+
 #
 #   Atomic
 #
@@ -565,27 +961,15 @@ class Unsigned(Atomic):
             raise TypeError, "invalid constructor datatype"
 
     def encode(self, tag):
-        # rip apart the number
-        data = [ord(c) for c in struct.pack('>L',self.value)]
-
-        # reduce the value to the smallest number of octets
-        while (len(data) > 1) and (data[0] == 0):
-            del data[0]
-
-        # encode the tag
-        tag.set_app_data(Tag.unsignedAppTag, ''.join(chr(c) for c in data))
+        # encode the tag with the smallest number of octets
+        tag.set_app_data(Tag.unsignedAppTag, encode_unsigned(self.value))
 
     def decode(self, tag):
         if (tag.tagClass != Tag.applicationTagClass) or (tag.tagNumber != Tag.unsignedAppTag):
             raise ValueError, "unsigned application tag required"
 
         # get the data
-        rslt = 0L
-        for c in tag.tagData:
-            rslt = (rslt << 8) + ord(c)
-
-        # save the result
-        self.value = rslt
+        self.value = decode_unsigned(tag.tagData)
 
     def __str__(self):
         return "Unsigned(%s)" % (self.value, )
@@ -615,43 +999,16 @@ class Integer(Atomic):
             raise TypeError, "invalid constructor datatype"
 
     def encode(self, tag):
-        # rip apart the number
-        data = [ord(c) for c in struct.pack('>I', (self.value & 0xFFFFFFFF))]
-
-        # reduce the value to the smallest number of bytes, be
-        # careful about sign extension
-        if self.value < 0:
-            while (len(data) > 1):
-                if (data[0] != 255):
-                    break
-                if (data[1] < 128):
-                    break
-                del data[0]
-        else:
-            while (len(data) > 1):
-                if (data[0] != 0):
-                    break
-                if (data[1] >= 128):
-                    break
-                del data[0]
-
-        # encode the tag
-        tag.set_app_data(Tag.integerAppTag, ''.join(chr(c) for c in data))
+        # encode the tag with the smallest number of octets, the sign
+        # extension is in the first one
+        tag.set_app_data(Tag.integerAppTag, encode_signed(self.value))
 
     def decode(self, tag):
         if (tag.tagClass != Tag.applicationTagClass) or (tag.tagNumber != Tag.integerAppTag):
             raise ValueError, "integer application tag required"
 
         # get the data
-        rslt = ord(tag.tagData[0])
-        if (rslt & 0x80) != 0:
-            rslt = (-1 << 8) | rslt
-
-        for c in tag.tagData[1:]:
-            rslt = (rslt << 8) | ord(c)
-
-        # save the result
-        self.value = rslt
+        self.value = decode_signed(tag.tagData)
 
     def __str__(self):
         return "Integer(%s)" % (self.value, )
@@ -682,14 +1039,14 @@ class Real(Atomic):
 
     def encode(self, tag):
         # encode the tag
-        tag.set_app_data(Tag.realAppTag, struct.pack('>f',self.value))
+        tag.set_app_data(Tag.realAppTag, _real.pack(self.value))
 
     def decode(self, tag):
         if (tag.tagClass != Tag.applicationTagClass) or (tag.tagNumber != Tag.realAppTag):
             raise ValueError, "real application tag required"
 
         # extract the data
-        self.value = struct.unpack('>f',tag.tagData)[0]
+        self.value = _real.unpack(tag.tagData)[0]
 
     def __str__(self):
         return "Real(%g)" % (self.value,)
@@ -720,14 +1077,14 @@ class Double(Atomic):
 
     def encode(self, tag):
         # encode the tag
-        tag.set_app_data(Tag.doubleAppTag, struct.pack('>d',self.value))
+        tag.set_app_data(Tag.doubleAppTag, _double.pack(self.value))
 
     def decode(self, tag):
         if (tag.tagClass != Tag.applicationTagClass) or (tag.tagNumber != Tag.doubleAppTag):
             raise ValueError, "double application tag required"
 
         # extract the data
-        self.value = struct.unpack('>d',tag.tagData)[0]
+        self.value = _double.unpack(tag.tagData)[0]
 
     def __str__(self):
         return "Double(%g)" % (self.value,)
@@ -865,20 +1222,27 @@ class BitString(Atomic):
             raise TypeError, "invalid constructor datatype"
 
     def encode(self, tag):
-        # compute the unused bits to fill out the string
-        _, used = divmod(len(self.value), 8)
-        unused = used and (8 - used) or 0
-
-        # start with the number of unused bits
-        data = chr(unused)
-
-        # build and append each packed octet
-        bits = self.value + [0] * unused
-        for i in range(0,len(bits),8):
-            x = 0
-            for j in range(0,8):
-                x |= bits[i + j] << (7 - j)
-            data += chr(x)
+        # short strings like the status flags have been seen before
+        key = tuple(self.value)
+        data = _bit_string_cache.get(key)
+        if data is None:
+            # compute the unused bits to fill out the string
+            _, used = divmod(len(self.value), 8)
+            unused = used and (8 - used) or 0
+
+            # start with the number of unused bits
+            data = chr(unused)
+
+            # build and append each packed octet
+            bits = self.value + [0] * unused
+            for i in range(0,len(bits),8):
+                x = 0
+                for j in range(0,8):
+                    x |= bits[i + j] << (7 - j)
+                data += chr(x)
+
+            if len(key) <= 8:
+                _bit_string_cache[key] = data
 
         # encode the tag
         tag.set_app_data(Tag.bitStringAppTag, data)
@@ -893,12 +1257,7 @@ class BitString(Atomic):
         # extract the data
         data = []
         for c in tag.tagData[1:]:
-            x = ord(c)
-            for i in range(8):
-                if (x & (1 << (7 - i))) != 0:
-                    data.append( 1 )
-                else:
-                    data.append( 0 )
+            data.extend(_octet_bits[ord(c)])
 
         # trim off the unused bits
         if unused:
@@ -959,163 +1318,172 @@ class BitString(Atomic):
         # funny cast to a bit
         self.value[bit] = value and 1 or 0
 
+#
+#   expand_enumerations
+#
+
+# translate lowers to uppers, keep digits, toss everything else
+_expand_translate_table = ''.join([c.isalnum() and c.upper() or '-' for c in [chr(cc) for cc in range(256)]])
+_expand_delete_chars = ''.join([chr(cc) for cc in range(256) if not chr(cc).isalnum()])
+del c, cc
+
+def expand_enumerations(klass):
+    """Build the tables of an enumeration, this is done when the class is
+    defined and must be done again if the enumerations are changed."""
+    # build a value dictionary
+    xlateTable = {}
+    names = {}
+    for name, value in klass.enumerations.iteritems():
+        # save the results
+        xlateTable[name] = value
+        xlateTable[value] = name
+        names[value] = name
+
+        # translate the name for a class const
+        name = name.translate(_expand_translate_table, _expand_delete_chars)
+
+        # save the name in the class
+        setattr(klass, name, value)
+
+    # names in order by value, the last item has the highest value
+    keylist = [None] * (max(names) + 1 if names else 0)
+    for value, name in names.iteritems():
+        keylist[value] = name
+
+    # save the tables in the class
+    setattr(klass, '_xlate_table', xlateTable)
+    setattr(klass, '_values', dict(klass.enumerations))
+    setattr(klass, '_names', names)
+    setattr(klass, '_keylist', keylist)
+
+    # forget the shared instances, and the object identifiers when this
+    # is the object type class of an identifier
+    setattr(klass, '_instances', {})
+    setattr(klass, '_identifierTuples', {})
+    setattr(klass, '_identifierValues', {})
+    setattr(klass, '_identifierHashes', {})
+
+#
+#   _EnumeratedMetaclass
+#
+
+class _EnumeratedMetaclass(type):
+
+    def __init__(cls, *args):
+        super(_EnumeratedMetaclass, cls).__init__(*args)
+
+        # build the tables when the class is defined
+        expand_enumerations(cls)
+
 #
 #   Enumerated
 #
 
 class Enumerated(Atomic):
 
+    """An enumerated value.  The value is kept as an integer, the value
+    attribute is the name when the enumeration has one and the integer
+    otherwise, and comparing and hashing use the integer.  The tables that
+    translate between names and integers are built when the class is
+    defined, call expand_enumerations() again after changing them."""
+
+    __metaclass__ = _EnumeratedMetaclass
+
     _app_tag = Tag.enumeratedAppTag
 
     enumerations = {}
-    _xlate_table = {}
 
     def __init__(self, arg=None):
-        self.value = 0L
-
-        # see if the class has a translate table
-        if not self.__class__.__dict__.has_key('_xlate_table'):
-            expand_enumerations(self.__class__)
+        self._value = 0L
 
         # initialize the object
         if arg is None:
             pass
         elif isinstance(arg, Tag):
             self.decode(arg)
-        elif isinstance(arg, types.IntType):
+        elif isinstance(arg, (types.IntType, types.LongType)):
             if (arg < 0):
                 raise ValueError, "unsigned integer required"
-
-            # convert it to a string if you can
-            try: self.value = self._xlate_table[arg]
-            except KeyError: self.value = long(arg)
-        elif isinstance(arg, types.LongType):
-            if (arg < 0):
-                raise ValueError, "unsigned integer required"
-
-            # convert it to a string if you can
-            try: self.value = self._xlate_table[arg]
-            except KeyError: self.value = long(arg)
+            self._value = arg
         elif isinstance(arg,types.StringType):
-            if self._xlate_table.has_key(arg):
-                self.value = arg
-            else:
-                raise ValueError, "undefined enumeration '%s'" % (arg,)
+            try: self._value = self._values[arg]
+            except KeyError: raise ValueError, "undefined enumeration '%s'" % (arg,)
         elif isinstance(arg, Enumerated):
-            self.value = arg.value
+            self._value = arg._value
         else:
             raise TypeError, "invalid constructor datatype"
 
+    @classmethod
+    def interned(cls, arg):
+        """Return a shared instance for a value, which must not be changed."""
+        try:
+            return cls._instances[arg]
+        except KeyError:
+            instance = cls._instances[arg] = cls(arg)
+            return instance
+
+    def _get_value(self):
+        try:
+            return self._names[self._value]
+        except KeyError:
+            return long(self._value)
+
+    def _set_value(self, value):
+        if isinstance(value, types.StringType):
+            try: value = self._values[value]
+            except KeyError: raise ValueError, "undefined enumeration '%s'" % (value,)
+        elif not isinstance(value, (types.IntType, types.LongType)):
+            raise TypeError, "%s is an invalid enumeration value datatype" % (type(value),)
+        self._value = value
+
+    value = property(_get_value, _set_value)
+
     def __getitem__(self, item):
         return self._xlate_table.get(item)
 
     def get_long(self):
-        if isinstance(self.value, types.LongType):
-            return self.value
-        elif isinstance(self.value, types.StringType):
-            return long(self._xlate_table[self.value])
-        else:
-            raise TypeError, "%s is an invalid enumeration value datatype" % (type(self.value),)
+        return long(self._value)
 
     def keylist(self):
         """Return a list of names in order by value."""
-        items = self.enumerations.items()
-        items.sort(lambda a, b: cmp(a[1], b[1]))
-
-        # last item has highest value
-        rslt = [None] * (items[-1][1] + 1)
-
-        # map the values
-        for key, value in items:
-            rslt[value] = key
+        return self._keylist[:]
 
-        # return the result
-        return rslt
+    def __hash__(self):
+        """The hash of the integer, an Enumerated in a dict or a set is found
+        with another Enumerated or the integer, but not with the name even
+        though it compares equal to it."""
+        return hash(self._value)
 
     def __cmp__(self, other):
         """Special function to make sure comparisons are done in enumeration
-        order, not alphabetic order."""
-        # hoop jump it
-        if not isinstance(other, self.__class__):
-            other = self.__class__(other)
-
-        # get the numeric version
-        a = self.get_long()
-        b = other.get_long()
-
-        # now compare the values
-        if (a < b):
-            return -1
-        elif (a > b):
-            return 1
-        else:
-            return 0
-
-    def encode(self, tag):
-        if isinstance(self.value, types.IntType):
-            value = long(self.value)
-        if isinstance(self.value, types.LongType):
-            value = self.value
-        elif isinstance(self.value, types.StringType):
-            value = self._xlate_table[self.value]
+        order, not alphabetic order.  Comparing with a name is kept from
+        when the value was the name, see __hash__()."""
+        if isinstance(other, Enumerated):
+            b = other._value
+        elif isinstance(other, (types.IntType, types.LongType)):
+            b = other
+        elif isinstance(other, types.StringType) and (other in self._values):
+            b = self._values[other]
         else:
-            raise TypeError, "%s is an invalid enumeration value datatype" % (type(self.value),)
+            # hoop jump it
+            b = self.__class__(other)._value
 
-        # rip apart the number
-        data = [ord(c) for c in struct.pack('>L',value)]
+        return cmp(self._value, b)
 
-        # reduce the value to the smallest number of octets
-        while (len(data) > 1) and (data[0] == 0):
-            del data[0]
-
-        # encode the tag
-        tag.set_app_data(Tag.enumeratedAppTag, ''.join(chr(c) for c in data))
+    def encode(self, tag):
+        # encode the tag with the smallest number of octets
+        tag.set_app_data(Tag.enumeratedAppTag, encode_unsigned(self._value))
 
     def decode(self, tag):
         if (tag.tagClass != Tag.applicationTagClass) or (tag.tagNumber != Tag.enumeratedAppTag):
             raise ValueError, "enumerated application tag required"
 
-        # get the data
-        rslt = 0L
-        for c in tag.tagData:
-            rslt = (rslt << 8) + ord(c)
-
-        # convert it to a string if you can
-        try: rslt = self._xlate_table[rslt]
-        except KeyError: pass
-
-        # save the result
-        self.value = rslt
+        # get the data, the name is looked up when it is asked for
+        self._value = decode_unsigned(tag.tagData)
 
     def __str__(self):
         return "Enumerated(%s)" % (self.value,)
 
-#
-#   expand_enumerations
-#
-
-# translate lowers to uppers, keep digits, toss everything else
-_expand_translate_table = ''.join([c.isalnum() and c.upper() or '-' for c in [chr(cc) for cc in range(256)]])
-_expand_delete_chars = ''.join([chr(cc) for cc in range(256) if not chr(cc).isalnum()])
-del c, cc
-
-def expand_enumerations(klass):
-    # build a value dictionary
-    xlateTable = {}
-    for name, value in klass.enumerations.iteritems():
-        # save the results
-        xlateTable[name] = value
-        xlateTable[value] = name
-
-        # translate the name for a class const
-        name = name.translate(_expand_translate_table, _expand_delete_chars)
-
-        # save the name in the class
-        setattr(klass, name, value)
-
-    # save the dictionary in the class
-    setattr(klass, '_xlate_table', xlateTable)
-
 #
 #   Date
 #
@@ -1200,14 +1568,20 @@ class Date(Atomic):
 
     def encode(self, tag):
         # encode the tag
-        tag.set_app_data(Tag.dateAppTag, ''.join(chr(c) for c in self.value))
+        if len(self.value) == 4:
+            tag.set_app_data(Tag.dateAppTag, _four_octets.pack(*self.value))
+        else:
+            tag.set_app_data(Tag.dateAppTag, ''.join(chr(c) for c in self.value))
 
     def decode(self, tag):
         if (tag.tagClass != Tag.applicationTagClass) or (tag.tagNumber != Tag.dateAppTag):
             raise ValueError, "date application tag required"
 
         # rip apart the data
-        self.value = tuple(ord(c) for c in tag.tagData)
+        if len(tag.tagData) == 4:
+            self.value = _four_octets.unpack(tag.tagData)
+        else:
+            self.value = tuple(ord(c) for c in tag.tagData)
 
     def __str__(self):
         # rip it apart
@@ -1288,14 +1662,20 @@ class Time(Atomic):
 
     def encode(self, tag):
         # encode the tag
-        tag.set_app_data(Tag.timeAppTag, ''.join(chr(c) for c in self.value))
+        if len(self.value) == 4:
+            tag.set_app_data(Tag.timeAppTag, _four_octets.pack(*self.value))
+        else:
+            tag.set_app_data(Tag.timeAppTag, ''.join(chr(c) for c in self.value))
 
     def decode(self, tag):
         if (tag.tagClass != Tag.applicationTagClass) or (tag.tagNumber != Tag.timeAppTag):
             raise ValueError, "time application tag required"
 
         # rip apart the data
-        self.value = tuple(ord(c) for c in tag.tagData)
+        if len(tag.tagData) == 4:
+            self.value = _four_octets.unpack(tag.tagData)
+        else:
+            self.value = tuple(ord(c) for c in tag.tagData)
 
     def __str__(self):
         # rip it apart
@@ -1379,19 +1759,26 @@ class ObjectType(Enumerated):
         , 'trendLogMultiple':27
         }
 
-expand_enumerations(ObjectType)
-
 #
 #   ObjectIdentifier
 #
 
+# the most identifiers of each object type class that share their tuples
+OBJECT_IDENTIFIER_CACHE_SIZE = 262144
+
 class ObjectIdentifier(Atomic):
 
+    """An object identifier, kept as the 32-bit value that is encoded.  The
+    value attribute is the (type, instance) tuple, with the name of the
+    type when there is one, and the tuples are shared by the identifiers
+    with the same value.  Comparing uses the integer, hashing uses the
+    value so an identifier and its tuple are the same key."""
+
     _app_tag = Tag.objectIdentifierAppTag
     objectTypeClass = ObjectType
 
     def __init__(self, *args):
-        self.value = ('analog-input', 0)
+        self._value = 0
 
         if len(args) == 0:
             pass
@@ -1399,95 +1786,110 @@ class ObjectIdentifier(Atomic):
             arg = args[0]
             if isinstance(arg, Tag):
                 self.decode(arg)
-            elif isinstance(arg, types.IntType):
-                self.set_long(long(arg))
-            elif isinstance(arg, types.LongType):
+            elif isinstance(arg, (types.IntType, types.LongType)):
                 self.set_long(arg)
             elif isinstance(arg, types.TupleType):
                 self.set_tuple(*arg)
+            elif isinstance(arg, ObjectIdentifier):
+                self._value = arg._value
             else:
                 raise TypeError, "invalid constructor datatype"
         elif len(args) == 2:
             self.set_tuple(*args)
-        elif isinstance(arg, ObjectIdentifier):
-            self.value = arg.value
         else:
             raise ValueError, "invalid constructor parameters"
 
+    @classmethod
+    def packed(cls, arg):
+        """Return the integer value of an identifier given as an integer,
+        a tuple or an ObjectIdentifier."""
+        if isinstance(arg, ObjectIdentifier):
+            return arg._value
+        if isinstance(arg, types.TupleType):
+            try:
+                return cls.objectTypeClass._identifierValues[arg]
+            except KeyError:
+                return cls(*arg)._value
+        if isinstance(arg, (types.IntType, types.LongType)):
+            return arg & 0xFFFFFFFF
+
+        raise TypeError, "invalid object identifier: %r" % (arg,)
+
+    def _get_value(self):
+        tuples = self.objectTypeClass._identifierTuples
+        try:
+            return tuples[self._value]
+        except KeyError:
+            pass
+
+        # try and make it pretty
+        objType = (self._value >> 22) & 0x03FF
+        objType = self.objectTypeClass._names.get(objType, objType)
+        rslt = (objType, self._value & 0x003FFFFF)
+
+        # share it with the other identifiers with this value
+        if len(tuples) < OBJECT_IDENTIFIER_CACHE_SIZE:
+            tuples[self._value] = rslt
+        return rslt
+
+    def _set_value(self, value):
+        self.set_tuple(*value)
+
+    value = property(_get_value, _set_value)
+
     def set_tuple(self, objType, objInstance):
+        values = self.objectTypeClass._identifierValues
+        key = (objType, objInstance)
+        try:
+            self._value = values[key]
+            return
+        except (KeyError, TypeError):
+            pass
+
         # allow a type name as well as an integer
-        if isinstance(objType, types.IntType):
-            # try and make it pretty
-            objType = self.objectTypeClass._xlate_table.get(objType, objType)
-        elif isinstance(objType, types.LongType):
-            objType = self.objectTypeClass._xlate_table.get(objType, int(objType))
+        if isinstance(objType, (types.IntType, types.LongType)):
+            pass
         elif isinstance(objType, types.StringType):
             # make sure the type is known
-            if objType not in self.objectTypeClass._xlate_table:
+            try:
+                objType = self.objectTypeClass._values[objType]
+            except KeyError:
                 raise ValueError, "unrecognized object type '%s'" % (objType,)
         else:
             raise TypeError, "invalid datatype for objType: %r, %r" % (type(objType), objType)
 
         # pack the components together
-        self.value = (objType, objInstance)
+        self._value = (objType << 22) + objInstance
+        if len(values) < OBJECT_IDENTIFIER_CACHE_SIZE:
+            values[key] = self._value
 
     def get_tuple(self):
         """Return the unsigned integer tuple of the identifier."""
-        objType, objInstance = self.value
-
-        if isinstance(objType, types.IntType):
-            pass
-        elif isinstance(objType, types.LongType):
-            objType = int(objType)
-        elif isinstance(objType, types.StringType):
-            # turn it back into an integer
-            objType = self.objectTypeClass()[objType]
-        else:
-            raise TypeError, "invalid datatype for objType"
-
-        # pack the components together
-        return (objType, objInstance)
+        return ((self._value >> 22) & 0x03FF, self._value & 0x003FFFFF)
 
     def set_long(self, value):
-        # suck out the type
-        objType = (value >> 22) & 0x03FF
-        
-        # try and make it pretty
-        objType = self.objectTypeClass()[objType] or objType
-
-        # suck out the instance
-        objInstance = value & 0x003FFFFF
-
-        # save the result
-        self.value = (objType, objInstance)
+        self._value = value & 0xFFFFFFFF
 
     def get_long(self):
         """Return the unsigned integer representation of the identifier."""
-        objType, objInstance = self.get_tuple()
-
-        # pack the components together
-        return long((objType << 22) + objInstance)
+        return long(self._value)
 
     def encode(self, tag):
         # encode the tag
-        tag.set_app_data(Tag.objectIdentifierAppTag, struct.pack('>L',self.get_long()))
+        tag.set_app_data(Tag.objectIdentifierAppTag, _long.pack(self._value))
 
     def decode(self, tag):
         if (tag.tagClass != Tag.applicationTagClass) or (tag.tagNumber != Tag.objectIdentifierAppTag):
             raise ValueError, "object identifier application tag required"
 
         # extract the data
-        self.set_long( struct.unpack('>L',tag.tagData)[0] )
+        self._value = _long.unpack(tag.tagData)[0]
 
     def __str__(self):
         # rip it apart
-        objType, objInstance = self.value
+        objType, objInstance = self.get_tuple()
 
-        if isinstance(objType, types.StringType):
-            typestr = objType
-        elif objType < 0:
-            typestr = "Bad %d" % (objType,)
-        elif self.objectTypeClass._xlate_table.has_key(objType):
+        if self.objectTypeClass._xlate_table.has_key(objType):
             typestr = self.objectTypeClass._xlate_table[objType]
         elif (objType < 128):
             typestr = "Reserved %d" % (objType,)
@@ -1496,26 +1898,28 @@ class ObjectIdentifier(Atomic):
         return "ObjectIdentifier(%s,%d)" % (typestr, objInstance)
 
     def __hash__(self):
-        return hash(self.value)
+        hashes = self.objectTypeClass._identifierHashes
+        try:
+            return hashes[self._value]
+        except KeyError:
+            pass
+
+        # the same as the tuple
+        rslt = hash(self._get_value())
+        if len(hashes) < OBJECT_IDENTIFIER_CACHE_SIZE:
+            hashes[self._value] = rslt
+        return rslt
 
     def __cmp__(self, other):
         """Special function to make sure comparisons are done in enumeration
         order, not alphabetic order."""
-        # hoop jump it
-        if not isinstance(other, self.__class__):
-            other = self.__class__(other)
-
-        # get the numeric version
-        a = self.get_long()
-        b = other.get_long()
-
-        # now compare the values
-        if (a < b):
-            return -1
-        elif (a > b):
-            return 1
+        if isinstance(other, ObjectIdentifier):
+            b = other._value
         else:
-            return 0
+            # hoop jump it
+            b = self.packed(other)
+
+        return cmp(self._value, b)
 
 #
 #   Application Tag Classes
@@ -0,0 +1,271 @@
+#!/usr/bin/python
+
+"""
+Profiler - where the time goes in the core loop.  The loop profiler times
+each pass through the loop, each task, each deferred function and each
+socket handler, tracks how late the recurring tasks are and logs the
+callbacks that take too long.  The sampler is a statistical profiler of
+the functions the loop is running.
+"""
+
+import sys
+import signal
+import asyncore
+
+from time import time as _time
+
+from debugging import ModuleLogger, DebugContents, bacpypes_debugging
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+# default slow callback threshold, in seconds
+SLOW_THRESHOLD = 0.05
+
+#
+#   callback_name
+#
+
+def callback_name(fn):
+    """Return a readable name for a function, method or task, the tasks
+    made from functions are named after the function."""
+    if hasattr(fn, 'fn'):
+        fn = fn.fn
+
+    im_self = getattr(fn, 'im_self', None)
+    if im_self is not None:
+        return "%s.%s" % (im_self.__class__.__name__, fn.__name__)
+    name = getattr(fn, '__name__', None)
+    if name:
+        return "%s.%s" % (getattr(fn, '__module__', None) or '?', name)
+    return fn.__class__.__name__
+
+#
+#   Timing
+#
+
+class Timing(object):
+
+    """The count, total and maximum of a set of times."""
+
+    __slots__ = ('count', 'total', 'maximum')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.maximum:
+            self.maximum = elapsed
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else 0.0
+
+#
+#   LoopProfiler
+#
+
+@bacpypes_debugging
+class LoopProfiler(DebugContents):
+
+    """Collect the timing of the parts of the core loop.  The run() function
+    calls the process_task(), call() and iteration() functions when it has
+    a profiler, the socket handlers are timed by wrapping the asyncore
+    functions that call them while the profiler is started."""
+
+    _debug_contents = ('threshold', 'iterations', 'slowCallbacks')
+
+    def __init__(self, threshold=SLOW_THRESHOLD):
+        if _debug: LoopProfiler._debug("__init__ threshold=%r", threshold)
+
+        self.threshold = threshold
+        self.reset()
+
+        # the asyncore functions while the profiler is started
+        self._asyncore = None
+
+    def reset(self):
+        """Forget what has been collected."""
+        if _debug: LoopProfiler._debug("reset")
+
+        self.iterations = Timing()      # wall time of each pass
+        self.busy = Timing()            # each pass without waiting for sockets
+        self.tasks = {}                 # name -> Timing
+        self.deferred = {}              # name -> Timing
+        self.handlers = {}              # name -> Timing
+        self.lateness = {}              # recurring task name -> Timing
+        self.slowCallbacks = 0
+
+        # time spent in socket handlers this pass
+        self._handlerTime = 0.0
+
+    def start(self):
+        """Wrap the asyncore functions that call the socket handlers."""
+        if _debug: LoopProfiler._debug("start")
+        if self._asyncore:
+            return
+
+        self._asyncore = (asyncore.read, asyncore.write, asyncore._exception)
+        asyncore.read = self._handler_wrapper(asyncore.read, 'handle_read')
+        asyncore.write = self._handler_wrapper(asyncore.write, 'handle_write')
+        asyncore._exception = self._handler_wrapper(asyncore._exception, 'handle_expt')
+
+    def stop(self):
+        """Put back the asyncore functions."""
+        if _debug: LoopProfiler._debug("stop")
+        if not self._asyncore:
+            return
+
+        asyncore.read, asyncore.write, asyncore._exception = self._asyncore
+        self._asyncore = None
+
+    def _handler_wrapper(self, fn, label):
+        def handler(obj):
+            start = _time()
+            try:
+                fn(obj)
+            finally:
+                elapsed = _time() - start
+                self._handlerTime += elapsed
+                self._record(self.handlers, "%s.%s" % (obj.__class__.__name__, label), elapsed)
+        return handler
+
+    def _record(self, timings, name, elapsed):
+        timing = timings.get(name)
+        if timing is None:
+            timing = timings[name] = Timing()
+        timing.add(elapsed)
+
+        if elapsed > self.threshold:
+            self.slowCallbacks += 1
+            LoopProfiler._warning("slow callback %s: %.3fs", name, elapsed)
+
+    def process_task(self, taskManager, task):
+        """Process the task and time it, for a recurring task also record
+        how long after its scheduled time it was processed."""
+        start = _time()
+        name = callback_name(task)
+
+        # the task time is the one it was scheduled for until it is installed again
+        if getattr(task, 'taskInterval', None):
+            lateness = self.lateness.get(name)
+            if lateness is None:
+                lateness = self.lateness[name] = Timing()
+            lateness.add(max(start - task.taskTime, 0.0))
+
+        try:
+            taskManager.process_task(task)
+        finally:
+            self._record(self.tasks, name, _time() - start)
+
+    def call(self, fn, args, kwargs):
+        """Call a deferred function and time it."""
+        start = _time()
+        try:
+            fn(*args, **kwargs)
+        finally:
+            self._record(self.deferred, callback_name(fn), _time() - start)
+
+    def iteration(self, start, socketStart, socketEnd):
+        """Record a pass through the loop that started at start, the socket
+        handlers were called between socketStart and socketEnd and the rest
+        of that time was waiting."""
+        end = _time()
+        elapsed = end - start
+
+        self.iterations.add(elapsed)
+        self.busy.add(elapsed - (socketEnd - socketStart) + self._handlerTime)
+        self._handlerTime = 0.0
+
+    def report(self, file=sys.stdout, top=10):
+        """Write a summary, the most expensive callbacks first."""
+        if _debug: LoopProfiler._debug("report")
+
+        file.write("iterations: %d, average %.6fs, busy %.6fs, maximum %.6fs\n" % (
+            self.iterations.count, self.iterations.average, self.busy.average, self.iterations.maximum))
+        file.write("slow callbacks: %d (threshold %.3fs)\n" % (self.slowCallbacks, self.threshold))
+
+        for label, timings in (("tasks", self.tasks), ("deferred functions", self.deferred),
+                ("socket handlers", self.handlers), ("recurring task lateness", self.lateness)):
+            if not timings:
+                continue
+            file.write("%s:\n" % (label,))
+            items = sorted(timings.items(), key=lambda item: item[1].total, reverse=True)
+            for name, timing in items[:top]:
+                file.write("    %-48s %8d %10.6fs avg %10.6fs max %10.3fs total\n" % (
+                    name, timing.count, timing.average, timing.maximum, timing.total))
+
+#
+#   LoopSampler
+#
+
+@bacpypes_debugging
+class LoopSampler(DebugContents):
+
+    """A statistical profiler driven by the SIGPROF interval timer.  The
+    timer counts the CPU time of the process so there are no samples while
+    the loop is waiting for something to do, and the signal is delivered to
+    the main thread which is the one running the loop.  The samples are
+    stacks of function names, the same as the folded format of flame graph
+    tools."""
+
+    _debug_contents = ('interval', 'samples')
+
+    def __init__(self, interval=0.005, depth=32):
+        if _debug: LoopSampler._debug("__init__ interval=%r depth=%r", interval, depth)
+
+        self.interval = interval
+        self.depth = depth
+        self.stacks = {}
+        self.samples = 0
+        self._previous = None
+
+    def start(self):
+        if _debug: LoopSampler._debug("start")
+        if not hasattr(signal, 'SIGPROF'):
+            raise RuntimeError, "sampling requires SIGPROF"
+
+        self._previous = signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        if _debug: LoopSampler._debug("stop")
+
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        if self._previous is not None:
+            signal.signal(signal.SIGPROF, self._previous)
+            self._previous = None
+
+    def sample(self, sig, frame):
+        names = []
+        while frame and (len(names) < self.depth):
+            code = frame.f_code
+            names.append("%s:%s" % (code.co_filename.rsplit('/', 1)[-1], code.co_name))
+            frame = frame.f_back
+        names.reverse()
+
+        key = ';'.join(names)
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def dump(self, file):
+        """Write the stacks in the folded format."""
+        if _debug: LoopSampler._debug("dump %r", file)
+
+        for key, count in sorted(self.stacks.items()):
+            file.write("%s %d\n" % (key, count))
+
+    def top(self, count=10):
+        """Return the functions seen most often at the top of the stack
+        as (name, samples) tuples."""
+        functions = {}
+        for key, samples in self.stacks.items():
+            name = key.rsplit(';', 1)[-1]
+            functions[name] = functions.get(name, 0) + samples
+
+        return sorted(functions.items(), key=lambda item: item[1], reverse=True)[:count]
@@ -11,6 +11,7 @@ from heapq import heapify, heappush, heappop
 
 from singleton import SingletonLogging
 from debugging import DebugContents, Logging, function_debugging, ModuleLogger
+from metrics import gauge, histogram
 
 # some debugging
 _debug = 0
@@ -20,6 +21,11 @@ _log = ModuleLogger(globals())
 _task_manager = None
 _unscheduled_tasks = []
 
+# metrics
+_scheduledTasks = gauge('bacpypes_scheduled_tasks', "Tasks waiting in the task manager")
+_taskLateness = histogram('bacpypes_task_lateness_seconds', "How long after their time tasks were run",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
 # only defined for linux platforms
 if 'linux' in sys.platform:
     from event import WaitableEvent
@@ -105,13 +111,21 @@ class OneShotDeleteTask(_Task):
 #   OneShotFunction
 #
 
+class OneShotFunctionTask(OneShotDeleteTask):
+
+    def __init__(self, fn, args, kwargs, when=None):
+        OneShotDeleteTask.__init__(self, when)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def process_task(self):
+        OneShotFunction._debug("process_task %r %s %s", self.fn, repr(self.args), repr(self.kwargs))
+        self.fn(*self.args, **self.kwargs)
+
 @function_debugging
 def OneShotFunction(fn, *args, **kwargs):
-    class OneShotFunctionTask(OneShotDeleteTask):
-        def process_task(self):
-            OneShotFunction._debug("process_task %r %s %s", fn, repr(args), repr(kwargs))
-            fn(*args, **kwargs)
-    task = OneShotFunctionTask(_time())
+    task = OneShotFunctionTask(fn, args, kwargs, _time())
     task.install_task()
     
     return task
@@ -120,14 +134,22 @@ def OneShotFunction(fn, *args, **kwargs):
 #   FunctionTask
 #
 
+class _FunctionTask(OneShotDeleteTask):
+
+    def __init__(self, fn, args, kwargs):
+        OneShotDeleteTask.__init__(self)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def process_task(self):
+        _log.debug("process_task (%r %r %r)", self.fn, self.args, self.kwargs)
+        self.fn(*self.args, **self.kwargs)
+
 def FunctionTask(fn, *args, **kwargs):
     _log.debug("FunctionTask %r %r %r", fn, args, kwargs)
     
-    class _FunctionTask(OneShotDeleteTask):
-        def process_task(self):
-            _log.debug("process_task (%r %r %r)", fn, args, kwargs)
-            fn(*args, **kwargs)
-    task = _FunctionTask()
+    task = _FunctionTask(fn, args, kwargs)
     _log.debug("    - task: %r", task)
     
     return task
@@ -172,19 +194,23 @@ class RecurringTask(_Task):
 #   RecurringFunctionTask
 #
 
+class _RecurringFunctionTask(RecurringTask):
+
+    def __init__(self, interval, fn, args, kwargs):
+        RecurringTask.__init__(self, interval)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def process_task(self):
+        if _debug: RecurringFunctionTask._debug("process_task %r %r %r", self.fn, self.args, self.kwargs)
+        self.fn(*self.args, **self.kwargs)
+
 @function_debugging
 def RecurringFunctionTask(interval, fn, *args, **kwargs):
     if _debug: RecurringFunctionTask._debug("RecurringFunctionTask %r %r %r", fn, args, kwargs)
     
-    class _RecurringFunctionTask(RecurringTask):
-        def __init__(self, interval):
-            RecurringTask.__init__(self, interval)
-            
-        def process_task(self):
-            if _debug: RecurringFunctionTask._debug("process_task %r %r %r", fn, args, kwargs)
-            fn(*args, **kwargs)
-            
-    task = _RecurringFunctionTask(interval)
+    task = _RecurringFunctionTask(interval, fn, args, kwargs)
     if _debug: RecurringFunctionTask._debug("    - task: %r", task)
     
     return task
@@ -193,16 +219,19 @@ def RecurringFunctionTask(interval, fn, *args, **kwargs):
 #   recurring_function
 #
 
+class _RecurringFunction(_RecurringFunctionTask):
+
+    def process_task(self):
+        if _debug: recurring_function._debug("process_task %r", self.fn)
+        self.fn()
+
+    def __call__(self, *args, **kwargs):
+        self.fn(*args, **kwargs)
+
 @function_debugging
 def recurring_function(interval):
     def recurring_function_decorator(fn):
-        class _RecurringFunctionTask(RecurringTask):
-            def process_task(self):
-                if _debug: recurring_function._debug("process_task %r", fn)
-                fn()
-            def __call__(self, *args, **kwargs):
-                fn(*args, **kwargs)
-        task = _RecurringFunctionTask(interval)
+        task = _RecurringFunction(interval, fn, (), {})
         task.install_task()
 
         return task
@@ -221,6 +250,7 @@ class TaskManager(SingletonLogging):
 
         # initialize
         self.tasks = []
+        _scheduledTasks.set_function(self.tasks.__len__)
         if 'linux' in sys.platform:
             self.trigger = _Trigger()
         else:
@@ -297,6 +327,7 @@ class TaskManager(SingletonLogging):
                 heappop(self.tasks)
                 task = nxttask
                 task.isScheduled = False
+                _taskLateness.observe(now - when)
 
                 if self.tasks:
                     when, nxttask = self.tasks[0]
@@ -9,12 +9,14 @@ import socket
 import cPickle
 from time import time as _time, sleep as _sleep
 from StringIO import StringIO
+from collections import deque
 
 from errors import *
-from debugging import ModuleLogger, DebugContents, bacpypes_debugging
+from debugging import ModuleLogger, DebugContents, bacpypes_debugging, trace_event
 
 from core import deferred
 from task import FunctionTask, OneShotFunction
+from packettrace import packetTrace, TCP_DATA
 from comm import PDU, Client, Server
 from comm import ServiceAccessPoint, ApplicationServiceElement
 
@@ -22,8 +24,17 @@ from comm import ServiceAccessPoint, ApplicationServiceElement
 _debug = 0
 _log = ModuleLogger(globals())
 
+# binary trace events
+TRACE_RECEIVE = trace_event('receive')
+TRACE_SEND = trace_event('send')
+
 # globals
 REBIND_SLEEP_INTERVAL = 2.0
+READ_BUFFER_SIZE = 65536
+WRITE_CHUNK_SIZE = 65536
+WRITE_HIGH_WATER = 1048576
+WRITE_LOW_WATER = 262144
+WRITE_LIMIT = 4194304
 
 #
 #   PickleActorMixIn
@@ -80,6 +91,107 @@ class PickleActorMixIn:
         else:
             self.pickleBuffer = ''
 
+#
+#   StreamBufferMixIn
+#
+#   Outgoing data is kept as a queue of buffers rather than one string so
+#   appending and partial sends do not copy the backlog, and small buffers
+#   are coalesced into one send.  When the backlog goes over the high water
+#   mark flow_control() is called so the upstream can hold off, and it is
+#   called again when it drains below the low water mark.  Nothing has to
+#   hold off, so the backlog is also capped: data that would take it over
+#   the limit is dropped, a whole PDU at a time so the stream stays framed.
+#   Incoming data is read into a buffer that is reused.
+#
+
+class StreamBufferMixIn:
+
+    def init_buffers(self):
+        # create a request queue
+        self.request = deque()
+        self.requestOffset = 0
+        self.requestSize = 0
+        self.requestPaused = False
+        self.requestDrops = 0
+
+        # reusable read buffer
+        self.readBuffer = bytearray(READ_BUFFER_SIZE)
+
+    def queue_data(self, data):
+        """Add some data to the request queue, return False if it was
+        dropped because the queue is full."""
+        if self.requestSize + len(data) > WRITE_LIMIT:
+            self.requestDrops += 1
+            return False
+
+        self.request.append(data)
+        self.requestSize += len(data)
+
+        # check for too much
+        if (not self.requestPaused) and (self.requestSize > WRITE_HIGH_WATER):
+            self.requestPaused = True
+            self.flow_control(True)
+
+        return True
+
+    def send_data(self):
+        """Send what the socket will take from the request queue and return
+        the number of octets sent."""
+        request = self.request
+
+        # coalesce small buffers into one send
+        if (len(request) > 1) and (len(request[0]) - self.requestOffset < WRITE_CHUNK_SIZE):
+            chunk = [request.popleft()[self.requestOffset:]]
+            chunk_size = len(chunk[0])
+            while request and (chunk_size < WRITE_CHUNK_SIZE):
+                data = request.popleft()
+                chunk.append(data)
+                chunk_size += len(data)
+
+            request.appendleft(''.join(chunk))
+            self.requestOffset = 0
+
+        # send from the current offset without slicing
+        data = request[0]
+        sent = self.send(buffer(data, self.requestOffset))
+        self.requestOffset += sent
+        self.requestSize -= sent
+
+        # done with the first buffer
+        if self.requestOffset >= len(data):
+            request.popleft()
+            self.requestOffset = 0
+
+        # check for enough room
+        if self.requestPaused and (self.requestSize <= WRITE_LOW_WATER):
+            self.requestPaused = False
+            self.flow_control(False)
+
+        return sent
+
+    def recv_data(self):
+        """Read into the reusable buffer and return the data, like the
+        dispatcher recv() function."""
+        try:
+            nbytes = self.socket.recv_into(self.readBuffer)
+        except socket.error as why:
+            if why.args[0] in asyncore._DISCONNECTED:
+                self.handle_close()
+                return ''
+            raise
+
+        # a closed connection reads nothing
+        if not nbytes:
+            self.handle_close()
+            return ''
+
+        return str(self.readBuffer[:nbytes])
+
+    def flow_control(self, paused):
+        """Called when the request queue goes over the high water mark
+        and when it drains below the low water mark."""
+        pass
+
 #
 #   TCPClient
 #
@@ -90,7 +202,7 @@ class PickleActorMixIn:
 #
 
 @bacpypes_debugging
-class TCPClient(asyncore.dispatcher):
+class TCPClient(StreamBufferMixIn, asyncore.dispatcher):
 
     def __init__(self, peer):
         if _debug: TCPClient._debug("__init__ %r", peer)
@@ -102,8 +214,8 @@ class TCPClient(asyncore.dispatcher):
         # save the peer
         self.peer = peer
 
-        # create a request buffer
-        self.request = ''
+        # create the request queue and read buffer
+        self.init_buffers()
 
         # hold the socket error if there was one
         self.socketError = None
@@ -114,7 +226,7 @@ class TCPClient(asyncore.dispatcher):
         if _debug: TCPClient._debug("    - connected (maybe)")
         
     def handle_connect(self):
-        if _debug: deferred(TCPClient._debug, "handle_connect")
+        if _debug and TCPClient._debugging: deferred(TCPClient._debug, "handle_connect")
 
     def handle_expt(self):
         pass
@@ -123,16 +235,17 @@ class TCPClient(asyncore.dispatcher):
         return 1
 
     def handle_read(self):
-        if _debug: deferred(TCPClient._debug, "handle_read")
+        if _debug and TCPClient._debugging: deferred(TCPClient._debug, "handle_read")
 
         try:
-            msg = self.recv(65536)
-            if _debug: deferred(TCPClient._debug, "    - received %d octets", len(msg))
+            msg = self.recv_data()
+            if _debug and TCPClient._debugging: deferred(TCPClient._debug, "    - received %d octets", len(msg))
+            if TCPClient._tracing: TCPClient._trace(TRACE_RECEIVE, len(msg))
             self.socketError = None
 
             # no socket means it was closed
             if not self.socket:
-                if _debug: deferred(TCPClient._debug, "    - socket was closed")
+                if _debug and TCPClient._debugging: deferred(TCPClient._debug, "    - socket was closed")
             else:
                 # sent the data upstream
                 deferred(self.response, PDU(msg))
@@ -148,14 +261,14 @@ class TCPClient(asyncore.dispatcher):
         return (len(self.request) != 0)
 
     def handle_write(self):
-        if _debug: deferred(TCPClient._debug, "handle_write")
+        if _debug and TCPClient._debugging: deferred(TCPClient._debug, "handle_write")
 
         try:
-            sent = self.send(self.request)
-            if _debug: deferred(TCPClient._debug, "    - sent %d octets, %d remaining", sent, len(self.request) - sent)
+            sent = self.send_data()
+            if _debug and TCPClient._debugging: deferred(TCPClient._debug, "    - sent %d octets, %d remaining", sent, self.requestSize)
+            if TCPClient._tracing: TCPClient._trace(TRACE_SEND, sent)
             self.socketError = None
 
-            self.request = self.request[sent:]
         except socket.error as err:
             if (err.args[0] == 111):
                 deferred(TCPClient._error, "connection to %r refused", self.peer)
@@ -164,7 +277,7 @@ class TCPClient(asyncore.dispatcher):
             self.socketError = err
 
     def handle_close(self):
-        if _debug: deferred(TCPClient._debug, "handle_close")
+        if _debug and TCPClient._debugging: deferred(TCPClient._debug, "handle_close")
 
         # close the socket
         self.close()
@@ -176,7 +289,8 @@ class TCPClient(asyncore.dispatcher):
         """Requests are queued for delivery."""
         if _debug: TCPClient._debug("indication %r", pdu)
 
-        self.request += pdu.pduData
+        if not self.queue_data(pdu.pduData):
+            deferred(TCPClient._warning, "write queue to %r full, %d octets dropped", self.peer, len(pdu.pduData))
 
 #
 #   TCPClientActor
@@ -260,6 +374,12 @@ class TCPClientActor(TCPClient):
         # process this as a response from the director
         self.director.response(pdu)
 
+    def flow_control(self, paused):
+        if _debug: TCPClientActor._debug("flow_control %r", paused)
+
+        # tell the director
+        self.director.flow_control(self, paused)
+
     def flush(self):
         if _debug: TCPClientActor._debug("flush")
         
@@ -344,6 +464,17 @@ class TCPClientDirector(Server, ServiceAccessPoint, DebugContents):
         """ Get the actor associated with an address or None. """
         return self.clients.get(address, None)
 
+    def flow_control(self, actor, paused):
+        """The actor has too much or enough room in its request queue."""
+        if _debug: TCPClientDirector._debug("flow_control %r %r", actor, paused)
+
+        # tell the ASE to hold off or continue
+        if self.serviceElement:
+            if paused:
+                self.sap_request(pausePeer=actor.peer)
+            else:
+                self.sap_request(resumePeer=actor.peer)
+
     def connect(self, address, reconnect=0):
         if _debug: TCPClientDirector._debug("connect %r reconnect=%r", address, reconnect)
         if address in self.clients:
@@ -390,7 +521,7 @@ class TCPClientDirector(Server, ServiceAccessPoint, DebugContents):
 #
 
 @bacpypes_debugging
-class TCPServer(asyncore.dispatcher):
+class TCPServer(StreamBufferMixIn, asyncore.dispatcher):
 
     def __init__(self, sock, peer):
         if _debug: TCPServer._debug("__init__ %r %r", sock, peer)
@@ -399,29 +530,37 @@ class TCPServer(asyncore.dispatcher):
         # save the peer
         self.peer = peer
 
-        # create a request buffer
-        self.request = ''
+        # the local address is in the packet trace records
+        try:
+            self.local = sock.getsockname()
+        except socket.error:
+            self.local = ('0.0.0.0', 0)
+
+        # create the request queue and read buffer
+        self.init_buffers()
         
         # hold the socket error if there was one
         self.socketError = None
         
     def handle_connect(self):
-        if _debug: deferred(TCPServer._debug, "handle_connect")
+        if _debug and TCPServer._debugging: deferred(TCPServer._debug, "handle_connect")
 
     def readable(self):
         return 1
 
     def handle_read(self):
-        if _debug: deferred(TCPServer._debug, "handle_read")
+        if _debug and TCPServer._debugging: deferred(TCPServer._debug, "handle_read")
 
         try:
-            msg = self.recv(65536)
-            if _debug: deferred(TCPServer._debug, "    - received %d octets", len(msg))
+            msg = self.recv_data()
+            if _debug and TCPServer._debugging: deferred(TCPServer._debug, "    - received %d octets", len(msg))
+            if TCPServer._tracing: TCPServer._trace(TRACE_RECEIVE, len(msg))
+            packetTrace.frame(TCP_DATA, self.peer, self.local, msg)
             self.socketError = None
 
             # no socket means it was closed
             if not self.socket:
-                if _debug: deferred(TCPServer._debug, "    - socket was closed")
+                if _debug and TCPServer._debugging: deferred(TCPServer._debug, "    - socket was closed")
             else:
                 deferred(self.response, PDU(msg))
 
@@ -436,14 +575,14 @@ class TCPServer(asyncore.dispatcher):
         return (len(self.request) != 0)
 
     def handle_write(self):
-        if _debug: deferred(TCPServer._debug, "handle_write")
+        if _debug and TCPServer._debugging: deferred(TCPServer._debug, "handle_write")
 
         try:
-            sent = self.send(self.request)
-            if _debug: deferred(TCPServer._debug, "    - sent %d octets, %d remaining", sent, len(self.request) - sent)
+            sent = self.send_data()
+            if _debug and TCPServer._debugging: deferred(TCPServer._debug, "    - sent %d octets, %d remaining", sent, self.requestSize)
+            if TCPServer._tracing: TCPServer._trace(TRACE_SEND, sent)
             self.socketError = None
 
-            self.request = self.request[sent:]
         except socket.error as why:
             if (why.args[0] == 111):
                 deferred(TCPServer._error, "connection to %r refused", self.peer)
@@ -452,7 +591,7 @@ class TCPServer(asyncore.dispatcher):
             self.socketError = why
 
     def handle_close(self):
-        if _debug: deferred(TCPServer._debug, "handle_close")
+        if _debug and TCPServer._debugging: deferred(TCPServer._debug, "handle_close")
 
         if not self:
             deferred(TCPServer._warning, "handle_close: self is None")
@@ -468,7 +607,9 @@ class TCPServer(asyncore.dispatcher):
         """Requests are queued for delivery."""
         if _debug: TCPServer._debug("indication %r", pdu)
 
-        self.request += pdu.pduData
+        packetTrace.frame(TCP_DATA, self.local, self.peer, pdu.pduData)
+        if not self.queue_data(pdu.pduData):
+            deferred(TCPServer._warning, "write queue to %r full, %d octets dropped", self.peer, len(pdu.pduData))
 
 #
 #   TCPServerActor
@@ -550,6 +691,12 @@ class TCPServerActor(TCPServer):
         # process this as a response from the director
         self.director.response(pdu)
 
+    def flow_control(self, paused):
+        if _debug: TCPServerActor._debug("flow_control %r", paused)
+
+        # tell the director
+        self.director.flow_control(self, paused)
+
     def flush(self):
         if _debug: TCPServerActor._debug("flush")
             
@@ -681,6 +828,17 @@ class TCPServerDirector(asyncore.dispatcher, Server, ServiceAccessPoint, DebugCo
         """ Get the actor associated with an address or None. """
         return self.servers.get(address, None)
 
+    def flow_control(self, actor, paused):
+        """The actor has too much or enough room in its request queue."""
+        if _debug: TCPServerDirector._debug("flow_control %r %r", actor, paused)
+
+        # tell the ASE to hold off or continue
+        if self.serviceElement:
+            if paused:
+                self.sap_request(pausePeer=actor.peer)
+            else:
+                self.sap_request(resumePeer=actor.peer)
+
     def indication(self, pdu):
         """Direct this PDU to the appropriate server."""
         if _debug: TCPServerDirector._debug("indication %r", pdu)
@@ -703,13 +861,29 @@ class TCPServerDirector(asyncore.dispatcher, Server, ServiceAccessPoint, DebugCo
 @bacpypes_debugging
 class StreamToPacket(Client, Server):
 
-    def __init__(self, fn, cid=None, sid=None):
-        if _debug: StreamToPacket._debug("__init__ %r cid=%r, sid=%r", fn, cid, sid)
+    """
+    Stream data for each address is collected and chopped into packets.
+    The packet function is called with the data and returns a (packet,
+    rest) tuple, or None when there isn't a complete packet.
+
+    A span function is called instead when it is given, with a bytearray
+    buffer and a parse offset, and returns the (start, end) span of the
+    next complete packet, or None.  The consumed part of the buffer is
+    removed once per chunk of stream data rather than once per packet.
+    """
+
+    def __init__(self, fn=None, cid=None, sid=None, spanFn=None):
+        if _debug: StreamToPacket._debug("__init__ %r cid=%r, sid=%r spanFn=%r", fn, cid, sid, spanFn)
         Client.__init__(self, cid)
         Server.__init__(self, sid)
         
-        # save the packet function
+        # one or the other
+        if (fn is None) == (spanFn is None):
+            raise RuntimeError, "a packet function or a span function is required"
+
+        # save the packet or span function
         self.packetFn = fn
+        self.spanFn = spanFn
         
         # start with an empty set of buffers
         self.upstreamBuffer = {}
@@ -734,6 +908,30 @@ class StreamToPacket(Client, Server):
             # save what didn't get sent
             streamBuffer[addr] = buff
         
+        def ChopSpans(addr):
+            # get the current buffer and add the new data
+            buff = streamBuffer.get(addr, None)
+            if not buff:
+                buff = streamBuffer[addr] = bytearray()
+            buff.extend(pdu.pduData)
+
+            # look for packets from the parse offset
+            offset = 0
+            while 1:
+                span = self.spanFn(buff, offset)
+                if span is None:
+                    break
+                start, offset = span
+
+                yield PDU(str(buff[start:offset]), source=pdu.pduSource, destination=pdu.pduDestination)
+
+            # compact once, what is left didn't get sent
+            if offset:
+                del buff[:offset]
+        
+        if self.spanFn:
+            Chop = ChopSpans
+
         # buffer related to the addresses
         if pdu.pduSource:
             for pdu in Chop(pdu.pduSource):
@@ -773,13 +971,13 @@ class StreamToPacketSAP(ApplicationServiceElement, ServiceAccessPoint):
         # save a reference to the StreamToPacket object
         self.stp = stp
         
-    def indication(self, addPeer=None, delPeer=None):
-        if _debug: StreamToPacketSAP._debug("indication addPeer=%r delPeer=%r", addPeer, delPeer)
+    def indication(self, addPeer=None, delPeer=None, **kwargs):
+        if _debug: StreamToPacketSAP._debug("indication addPeer=%r delPeer=%r %r", addPeer, delPeer, kwargs)
         
         if addPeer:
             # create empty buffers associated with the peer
-            self.stp.upstreamBuffer[addPeer] = ''
-            self.stp.downstreamBuffer[addPeer] = ''
+            self.stp.upstreamBuffer[addPeer] = bytearray()
+            self.stp.downstreamBuffer[addPeer] = bytearray()
             
         if delPeer:
             # delete the buffer contents associated with the peer
@@ -788,5 +986,5 @@ class StreamToPacketSAP(ApplicationServiceElement, ServiceAccessPoint):
             
         # chain this along
         if self.serviceElement:
-            self.sap_request(addPeer=addPeer, delPeer=delPeer)
+            self.sap_request(addPeer=addPeer, delPeer=delPeer, **kwargs)
 
@@ -6,15 +6,19 @@ UDP Communications Module
 
 import asyncore
 import socket
+import errno
 import cPickle
-import Queue
+
+from collections import deque, OrderedDict
 
 from time import time as _time
 
-from debugging import ModuleLogger, Logging
+from debugging import ModuleLogger, Logging, trace_event
 
 from core import deferred
-from task import FunctionTask
+from task import RecurringFunctionTask
+from packettrace import packetTrace, UDP_FRAME
+from metrics import counter, gauge
 from comm import PDU, Server
 from comm import ServiceAccessPoint
 
@@ -22,11 +26,22 @@ from comm import ServiceAccessPoint
 _debug = 0
 _log = ModuleLogger(globals())
 
+# binary trace events
+TRACE_RECEIVE = trace_event('receive')
+TRACE_SEND = trace_event('send')
+TRACE_DROP = trace_event('drop')
+
+# metrics
+_packetsReceived = counter('bacpypes_packets_received_total', "Packets received by each layer", ('layer',)).labels('udp')
+_packetsSent = counter('bacpypes_packets_sent_total', "Packets sent by each layer", ('layer',)).labels('udp')
+_queueDepth = gauge('bacpypes_udp_queue_depth', "Datagrams waiting to be sent by each director", ('address',))
+
 #
 #   UDPActor
 #
 #   Actors are helper objects for a director.  There is one actor for
-#   each peer.
+#   each peer.  When the director has a timeout the actors that have been
+#   idle are removed by a sweep of the director.
 #
 
 class UDPActor(Logging):
@@ -40,13 +55,9 @@ class UDPActor(Logging):
         # associated with a peer
         self.peer = peer
 
-        # add a timer
+        # keep track of activity for the idle sweep
         self.timeout = director.timeout
-        if self.timeout > 0:
-            self.timer = FunctionTask(self.IdleTimeout)
-            self.timer.install_task(_time() + self.timeout)
-        else:
-            self.timer = None
+        self.lastActivity = _time()
 
         # tell the director this is a new actor
         self.director.AddActor(self)
@@ -60,19 +71,19 @@ class UDPActor(Logging):
     def indication(self, pdu):
         if _debug: UDPActor._debug("indication %r", pdu)
 
-        # reschedule the timer
-        if self.timer:
-            self.timer.install_task(_time() + self.timeout)
+        # not idle
+        if self.timeout > 0:
+            self.lastActivity = _time()
 
         # put it in the outbound queue for the director
-        self.director.request.put(pdu)
+        self.director.put_request(pdu)
 
     def response(self, pdu):
         if _debug: UDPActor._debug("response %r", pdu)
 
-        # reschedule the timer
-        if self.timer:
-            self.timer.install_task(_time() + self.timeout)
+        # not idle
+        if self.timeout > 0:
+            self.lastActivity = _time()
 
         # process this as a response from the director
         self.director.response(pdu)
@@ -115,22 +126,28 @@ class UDPPickleActor(UDPActor, Logging):
 
 class UDPDirector(asyncore.dispatcher, Server, ServiceAccessPoint, Logging):
 
-    def __init__(self, address, timeout=0, reuse=False, actorClass=UDPActor, sid=None, sapID=None):
-        if _debug: UDPDirector._debug("__init__ %r timeout=%r reuse=%r actorClass=%r sid=%r sapID=%r", address, timeout, reuse, actorClass, sid, sapID)
+    def __init__(self, address, timeout=0, reuse=False, actorClass=UDPActor, sid=None, sapID=None, batch=False, rcvbuf=None, reuseport=False, maxPeers=0):
+        if _debug: UDPDirector._debug("__init__ %r timeout=%r reuse=%r actorClass=%r sid=%r sapID=%r batch=%r rcvbuf=%r reuseport=%r maxPeers=%r", address, timeout, reuse, actorClass, sid, sapID, batch, rcvbuf, reuseport, maxPeers)
         Server.__init__(self, sid)
         ServiceAccessPoint.__init__(self, sapID)
         
-        # check the actor class
-        if not issubclass(actorClass, UDPActor):
+        # check the actor class, None routes datagrams without actors
+        if (actorClass is not None) and (not issubclass(actorClass, UDPActor)):
             raise TypeError, "actorClass must be a subclass of UDPActor"
         self.actorClass = actorClass
         
         # save the timeout for actors
         self.timeout = timeout
+
+        # the least recently used actor is removed to make room
+        self.maxPeers = maxPeers
         
         # save the address
         self.address = address
 
+        # in batch mode the socket is drained and filled each wakeup
+        self.batch = batch
+
         asyncore.dispatcher.__init__(self)
 
         # ask the dispatcher for a socket
@@ -140,6 +157,13 @@ class UDPDirector(asyncore.dispatcher, Server, ServiceAccessPoint, Logging):
         if reuse:
             self.set_reuse_addr()
 
+        # several processes may bind the same port and the kernel spreads
+        # the traffic across them, each peer sticks to one process
+        if reuseport:
+            if not hasattr(socket, 'SO_REUSEPORT'):
+                raise RuntimeError, "SO_REUSEPORT not supported"
+            self.socket.setsockopt( socket.SOL_SOCKET, socket.SO_REUSEPORT, 1 )
+
         # proceed with the bind
         self.bind(address)
         if _debug: UDPDirector._debug("    - getsockname: %r", self.socket.getsockname())
@@ -147,11 +171,35 @@ class UDPDirector(asyncore.dispatcher, Server, ServiceAccessPoint, Logging):
         # allow it to send broadcasts
         self.socket.setsockopt( socket.SOL_SOCKET, socket.SO_BROADCAST, 1 )
 
-        # create the request queue
-        self.request = Queue.Queue()
-
-        # start with an empty peer pool
-        self.peers = {}
+        # a bigger receive buffer rides out bursts of traffic
+        if rcvbuf:
+            self.socket.setsockopt( socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf )
+
+        # create the request queue, append() and popleft() are atomic so
+        # other threads may still queue requests
+        self.request = deque()
+        _queueDepth.labels("%s:%s" % address[:2]).set_function(self.request.__len__)
+
+        # counters
+        self.packetsReceived = 0
+        self.packetsSent = 0
+        self.receiveErrors = 0
+        self.sendDrops = 0
+        self.requestHighWater = 0
+
+        # start with an empty peer pool, least recently used first
+        self.peers = OrderedDict()
+
+        # a passive tap is called with (data, source, destination) for
+        # each datagram received or sent
+        self.tap = None
+
+        # one task removes all of the idle actors
+        if (actorClass is not None) and (timeout > 0):
+            self.sweepTask = RecurringFunctionTask(timeout * 500.0, self.idle_sweep)
+            self.sweepTask.install_task()
+        else:
+            self.sweepTask = None
 
     def AddActor(self, actor):
         """Add an actor when a new one is connected."""
@@ -175,55 +223,150 @@ class UDPDirector(asyncore.dispatcher, Server, ServiceAccessPoint, Logging):
 
     def GetActor(self, address):
         return self.peers.get(address, None)
-        
+
+    def get_actor(self, address):
+        """Return the actor for a peer, creating one if necessary."""
+        actor = self.peers.get(address, None)
+        if not actor:
+            # make room for a new one
+            if self.maxPeers and (len(self.peers) >= self.maxPeers):
+                oldest = self.peers[next(iter(self.peers))]
+                if _debug: UDPDirector._debug("    - least recently used: %r", oldest)
+
+                oldest.IdleTimeout()
+
+            actor = self.actorClass(self, address)
+
+        elif self.maxPeers:
+            # move it to the end
+            del self.peers[address]
+            self.peers[address] = actor
+
+        return actor
+
+    def idle_sweep(self):
+        """Remove the actors that have been idle longer than the timeout."""
+        if _debug: UDPDirector._debug("idle_sweep")
+
+        # check the oldest activity
+        cutoff = _time() - self.timeout
+        for actor in [actor for actor in self.peers.itervalues() if actor.lastActivity <= cutoff]:
+            actor.IdleTimeout()
+
     def handle_connect(self):
-        if _debug: deferred(UDPDirector._debug, "handle_connect")
+        if _debug and UDPDirector._debugging: deferred(UDPDirector._debug, "handle_connect")
 
     def readable(self):
         return 1
 
     def handle_read(self):
-        if _debug: deferred(UDPDirector._debug, "handle_read")
-
-        try:
-            msg, addr = self.socket.recvfrom(65536)
-            if _debug: deferred(UDPDirector._debug, "    - received %d octets from %s", len(msg), addr)
-
-            # send the PDU up to the client
-            deferred(self._response, PDU(msg, source=addr))
-
-        except socket.timeout as err:
-            deferred(UDPDirector._error, "handle_read socket timeout: %s", err)
-        except socket.error as err:
-            if err.args[0] == 11:
-                pass
-            else:
-                deferred(UDPDirector._error, "handle_read socket error: %s", err)
+        if _debug and UDPDirector._debugging: deferred(UDPDirector._debug, "handle_read")
+
+        pdus = []
+        while True:
+            try:
+                msg, addr = self.socket.recvfrom(65536)
+                if _debug and UDPDirector._debugging: deferred(UDPDirector._debug, "    - received %d octets from %s", len(msg), addr)
+
+                self.packetsReceived += 1
+                _packetsReceived.inc()
+                if UDPDirector._tracing: UDPDirector._trace(TRACE_RECEIVE, len(msg))
+                packetTrace.frame(UDP_FRAME, addr, self.address, msg)
+                if self.tap:
+                    self.tap(msg, addr, self.address)
+                pdus.append(PDU(msg, source=addr))
+
+            except socket.timeout as err:
+                self.receiveErrors += 1
+                deferred(UDPDirector._error, "handle_read socket timeout: %s", err)
+                break
+            except socket.error as err:
+                if err.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    self.receiveErrors += 1
+                    deferred(UDPDirector._error, "handle_read socket error: %s", err)
+                break
+
+            # one datagram per wakeup unless the socket is being drained
+            if not self.batch:
+                break
+
+        # send the PDUs up to the client
+        if pdus:
+            deferred(self._responses, pdus)
 
     def writable(self):
         """Return true iff there is a request pending."""
-        return (not self.request.empty())
-
-    def handle_write(self):
-        """get a PDU from the queue and send it."""
-        if _debug: deferred(UDPDirector._debug, "handle_write")
+        return (len(self.request) != 0)
 
-        try:
-            pdu = self.request.get()
+    def put_request(self, pdu):
+        """Queue a PDU to be sent."""
+        self.request.append(pdu)
 
-            sent = self.socket.sendto(pdu.pduData, pdu.pduDestination)
-            if _debug: deferred(UDPDirector._debug, "    - sent %d octets to %s", sent, pdu.pduDestination)
+        # track the queue depth
+        depth = len(self.request)
+        if depth > self.requestHighWater:
+            self.requestHighWater = depth
 
-        except socket.error as err:
-            deferred(UDPDirector._error, "handle_write socket error: %s", err)
+    def handle_write(self):
+        """get a PDU from the queue and send it, in batch mode keep
+        sending until the queue is empty or the socket would block."""
+        if _debug and UDPDirector._debugging: deferred(UDPDirector._debug, "handle_write")
+
+        while self.request:
+            pdu = self.request[0]
+
+            # a fan-out sends the same datagram to a list of destinations
+            destinations = pdu.pduDestinations
+            if destinations is None:
+                destinations = [pdu.pduDestination]
+
+            for i, dest in enumerate(destinations):
+                try:
+                    sent = self.socket.sendto(pdu.pduData, dest)
+                    if _debug and UDPDirector._debugging: deferred(UDPDirector._debug, "    - sent %d octets to %s", sent, dest)
+
+                    self.packetsSent += 1
+                    _packetsSent.inc()
+                    if UDPDirector._tracing: UDPDirector._trace(TRACE_SEND, sent)
+                    packetTrace.frame(UDP_FRAME, self.address, dest, pdu.pduData)
+                    if self.tap:
+                        self.tap(pdu.pduData, self.address, dest)
+
+                except socket.error as err:
+                    if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        # leave the rest in the queue for the next time
+                        pdu.pduDestinations = destinations[i:]
+                        return
+
+                    self.sendDrops += 1
+                    if UDPDirector._tracing: UDPDirector._trace(TRACE_DROP, len(pdu.pduData))
+                    deferred(UDPDirector._error, "handle_write socket error: %s", err)
+
+            # completely sent
+            self.request.popleft()
+
+            # one datagram per wakeup unless the socket is being filled
+            if not self.batch:
+                break
 
     def handle_close(self):
         """Remove this from the monitor when it's closed."""
-        if _debug: deferred(UDPDirector._debug, "handle_close")
+        if _debug and UDPDirector._debugging: deferred(UDPDirector._debug, "handle_close")
 
         self.close()
         self.socket = None
 
+    def close(self):
+        """Close the socket and forget the queue depth gauge."""
+        if _debug: UDPDirector._debug("close")
+
+        asyncore.dispatcher.close(self)
+        _queueDepth.remove("%s:%s" % self.address[:2])
+
+        # no more sweeping
+        if self.sweepTask and self.sweepTask.isScheduled:
+            self.sweepTask.suspend_task()
+
     def indication(self, pdu):
         """Client requests are queued for delivery."""
         if _debug: UDPDirector._debug("indication %r", pdu)
@@ -231,25 +374,27 @@ class UDPDirector(asyncore.dispatcher, Server, ServiceAccessPoint, Logging):
         # get the destination
         addr = pdu.pduDestination
 
-        # get the peer
-        peer = self.peers.get(addr, None)
-        if not peer:
-            peer = self.actorClass(self, addr)
+        # a fan-out is queued once and bypasses the actors
+        if (pdu.pduDestinations is not None) or (self.actorClass is None):
+            self.put_request(pdu)
+            return
 
         # send the message
-        peer.indication(pdu)
+        self.get_actor(addr).indication(pdu)
 
     def _response(self, pdu):
-        """Incoming datagrams are routed through an actor."""
+        """Incoming datagrams are routed through an actor, if any."""
         if _debug: UDPDirector._debug("_response %r", pdu)
 
-        # get the destination
-        addr = pdu.pduSource
-
-        # get the peer
-        peer = self.peers.get(addr, None)
-        if not peer:
-            peer = self.actorClass(self, addr)
+        # no actors, send it up to the client
+        if self.actorClass is None:
+            self.response(pdu)
+            return
 
         # send the message
-        peer.response(pdu)
+        self.get_actor(pdu.pduSource).response(pdu)
+
+    def _responses(self, pdus):
+        """Incoming datagrams from one read are passed up in order."""
+        for pdu in pdus:
+            self._response(pdu)
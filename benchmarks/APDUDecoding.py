@@ -0,0 +1,123 @@
+#!/usr/bin/python
+
+"""
+APDU Decoding Benchmark - compare the time to decode a large
+ReadPropertyMultiple ACK when all of the tags are decoded into a tag list
+first, taking the octets off the front of the PDU, and when the tags are
+decoded from the data as the sequence decoder asks for them.
+"""
+
+import time
+
+from bacpypes.debugging import bacpypes_debugging, ModuleLogger
+from bacpypes.consolelogging import ArgumentParser
+
+from bacpypes.pdu import PDU
+from bacpypes.primitivedata import TagList, Real
+from bacpypes.constructeddata import Sequence, Any
+from bacpypes.apdu import APDU, ComplexAckPDU, ReadPropertyMultipleACK, \
+    ReadAccessResult, ReadAccessResultElement, ReadAccessResultElementChoice
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+#
+#   TagListReadPropertyMultipleACK
+#
+#   This is the ACK decoded the way it was, the rest of the APDU is decoded
+#   into a tag list and then the sequence is decoded from the list.
+#
+
+class TagListReadPropertyMultipleACK(ReadPropertyMultipleACK):
+
+    def decode(self, apdu):
+        self.update(apdu)
+
+        self._tag_list = TagList()
+        self._tag_list.decode(apdu)
+
+        Sequence.decode(self, self._tag_list)
+
+#
+#   make_ack
+#
+
+@bacpypes_debugging
+def make_ack(count):
+    """Return the encoded ACK with the present value of count objects."""
+    if _debug: make_ack._debug("make_ack %r", count)
+
+    results = []
+    for i in range(count):
+        value = Any()
+        value.cast_in(Real(float(i)))
+
+        results.append(ReadAccessResult(
+            objectIdentifier=('analogValue', i + 1),
+            listOfResults=[ReadAccessResultElement(
+                propertyIdentifier='presentValue',
+                readResult=ReadAccessResultElementChoice(propertyValue=value),
+                )],
+            ))
+
+    ack = ReadPropertyMultipleACK(listOfReadAccessResults=results)
+    ack.apduInvokeID = 1
+
+    apdu = APDU()
+    ack.encode(apdu)
+    pdu = PDU()
+    apdu.encode(pdu)
+
+    return pdu.pduData
+
+#
+#   decode
+#
+
+def decode(data, klass):
+    apdu = APDU()
+    apdu.decode(PDU(data))
+    xpdu = ComplexAckPDU()
+    xpdu.decode(apdu)
+
+    ack = klass()
+    ack.decode(xpdu)
+
+    return ack
+
+#
+#   __main__
+#
+
+try:
+    # parse the command line arguments
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int,
+        help="number of results in the ACK, default 1000",
+        default=1000,
+        )
+    parser.add_argument('--loops', type=int,
+        help="number of times to decode the ACK, default 5",
+        default=5,
+        )
+    args = parser.parse_args()
+
+    if _debug: _log.debug("initialization")
+    if _debug: _log.debug("    - args: %r", args)
+
+    data = make_ack(args.count)
+
+    for label, klass in (("tag list", TagListReadPropertyMultipleACK), ("tag stream", ReadPropertyMultipleACK)):
+        start = time.time()
+        for i in range(args.loops):
+            ack = decode(data, klass)
+            assert len(ack.listOfReadAccessResults) == args.count
+        elapsed = (time.time() - start) / args.loops
+
+        print "%-12s %8d results %8d octets %10.6fs per ACK" % (label, args.count, len(data), elapsed)
+
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    _log.debug("finally")
@@ -0,0 +1,118 @@
+#!/usr/bin/python
+
+"""
+Analysis Decoding Benchmark - compare the time it takes to go through a
+capture file decoding every packet completely, with lazy packets that only
+look at the timestamp or the source address, and with a pre-filter that
+only decodes the packets of one APDU service.
+"""
+
+import time
+
+from bacpypes.debugging import bacpypes_debugging, ModuleLogger
+from bacpypes.consolelogging import ArgumentParser
+
+from bacpypes.analysis import decode_file, PacketFilter
+from bacpypes.apdu import unconfirmed_request_types, confirmed_request_types
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+#
+#   full_decode
+#
+
+def full_decode(fname, apduClass):
+    count = 0
+    for pkt in decode_file(fname):
+        pkt._timestamp
+        count += 1
+    return count
+
+#
+#   lazy_timestamps
+#
+
+def lazy_timestamps(fname, apduClass):
+    count = 0
+    for pkt in decode_file(fname, lazy=True):
+        pkt._timestamp
+        count += 1
+    return count
+
+#
+#   lazy_sources
+#
+
+def lazy_sources(fname, apduClass):
+    count = 0
+    for pkt in decode_file(fname, lazy=True):
+        pkt.pduSource
+        count += 1
+    return count
+
+#
+#   prefiltered
+#
+
+def prefiltered(fname, apduClass):
+    count = 0
+    for pkt in decode_file(fname, prefilter=PacketFilter(apduClasses=[apduClass])):
+        pkt.pduSource
+        count += 1
+    return count
+
+#
+#   find_class
+#
+
+@bacpypes_debugging
+def find_class(name):
+    """Return the request class that matches the name."""
+    if _debug: find_class._debug("find_class %r", name)
+
+    for types in (confirmed_request_types, unconfirmed_request_types):
+        for klass in types.values():
+            if klass.__name__ == name:
+                return klass
+
+    raise ValueError, "no request class: %r" % (name,)
+
+#
+#   __main__
+#
+
+try:
+    # parse the command line arguments
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('pcap', type=str,
+        help="pcap or pcapng file",
+        )
+    parser.add_argument('--service', type=str,
+        help="request class for the pre-filter, default WhoIsRequest",
+        default='WhoIsRequest',
+        )
+    args = parser.parse_args()
+
+    if _debug: _log.debug("initialization")
+    if _debug: _log.debug("    - args: %r", args)
+
+    apduClass = find_class(args.service)
+
+    for label, fn in (
+            ("full decode", full_decode),
+            ("lazy timestamps", lazy_timestamps),
+            ("lazy sources", lazy_sources),
+            ("pre-filtered", prefiltered),
+            ):
+        start = time.time()
+        count = fn(args.pcap, apduClass)
+        elapsed = time.time() - start
+
+        print "%-16s %8d packets %8.3fs %10.1f packets/s" % (label, count, elapsed, count / elapsed)
+
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    _log.debug("finally")
@@ -0,0 +1,129 @@
+#!/usr/bin/python
+
+"""
+BSLL Framing Benchmark - compare the throughput of chopping a TCP stream of
+BSLL frames with the original string slicing and with the bytearray buffer
+and parse offset used by StreamToPacket with a span function.  Building the PDU for each frame
+costs the same either way and is not included.
+"""
+
+import time
+
+from bacpypes.debugging import bacpypes_debugging, ModuleLogger
+from bacpypes.consolelogging import ArgumentParser
+
+from bacpypes.bsllservice import _Packetize
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+#
+#   string_packetize
+#
+#   This is the framing function and loop as it was, each packet found
+#   returns a new string with the rest of the data.
+#
+
+def string_packetize(data):
+    start_ind = data.find('\x83')
+    if start_ind == -1:
+        return None
+    if start_ind > 0:
+        data = data[start_ind:]
+    if len(data) < 4:
+        return None
+    total_len = (ord(data[2]) << 8) + ord(data[3])
+    if len(data) < total_len:
+        return None
+    return (data[:total_len], data[total_len:])
+
+def string_chop(chunks):
+    count = 0
+    buff = ''
+    for chunk in chunks:
+        buff = buff + chunk
+        while 1:
+            packet = string_packetize(buff)
+            if packet is None:
+                break
+            count += 1
+            buff = packet[1]
+    return count
+
+#
+#   buffer_chop
+#
+#   This is the same loop as StreamToPacket.packetize() with a span function.
+#
+
+def buffer_chop(chunks):
+    count = 0
+    buff = bytearray()
+    for chunk in chunks:
+        buff.extend(chunk)
+        offset = 0
+        while 1:
+            span = _Packetize(buff, offset)
+            if span is None:
+                break
+            start, offset = span
+            str(buff[start:offset])
+            count += 1
+        if offset:
+            del buff[:offset]
+    return count
+
+#
+#   make_chunks
+#
+
+@bacpypes_debugging
+def make_chunks(frame_size, chunk_size, total_size):
+    """Build a stream of frames and split it into chunks that do not line
+    up with the frames."""
+    if _debug: make_chunks._debug("make_chunks %r %r %r", frame_size, chunk_size, total_size)
+
+    frame = '\x83\x00' + chr(frame_size >> 8) + chr(frame_size & 0xFF) + ('x' * (frame_size - 4))
+    stream = frame * (total_size // frame_size)
+
+    return [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+
+#
+#   __main__
+#
+
+try:
+    # parse the command line arguments
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--frame', type=int,
+        help="frame size, default 32",
+        default=32,
+        )
+    parser.add_argument('--chunk', type=int,
+        help="read size, default 65536",
+        default=65536,
+        )
+    parser.add_argument('--total', type=int,
+        help="total stream size, default 8MB",
+        default=8 * 1024 * 1024,
+        )
+    args = parser.parse_args()
+
+    if _debug: _log.debug("initialization")
+    if _debug: _log.debug("    - args: %r", args)
+
+    chunks = make_chunks(args.frame, args.chunk, args.total)
+    total_mb = sum(len(chunk) for chunk in chunks) / 1048576.0
+
+    for label, fn in (("string slicing", string_chop), ("buffer offset", buffer_chop)):
+        start = time.time()
+        count = fn(chunks)
+        elapsed = time.time() - start
+
+        print "%-16s %8d frames %8.3fs %8.2f MB/s" % (label, count, elapsed, total_mb / elapsed)
+
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    _log.debug("finally")
@@ -0,0 +1,120 @@
+#!/usr/bin/python
+
+"""
+Debug Logging Benchmark - measure the cost of the debugging statements in
+a hot function when debugging is off, when the module is being debugged but
+the class is not (the old way called the logger anyway), and of binary trace
+records compared to not tracing.
+
+None of these are free.  With debugging off the 'if _debug:' guard is a
+global lookup and a test, and when the module is being debugged the class
+that is not still calls the no-op debug function with its arguments unless
+the guard also checks the class flag, 'if _debug and Quiet._debugging:'.
+"""
+
+import time
+import logging
+
+from bacpypes.debugging import bacpypes_debugging, ModuleLogger, TraceRing, \
+    enable_tracing, disable_tracing, trace_event
+from bacpypes.consolelogging import ArgumentParser
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+# trace event
+TRACE_CALL = trace_event('call')
+
+#
+#   Quiet
+#
+
+@bacpypes_debugging
+class Quiet:
+
+    def plain(self, value):
+        return value + 1
+
+    def debugged(self, value):
+        if _debug: Quiet._debug("debugged %r", value)
+        return value + 1
+
+    def flagged(self, value):
+        if _debug and Quiet._debugging: Quiet._debug("flagged %r", value)
+        return value + 1
+
+    def traced(self, value):
+        if Quiet._tracing: Quiet._trace(TRACE_CALL, value)
+        return value + 1
+
+#
+#   OldQuiet
+#
+#   This is the way it was, the debug function is always the logger.
+#
+
+class OldQuiet:
+
+    _debug = logging.getLogger(__name__ + '.OldQuiet').debug
+
+    def debugged(self, value):
+        if _debug: OldQuiet._debug("debugged %r", value)
+        return value + 1
+
+#
+#   timed
+#
+
+def timed(fn, count):
+    """Return the nanoseconds per call."""
+    start = time.time()
+    for i in xrange(count):
+        fn(i)
+    return (time.time() - start) * 1e9 / count
+
+#
+#   __main__
+#
+
+try:
+    # parse the command line arguments
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int,
+        help="calls per test, default 1000000",
+        default=1000000,
+        )
+    args = parser.parse_args()
+
+    if _debug: _log.debug("initialization")
+    if _debug: _log.debug("    - args: %r", args)
+
+    quiet = Quiet()
+    old_quiet = OldQuiet()
+    results = []
+
+    results.append(("no statement", timed(quiet.plain, args.count)))
+    results.append(("debugging off", timed(quiet.debugged, args.count)))
+    results.append(("flag, off", timed(quiet.flagged, args.count)))
+
+    # the module is being debugged but these classes are not
+    _debug += 1
+    results.append(("class off, old", timed(old_quiet.debugged, args.count)))
+    results.append(("class off, new", timed(quiet.debugged, args.count)))
+    results.append(("class off, flag", timed(quiet.flagged, args.count)))
+    _debug -= 1
+
+    results.append(("tracing off", timed(quiet.traced, args.count)))
+    ring = TraceRing()
+    enable_tracing(__name__ + '.Quiet', ring)
+    results.append(("tracing on", timed(quiet.traced, args.count)))
+    disable_tracing(__name__ + '.Quiet')
+
+    baseline = results[0][1]
+    for label, nsec in results:
+        print "%-16s %8.1f ns/call %+8.1f ns" % (label, nsec, nsec - baseline)
+
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    _log.debug("finally")
@@ -0,0 +1,229 @@
+#!/usr/bin/python
+
+"""
+Multiple Process Scaling Benchmark - the ReadProperty requests per second
+a BACnet/IP server answers when it is split into worker processes that
+share the port with SO_REUSEPORT.  The client sends from a number of
+sockets so the kernel can spread the peers across the workers, keeping a
+window of requests outstanding on each one.
+"""
+
+import os
+import time
+import signal
+import socket
+import select
+
+from bacpypes.debugging import bacpypes_debugging, ModuleLogger
+from bacpypes.consolelogging import ArgumentParser
+
+from bacpypes.core import run, fork_workers
+from bacpypes.comm import bind
+from bacpypes.pdu import PDU
+
+from bacpypes.app import LocalDeviceObject, Application
+from bacpypes.appservice import StateMachineAccessPoint, ApplicationServiceAccessPoint
+from bacpypes.netservice import NetworkServiceAccessPoint, NetworkServiceElement
+from bacpypes.bvllservice import BIPSimple, AnnexJCodec, UDPMultiplexer
+from bacpypes.apdu import APDU, ReadPropertyRequest
+from bacpypes.object import AnalogValueObject
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+#
+#   WorkerApplication
+#
+
+@bacpypes_debugging
+class WorkerApplication(Application):
+
+    def __init__(self, localDevice, localAddress, aseID=None):
+        if _debug: WorkerApplication._debug("__init__ %r %r aseID=%r", localDevice, localAddress, aseID)
+        Application.__init__(self, localDevice, localAddress, aseID)
+
+        self.asap = ApplicationServiceAccessPoint()
+        self.smap = StateMachineAccessPoint(localDevice)
+        self.nsap = NetworkServiceAccessPoint()
+        self.nse = NetworkServiceElement()
+        bind(self.nse, self.nsap)
+        bind(self, self.asap, self.smap, self.nsap)
+
+        # the direct port is shared with the other processes
+        self.bip = BIPSimple()
+        self.annexj = AnnexJCodec()
+        self.mux = UDPMultiplexer(self.localAddress, batch=True, reuseport=True)
+        bind(self.bip, self.annexj, self.mux.annexJ)
+        self.nsap.bind(self.bip)
+
+#
+#   run_server
+#
+
+@bacpypes_debugging
+def run_server(address, workers):
+    """Fork the server with its workers and return the pid of the first
+    process."""
+    if _debug: run_server._debug("run_server %r %r", address, workers)
+
+    pid = os.fork()
+    if pid:
+        return pid
+
+    try:
+        this_device = LocalDeviceObject(
+            objectName='Benchmark Device',
+            objectIdentifier=('device', 599),
+            maxApduLengthAccepted=1024,
+            segmentationSupported='noSegmentation',
+            vendorIdentifier=15,
+            )
+        obj = AnalogValueObject(
+            objectIdentifier=('analogValue', 1),
+            objectName='AV-1',
+            presentValue=72.5,
+            )
+
+        fork_workers(workers)
+
+        this_application = WorkerApplication(this_device, address)
+        this_application.add_object(obj)
+
+        run()
+    finally:
+        os._exit(0)
+
+#
+#   request_packets
+#
+
+def request_packets():
+    """Return the BVLL datagrams of a ReadProperty request for each invoke
+    ID, as an original unicast NPDU expecting a reply."""
+    packets = []
+    for invoke_id in range(256):
+        request = ReadPropertyRequest(
+            objectIdentifier=('analogValue', 1),
+            propertyIdentifier='presentValue',
+            )
+        request.apduInvokeID = invoke_id
+        request.apduMaxResp = 1024
+
+        apdu = APDU()
+        request.encode(apdu)
+        pdu = PDU()
+        apdu.encode(pdu)
+
+        npdu = '\x01\x04' + pdu.pduData
+        packets.append('\x81\x0a' + chr((len(npdu) + 4) >> 8) + chr((len(npdu) + 4) & 0xFF) + npdu)
+
+    return packets
+
+#
+#   run_client
+#
+
+@bacpypes_debugging
+def run_client(address, clients, window, duration):
+    """Return the responses per second."""
+    if _debug: run_client._debug("run_client %r %r %r %r", address, clients, window, duration)
+
+    packets = request_packets()
+
+    sockets = []
+    for i in range(clients):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        sock.setblocking(0)
+        sockets.append(sock)
+
+    # fill the windows
+    invoke_ids = [0] * clients
+    for i, sock in enumerate(sockets):
+        for j in range(window):
+            sock.sendto(packets[invoke_ids[i]], address)
+            invoke_ids[i] = (invoke_ids[i] + 1) & 0xFF
+
+    # send another request for each response
+    index = dict((sock, i) for i, sock in enumerate(sockets))
+    responses = 0
+    start = time.time()
+    end = start + duration
+    while True:
+        now = time.time()
+        if now >= end:
+            break
+
+        readable, writable, errored = select.select(sockets, [], [], end - now)
+        for sock in readable:
+            try:
+                sock.recvfrom(2048)
+            except socket.error:
+                continue
+            responses += 1
+
+            i = index[sock]
+            sock.sendto(packets[invoke_ids[i]], address)
+            invoke_ids[i] = (invoke_ids[i] + 1) & 0xFF
+
+    for sock in sockets:
+        sock.close()
+
+    return responses / (time.time() - start)
+
+#
+#   __main__
+#
+
+try:
+    # parse the command line arguments
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=str,
+        help="comma separated numbers of processes, default 1,2,4",
+        default="1,2,4",
+        )
+    parser.add_argument('--clients', type=int,
+        help="number of client sockets, default 16",
+        default=16,
+        )
+    parser.add_argument('--window', type=int,
+        help="requests outstanding on each client socket, default 4",
+        default=4,
+        )
+    parser.add_argument('--duration', type=float,
+        help="seconds for each test, default 5",
+        default=5.0,
+        )
+    parser.add_argument('--port', type=int,
+        help="server port, default 47890",
+        default=47890,
+        )
+    args = parser.parse_args()
+
+    if _debug: _log.debug("initialization")
+    if _debug: _log.debug("    - args: %r", args)
+
+    address = ('127.0.0.1', args.port)
+
+    print "%-8s %12s" % ("workers", "requests/s")
+    for workers in [int(count) for count in args.workers.split(',')]:
+        pid = run_server('%s:%d' % address, workers)
+        try:
+            # give the processes time to bind
+            time.sleep(1.0)
+
+            rate = run_client(address, args.clients, args.window, args.duration)
+            print "%-8d %12.1f" % (workers, rate)
+        finally:
+            # the server passes it along to its workers
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+
+            # let the workers go too
+            time.sleep(0.5)
+
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    _log.debug("finally")
@@ -0,0 +1,89 @@
+#!/usr/bin/python
+
+"""
+Object List Benchmark - compare an array of object identifiers with the
+object list of a local device for building a large list, deleting some of
+the identifiers the way the application deletes an object, reading it one
+array index at a time and encoding the whole list.
+"""
+
+import time
+
+from bacpypes.debugging import bacpypes_debugging, ModuleLogger
+from bacpypes.consolelogging import ArgumentParser
+
+from bacpypes.primitivedata import ObjectIdentifier, EncodingTagList
+from bacpypes.constructeddata import ArrayOf
+from bacpypes.app import ObjectList
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+#
+#   run_tests
+#
+
+@bacpypes_debugging
+def run_tests(klass, count, deletes):
+    """Return the time each test takes with this kind of list."""
+    if _debug: run_tests._debug("run_tests %r %r %r", klass, count, deletes)
+
+    identifiers = [('analogValue', i + 1) for i in range(count)]
+    timings = []
+
+    # build the list
+    start = time.time()
+    object_list = klass()
+    for objid in identifiers:
+        object_list.append(objid)
+    timings.append(time.time() - start)
+
+    # delete some of them
+    start = time.time()
+    for objid in identifiers[::max(count // deletes, 1)][:deletes]:
+        del object_list[object_list.index(objid)]
+    timings.append(time.time() - start)
+
+    # read it one element at a time
+    start = time.time()
+    for i in range(1, object_list[0] + 1):
+        object_list[i]
+    timings.append(time.time() - start)
+
+    # encode it
+    start = time.time()
+    object_list.encode(EncodingTagList())
+    timings.append(time.time() - start)
+
+    return timings
+
+#
+#   __main__
+#
+
+try:
+    # parse the command line arguments
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int,
+        help="number of objects in the list, default 50000",
+        default=50000,
+        )
+    parser.add_argument('--deletes', type=int,
+        help="number of objects deleted, default 1000",
+        default=1000,
+        )
+    args = parser.parse_args()
+
+    if _debug: _log.debug("initialization")
+    if _debug: _log.debug("    - args: %r", args)
+
+    print "%-12s %10s %10s %10s %10s" % ("list", "append s", "delete s", "read s", "encode s")
+    for label, klass in (("array", ArrayOf(ObjectIdentifier)), ("object list", ObjectList)):
+        timings = run_tests(klass, args.count, args.deletes)
+        print "%-12s %10.4f %10.4f %10.4f %10.4f" % ((label,) + tuple(timings))
+
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    _log.debug("finally")
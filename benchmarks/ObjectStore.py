@@ -0,0 +1,90 @@
+#!/usr/bin/python
+
+"""
+Object Store Benchmark - compare finding the objects of one type, the
+objects in a range of instance numbers and the objects with names that
+start with something by looking at every object and by using the indexes
+of the object store.
+"""
+
+import time
+
+from bacpypes.debugging import bacpypes_debugging, ModuleLogger
+from bacpypes.consolelogging import ArgumentParser
+
+from bacpypes.object import AnalogInputObject, AnalogValueObject
+from bacpypes.objectstore import ObjectStore
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+#
+#   timed
+#
+
+@bacpypes_debugging
+def timed(fn, loops):
+    """Return the seconds per call."""
+    if _debug: timed._debug("timed %r %r", fn, loops)
+
+    start = time.time()
+    for i in xrange(loops):
+        fn()
+    return (time.time() - start) / loops
+
+#
+#   __main__
+#
+
+try:
+    # parse the command line arguments
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int,
+        help="number of objects of each type, default 50000",
+        default=50000,
+        )
+    parser.add_argument('--loops', type=int,
+        help="number of times to run each query, default 10",
+        default=10,
+        )
+    args = parser.parse_args()
+
+    if _debug: _log.debug("initialization")
+    if _debug: _log.debug("    - args: %r", args)
+
+    # build the objects
+    objs = []
+    for i in range(args.count):
+        objs.append(AnalogInputObject(objectIdentifier=('analogInput', i), objectName='AI-%06d' % (i,)))
+        objs.append(AnalogValueObject(objectIdentifier=('analogValue', i), objectName='AV-%06d' % (i,)))
+
+    store = ObjectStore()
+    start = time.time()
+    store.add_objects(objs)
+    print "add %d objects: %.4fs" % (len(objs), time.time() - start)
+
+    queries = [
+        ("analogInput objects",
+            lambda: [obj for obj in store.iter_objects() if obj.objectIdentifier[0] == 'analogInput'],
+            lambda: list(store.iter_objects_of_type('analogInput')),
+            ),
+        ("analogInput 100 to 199",
+            lambda: [obj for obj in store.iter_objects() if (obj.objectIdentifier[0] == 'analogInput') and (100 <= obj.objectIdentifier[1] <= 199)],
+            lambda: list(store.iter_objects_of_type('analogInput', 100, 199)),
+            ),
+        ("names AV-0001",
+            lambda: [obj for obj in store.iter_objects() if obj.objectName.startswith('AV-0001')],
+            lambda: list(store.iter_objects_with_prefix('AV-0001')),
+            ),
+        ]
+
+    print "%-24s %10s %10s" % ("query", "scan s", "index s")
+    for label, scan, index in queries:
+        assert len(scan()) == len(index())
+        print "%-24s %10.6f %10.6f" % (label, timed(scan, args.loops), timed(index, args.loops))
+
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    _log.debug("finally")
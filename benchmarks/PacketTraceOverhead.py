@@ -0,0 +1,102 @@
+#!/usr/bin/python
+
+"""
+Packet Trace Overhead Benchmark - compare the cost of recording a frame in
+the packet trace ring with decoding the same frame from the BVLL down to
+the APDU, which is the least the stack does with every packet it receives.
+"""
+
+import time
+
+from bacpypes.debugging import bacpypes_debugging, ModuleLogger
+from bacpypes.consolelogging import ArgumentParser
+
+from bacpypes.pdu import PDU
+from bacpypes.bvll import BVLPDU, bvl_pdu_types
+from bacpypes.npdu import NPDU
+from bacpypes.apdu import APDU, apdu_types, ConfirmedRequestPDU, confirmed_request_types
+from bacpypes.packettrace import PacketTrace, UDP_FRAME
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+# a ReadProperty request for the present value of analog value 1
+READ_PROPERTY = '\x81\x0a\x00\x11\x01\x04\x00\x05\x01\x0c\x0c\x00\x80\x00\x01\x19\x55'
+
+# addresses
+SOURCE = ('192.168.0.10', 47808)
+DESTINATION = ('192.168.0.11', 47808)
+
+#
+#   decode
+#
+
+def decode(data):
+    """Decode the frame through the layers."""
+    bvlpdu = BVLPDU()
+    bvlpdu.decode(PDU(data, source=SOURCE))
+    xpdu = bvl_pdu_types[bvlpdu.bvlciFunction]()
+    xpdu.decode(bvlpdu)
+
+    npdu = NPDU()
+    npdu.decode(xpdu)
+
+    apdu = APDU()
+    apdu.decode(npdu)
+    xpdu = ConfirmedRequestPDU()
+    xpdu.decode(apdu)
+    request = confirmed_request_types[xpdu.apduService]()
+    request.decode(xpdu)
+
+    return request
+
+#
+#   timed
+#
+
+@bacpypes_debugging
+def timed(fn, count):
+    """Return the nanoseconds per call."""
+    if _debug: timed._debug("timed %r %r", fn, count)
+
+    start = time.time()
+    for i in xrange(count):
+        fn()
+    return (time.time() - start) * 1e9 / count
+
+#
+#   __main__
+#
+
+try:
+    # parse the command line arguments
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int,
+        help="calls per test, default 100000",
+        default=100000,
+        )
+    parser.add_argument('--size', type=int,
+        help="packet trace size in octets, default 1048576",
+        default=1048576,
+        )
+    args = parser.parse_args()
+
+    if _debug: _log.debug("initialization")
+    if _debug: _log.debug("    - args: %r", args)
+
+    ring = PacketTrace(args.size)
+    off = PacketTrace(0)
+
+    decode_ns = timed(lambda: decode(READ_PROPERTY), args.count)
+    record_ns = timed(lambda: ring.frame(UDP_FRAME, SOURCE, DESTINATION, READ_PROPERTY), args.count)
+    off_ns = timed(lambda: off.frame(UDP_FRAME, SOURCE, DESTINATION, READ_PROPERTY), args.count)
+
+    print "%-16s %8.1f ns/packet" % ("decode", decode_ns)
+    print "%-16s %8.1f ns/packet %6.2f%%" % ("trace on", record_ns, record_ns * 100.0 / decode_ns)
+    print "%-16s %8.1f ns/packet %6.2f%%" % ("trace off", off_ns, off_ns * 100.0 / decode_ns)
+
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    _log.debug("finally")
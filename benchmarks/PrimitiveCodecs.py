@@ -0,0 +1,92 @@
+#!/usr/bin/python
+
+"""
+Primitive Codecs Benchmark - the time to encode a value of each of the
+primitive datatypes into a tag and to decode it from the tag, for a few
+values of each type that take a different number of octets.
+"""
+
+import time
+
+from bacpypes.debugging import bacpypes_debugging, ModuleLogger
+from bacpypes.consolelogging import ArgumentParser
+
+from bacpypes.primitivedata import Tag, Null, Boolean, Unsigned, Integer, \
+    Real, Double, OctetString, CharacterString, BitString, Enumerated, \
+    Date, Time, ObjectIdentifier
+from bacpypes.basetypes import StatusFlags, EngineeringUnits
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+# the types and values
+CODECS = [
+    ('Null', Null, [()]),
+    ('Boolean', Boolean, [False, True]),
+    ('Unsigned', Unsigned, [0, 1, 200, 40000, 7000000, 4000000000]),
+    ('Integer', Integer, [0, -1, 100, -30000, 8000000, -2000000000]),
+    ('Real', Real, [0.0, 72.5]),
+    ('Double', Double, [0.0, 72.5]),
+    ('OctetString', OctetString, ['\x01\x02\x03\x04']),
+    ('CharacterString', CharacterString, ['AV-1']),
+    ('BitString', StatusFlags, [[0, 0, 0, 0], [1, 0, 1, 0]]),
+    ('Enumerated', EngineeringUnits, ['degreesFahrenheit', 'noUnits']),
+    ('Enumerated', Enumerated, [0, 300]),
+    ('Date', Date, [(114, 3, 21, 5)]),
+    ('Time', Time, [(12, 30, 0, 0)]),
+    ('ObjectIdentifier', ObjectIdentifier, [('analogValue', 1), ('device', 4194302)]),
+    ]
+
+#
+#   timed
+#
+
+@bacpypes_debugging
+def timed(fn, count):
+    """Return the nanoseconds per call."""
+    if _debug: timed._debug("timed %r %r", fn, count)
+
+    start = time.time()
+    for i in xrange(count):
+        fn()
+    return (time.time() - start) * 1e9 / count
+
+#
+#   __main__
+#
+
+try:
+    # parse the command line arguments
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int,
+        help="calls per test, default 100000",
+        default=100000,
+        )
+    parser.add_argument('--type', action='append',
+        help="just this type, may be given more than once",
+        )
+    args = parser.parse_args()
+
+    if _debug: _log.debug("initialization")
+    if _debug: _log.debug("    - args: %r", args)
+
+    print "%-18s %-26s %10s %10s" % ("type", "value", "encode ns", "decode ns")
+    for name, klass, values in CODECS:
+        if args.type and (name not in args.type) and (klass.__name__ not in args.type):
+            continue
+
+        for value in values:
+            helper = klass(value)
+            tag = Tag()
+            helper.encode(tag)
+
+            encode_ns = timed(lambda: helper.encode(Tag()), args.count)
+            decode_ns = timed(lambda: klass(tag), args.count)
+
+            print "%-18s %-26s %10.1f %10.1f" % (klass.__name__, repr(value)[:26], encode_ns, decode_ns)
+
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    _log.debug("finally")
@@ -0,0 +1,106 @@
+#!/usr/bin/python
+
+"""
+Static Property Reads Benchmark - the time to read some of the properties
+of a device object that do not change into an Any and encode it into a
+ReadProperty ACK, when the encoding of the value is kept and when it is
+made again for each read.
+"""
+
+import time
+
+from bacpypes.debugging import bacpypes_debugging, ModuleLogger
+from bacpypes.consolelogging import ArgumentParser
+
+from bacpypes.app import LocalDeviceObject
+from bacpypes.basetypes import ServicesSupported
+from bacpypes.apdu import APDU, ReadPropertyACK
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+# the properties that are read
+PROPERTIES = [
+    'objectName',
+    'vendorName',
+    'propertyList',
+    'protocolServicesSupported',
+    'protocolObjectTypesSupported',
+    ]
+
+#
+#   read_property
+#
+
+@bacpypes_debugging
+def read_property(obj, propid):
+    """Read the property into an ACK and encode it."""
+    ack = ReadPropertyACK(
+        objectIdentifier=obj.objectIdentifier,
+        propertyIdentifier=propid,
+        propertyValue=obj.ReadPropertyToAny(propid),
+        )
+    ack.apduInvokeID = 1
+
+    apdu = APDU()
+    ack.encode(apdu)
+
+    return apdu
+
+#
+#   __main__
+#
+
+try:
+    # parse the command line arguments
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int,
+        help="reads of each property, default 10000",
+        default=10000,
+        )
+    args = parser.parse_args()
+
+    if _debug: _log.debug("initialization")
+    if _debug: _log.debug("    - args: %r", args)
+
+    # a device that supports a few services
+    services_supported = ServicesSupported()
+    services_supported['whoIs'] = 1
+    services_supported['readProperty'] = 1
+    services_supported['readPropertyMultiple'] = 1
+    services_supported['writeProperty'] = 1
+
+    this_device = LocalDeviceObject(
+        objectName='Benchmark Device',
+        objectIdentifier=('device', 599),
+        maxApduLengthAccepted=1024,
+        segmentationSupported='segmentedBoth',
+        vendorIdentifier=15,
+        vendorName='Benchmark Vendor',
+        protocolServicesSupported=services_supported.value,
+        protocolObjectTypesSupported=[1] * 50,
+        )
+
+    print "%-30s %12s %12s" % ("property", "encoded us", "not kept us")
+    for propid in PROPERTIES:
+        # the first read keeps the encoding
+        read_property(this_device, propid)
+
+        start = time.time()
+        for i in xrange(args.count):
+            read_property(this_device, propid)
+        encoded = (time.time() - start) * 1e6 / args.count
+
+        start = time.time()
+        for i in xrange(args.count):
+            this_device.clear_encoded(propid)
+            read_property(this_device, propid)
+        not_kept = (time.time() - start) * 1e6 / args.count
+
+        print "%-30s %12.1f %12.1f" % (propid, encoded, not_kept)
+
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    _log.debug("finally")
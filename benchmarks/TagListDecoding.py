@@ -0,0 +1,144 @@
+#!/usr/bin/python
+
+"""
+Tag List Decoding Benchmark - compare the time to decode a large objectList
+array and the list of results of a ReadPropertyMultiple ACK when the tags
+are consumed by removing them from the front of the list and the list is
+copied to back up, the way the tag list used to work, and by moving the
+index of the next tag along.  The tags are built once, the time is just the
+decoding from the tag list.
+"""
+
+import time
+
+from bacpypes.debugging import bacpypes_debugging, ModuleLogger
+from bacpypes.consolelogging import ArgumentParser
+
+from bacpypes.primitivedata import TagList, ObjectIdentifier, Real
+from bacpypes.constructeddata import ArrayOf, SequenceOf, Any
+from bacpypes.apdu import ReadAccessResult, ReadAccessResultElement, ReadAccessResultElementChoice
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+#
+#   ListTagList
+#
+#   This is the tag list as it was, popping a tag removes it from the front
+#   of the list, pushing one back builds a new list and the position is
+#   saved by copying the rest of the list.
+#
+
+class ListTagList(TagList):
+
+    def __len__(self):
+        return len(self.tagList)
+
+    def Peek(self):
+        if self.tagList:
+            return self.tagList[0]
+        return None
+
+    def push(self, tag):
+        self.tagList = [tag] + self.tagList
+
+    def Pop(self):
+        if self.tagList:
+            tag = self.tagList[0]
+            del self.tagList[0]
+            return tag
+        return None
+
+    def save_position(self):
+        return self.tagList[:]
+
+    def restore_position(self, position):
+        self.tagList = position
+
+#
+#   make_object_list
+#
+
+@bacpypes_debugging
+def make_object_list(count):
+    """Return the tags of an object list with count elements."""
+    if _debug: make_object_list._debug("make_object_list %r", count)
+
+    objectList = ArrayOf(ObjectIdentifier)([('analogValue', i + 1) for i in range(count)])
+
+    taglist = TagList()
+    objectList.encode(taglist)
+
+    return taglist.tagList
+
+#
+#   make_read_access_results
+#
+
+@bacpypes_debugging
+def make_read_access_results(count):
+    """Return the tags of a list of read access results, the present value
+    of count objects."""
+    if _debug: make_read_access_results._debug("make_read_access_results %r", count)
+
+    results = []
+    for i in range(count):
+        value = Any()
+        value.cast_in(Real(float(i)))
+
+        results.append(ReadAccessResult(
+            objectIdentifier=('analogValue', i + 1),
+            listOfResults=[ReadAccessResultElement(
+                propertyIdentifier='presentValue',
+                readResult=ReadAccessResultElementChoice(propertyValue=value),
+                )],
+            ))
+
+    taglist = TagList()
+    SequenceOf(ReadAccessResult)(results).encode(taglist)
+
+    return taglist.tagList
+
+#
+#   __main__
+#
+
+try:
+    # parse the command line arguments
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int,
+        help="number of objects in the list, default 5000",
+        default=5000,
+        )
+    parser.add_argument('--loops', type=int,
+        help="number of times to decode the list, default 5",
+        default=5,
+        )
+    args = parser.parse_args()
+
+    if _debug: _log.debug("initialization")
+    if _debug: _log.debug("    - args: %r", args)
+
+    for name, tags, klass in (
+            ("objectList", make_object_list(args.count), ArrayOf(ObjectIdentifier)),
+            ("RPM results", make_read_access_results(args.count), SequenceOf(ReadAccessResult)),
+            ):
+        for label, taglistClass in (("front removal", ListTagList), ("read index", TagList)):
+            elapsed = 0.0
+            for i in range(args.loops):
+                taglist = taglistClass(tags[:])
+
+                start = time.time()
+                value = klass()
+                value.decode(taglist)
+                elapsed += time.time() - start
+
+                assert len(taglist) == 0
+
+            print "%-12s %-16s %8d objects %10.6fs per list" % (name, label, args.count, elapsed / args.loops)
+
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    _log.debug("finally")
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+
+"""
+Virtual Objects Benchmark - compare the time and memory to add a lot of
+analog input objects to an application with the time and memory to add
+them as virtual objects, rows in the table of the object store that are
+only built into objects when they are asked for, and the time to read the
+present value of some of them.  The memory is how much the process grows,
+which for the virtual objects is mostly the rows being added, so the size
+of the table is also given.
+"""
+
+import time
+import resource
+
+from bacpypes.debugging import bacpypes_debugging, ModuleLogger
+from bacpypes.consolelogging import ArgumentParser
+
+from bacpypes.app import LocalDeviceObject, Application
+from bacpypes.object import AnalogInputObject
+from bacpypes.objectstore import VirtualObjectStore
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+#
+#   VirtualApplication
+#
+
+class VirtualApplication(Application):
+
+    objectStoreClass = VirtualObjectStore
+
+#
+#   max_rss
+#
+
+def max_rss():
+    """Return the most memory the process has used in kilobytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+#
+#   table_size
+#
+
+def table_size(table):
+    """Return the octets in the arrays and the names of a table."""
+    size = len(table.names)
+    for arry in (table.rowIdentifiers, table.values, table.nameStart, table.nameLength,
+            table.identifiers, table.rows, table.nameOrder):
+        size += arry.itemsize * len(arry)
+    return size
+
+#
+#   run_test
+#
+
+@bacpypes_debugging
+def run_test(klass, count, reads, virtual):
+    """Return the time to add the objects, the memory per object and the
+    time to read them."""
+    if _debug: run_test._debug("run_test %r %r %r %r", klass, count, reads, virtual)
+
+    this_device = LocalDeviceObject(
+        objectName='Benchmark Device',
+        objectIdentifier=('device', 599),
+        maxApduLengthAccepted=1024,
+        segmentationSupported='segmentedBoth',
+        vendorIdentifier=15,
+        )
+    this_application = klass(this_device, '127.0.0.1')
+
+    rss = max_rss()
+    start = time.time()
+    if virtual:
+        this_application.add_virtual_objects([
+            (('analogInput', i), 'AI-%07d' % (i,), float(i))
+            for i in xrange(count)
+            ])
+    else:
+        this_application.add_objects([
+            AnalogInputObject(objectIdentifier=('analogInput', i), objectName='AI-%07d' % (i,), presentValue=float(i))
+            for i in xrange(count)
+            ])
+    add_time = time.time() - start
+    per_object = (max_rss() - rss) * 1024.0 / count
+
+    start = time.time()
+    for i in xrange(0, count, max(count // reads, 1)):
+        this_application.get_object_id(('analogInput', i)).ReadPropertyToAny('presentValue')
+    read_time = time.time() - start
+
+    if virtual:
+        print "table %.1f octets/object" % (float(table_size(this_application.objectStore.table)) / count,)
+
+    return add_time, per_object, read_time
+
+#
+#   __main__
+#
+
+try:
+    # parse the command line arguments
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int,
+        help="number of objects, default 100000",
+        default=100000,
+        )
+    parser.add_argument('--reads', type=int,
+        help="number of objects read, default 10000",
+        default=10000,
+        )
+    args = parser.parse_args()
+
+    if _debug: _log.debug("initialization")
+    if _debug: _log.debug("    - args: %r", args)
+
+    # the memory high water mark only goes up, do the smaller one first
+    results = []
+    for label, klass, virtual in (("virtual", VirtualApplication, True), ("objects", Application, False)):
+        results.append((label,) + run_test(klass, args.count, args.reads, virtual))
+
+    print "%-10s %10s %14s %10s" % ("objects", "add s", "octets/object", "read s")
+    for result in results:
+        print "%-10s %10.3f %14.1f %10.3f" % result
+
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    _log.debug("finally")
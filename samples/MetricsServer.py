@@ -0,0 +1,71 @@
+#!/usr/bin/python
+
+"""
+This sample application is a BACnet device that also provides the metrics
+of the stack over HTTP in the Prometheus text format.  The HTTP server is
+an asyncore dispatcher like the UDP sockets so it runs in the same loop,
+there are no threads.  Point a Prometheus scraper or a browser at
+http://<host>:<port>/metrics.
+"""
+
+from bacpypes.debugging import bacpypes_debugging, ModuleLogger
+from bacpypes.consolelogging import ConfigArgumentParser
+
+from bacpypes.core import run
+
+from bacpypes.app import LocalDeviceObject, BIPSimpleApplication
+from bacpypes.metrics import MetricsServer
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+# globals
+this_device = None
+this_application = None
+this_server = None
+
+#
+#   __main__
+#
+
+try:
+    # parse the command line arguments
+    parser = ConfigArgumentParser(description=__doc__)
+    parser.add_argument('--host', type=str,
+        help="metrics address, default all interfaces",
+        default='',
+        )
+    parser.add_argument('--port', type=int,
+        help="metrics port, default 9100",
+        default=9100,
+        )
+    args = parser.parse_args()
+
+    if _debug: _log.debug("initialization")
+    if _debug: _log.debug("    - args: %r", args)
+
+    # make a device object
+    this_device = LocalDeviceObject(
+        objectName=args.ini.objectname,
+        objectIdentifier=int(args.ini.objectidentifier),
+        maxApduLengthAccepted=int(args.ini.maxapdulengthaccepted),
+        segmentationSupported=args.ini.segmentationsupported,
+        vendorIdentifier=int(args.ini.vendoridentifier),
+        )
+
+    # make a simple application
+    this_application = BIPSimpleApplication(this_device, args.ini.address)
+
+    # serve the metrics
+    this_server = MetricsServer((args.host, args.port))
+    if _debug: _log.debug("    - this_server: %r", this_server)
+
+    _log.debug("running")
+
+    run()
+
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    _log.debug("finally")
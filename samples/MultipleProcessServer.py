@@ -0,0 +1,148 @@
+#!/usr/bin/python
+
+"""
+This sample application spreads the work of a server across several
+processes.  The objects are created first and shared by the processes, then
+each process builds its own stack with a UDP socket bound to the same port
+using SO_REUSEPORT.  The kernel hashes each peer to one of the sockets so
+the requests from a client and the transactions that go with them stay in
+the same process.  Only the first process listens for broadcasts so there
+is one answer to a Who-Is.
+
+There are two limits.  Each process has its own copy of the objects, so
+the objects should not change: a WriteProperty is only seen by the process
+that got it, the others still have the old value.  And the broadcasts only
+come in on a socket of their own when the address has a mask, like
+192.168.0.10/24, without one every process gets each Who-Is and answers it.
+"""
+
+import os
+
+from bacpypes.debugging import bacpypes_debugging, ModuleLogger
+from bacpypes.consolelogging import ConfigArgumentParser
+
+from bacpypes import core
+from bacpypes.core import run, fork_workers
+from bacpypes.comm import bind
+from bacpypes.pdu import Address
+
+from bacpypes.app import LocalDeviceObject, Application
+from bacpypes.appservice import StateMachineAccessPoint, ApplicationServiceAccessPoint
+from bacpypes.netservice import NetworkServiceAccessPoint, NetworkServiceElement
+from bacpypes.bvllservice import BIPSimple, AnnexJCodec, UDPMultiplexer
+from bacpypes.object import AnalogValueObject
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+# globals
+this_device = None
+this_application = None
+
+#
+#   WorkerApplication
+#
+
+@bacpypes_debugging
+class WorkerApplication(Application):
+
+    def __init__(self, localDevice, localAddress, noBroadcast=False, aseID=None):
+        if _debug: WorkerApplication._debug("__init__ %r %r noBroadcast=%r aseID=%r", localDevice, localAddress, noBroadcast, aseID)
+        Application.__init__(self, localDevice, localAddress, aseID)
+
+        # include a application decoder
+        self.asap = ApplicationServiceAccessPoint()
+
+        # pass the device object to the state machine access point so it
+        # can know if it should support segmentation
+        self.smap = StateMachineAccessPoint(localDevice)
+
+        # a network service access point will be needed
+        self.nsap = NetworkServiceAccessPoint()
+
+        # give the NSAP a generic network layer service element
+        self.nse = NetworkServiceElement()
+        bind(self.nse, self.nsap)
+
+        # bind the top layers
+        bind(self, self.asap, self.smap, self.nsap)
+
+        # create a generic BIP stack, the direct port is shared with
+        # the other processes
+        self.bip = BIPSimple()
+        self.annexj = AnnexJCodec()
+        self.mux = UDPMultiplexer(self.localAddress, noBroadcast=noBroadcast, batch=True, reuseport=True)
+
+        # bind the bottom layers
+        bind(self.bip, self.annexj, self.mux.annexJ)
+
+        # bind the BIP stack to the network, no network number
+        self.nsap.bind(self.bip)
+
+#
+#   __main__
+#
+
+try:
+    # parse the command line arguments
+    parser = ConfigArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int,
+        help="number of processes, default 2",
+        default=2,
+        )
+    parser.add_argument('--objects', type=int,
+        help="number of analog value objects, default 100",
+        default=100,
+        )
+    args = parser.parse_args()
+
+    if _debug: _log.debug("initialization")
+    if _debug: _log.debug("    - args: %r", args)
+
+    # make a device object
+    this_device = LocalDeviceObject(
+        objectName=args.ini.objectname,
+        objectIdentifier=int(args.ini.objectidentifier),
+        maxApduLengthAccepted=int(args.ini.maxapdulengthaccepted),
+        segmentationSupported=args.ini.segmentationsupported,
+        vendorIdentifier=int(args.ini.vendoridentifier),
+        )
+
+    # without a mask every process answers the broadcasts
+    address = Address(args.ini.address)
+    if (args.workers > 1) and (address.addrTuple == address.addrBroadcastTuple):
+        _log.warning("the address has no mask, every process will answer a Who-Is")
+
+    # make the objects before the processes are forked so they are shared
+    objects = []
+    for i in range(args.objects):
+        objects.append(AnalogValueObject(
+            objectIdentifier=('analogValue', i + 1),
+            objectName='AV-%d' % (i + 1,),
+            presentValue=0.0,
+            ))
+
+    # split into worker processes, the first one gets the broadcasts
+    worker_index = fork_workers(args.workers)
+    if _debug: _log.debug("    - worker_index: %r, pid: %r", worker_index, os.getpid())
+
+    # make an application for this process
+    this_application = WorkerApplication(this_device, args.ini.address, noBroadcast=(worker_index != 0))
+
+    # add the objects
+    for obj in objects:
+        this_application.add_object(obj)
+
+    _log.debug("running")
+
+    run()
+
+    # wait for the workers to finish
+    for pid in core.workerPids:
+        os.waitpid(pid, 0)
+
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    _log.debug("finally")
@@ -12,8 +12,7 @@ from bacpypes.consolelogging import ConfigArgumentParser
 
 from bacpypes.core import run
 
-from bacpypes.primitivedata import Atomic, Real, Unsigned
-from bacpypes.constructeddata import Array, Any
+from bacpypes.primitivedata import Real
 from bacpypes.basetypes import ServicesSupported, ErrorType
 from bacpypes.apdu import ReadPropertyMultipleACK, ReadAccessResult, ReadAccessResultElement, ReadAccessResultElementChoice
 from bacpypes.app import LocalDeviceObject, BIPSimpleApplication
@@ -74,52 +73,6 @@ class RandomAnalogValueObject(AnalogValueObject):
 
 register_object_type(RandomAnalogValueObject)
 
-#
-#   ReadPropertyToAny
-#
-
-@bacpypes_debugging
-def ReadPropertyToAny(obj, propertyIdentifier, propertyArrayIndex=None):
-    """Read the specified property of the object, with the optional array index,
-    and cast the result into an Any object."""
-    if _debug: ReadPropertyToAny._debug("ReadPropertyToAny %s %r %r", obj, propertyIdentifier, propertyArrayIndex)
-
-    # get the datatype
-    datatype = obj.get_datatype(propertyIdentifier)
-    if _debug: ReadPropertyToAny._debug("    - datatype: %r", datatype)
-    if datatype is None:
-        raise ExecutionError(errorClass='property', errorCode='datatypeNotSupported')
-
-    # get the value
-    value = obj.ReadProperty(propertyIdentifier, propertyArrayIndex)
-    if _debug: ReadPropertyToAny._debug("    - value: %r", value)
-    if value is None:
-        raise ExecutionError(errorClass='property', errorCode='unknownProperty')
-
-    # change atomic values into something encodeable
-    if issubclass(datatype, Atomic):
-        value = datatype(value)
-    elif issubclass(datatype, Array) and (propertyArrayIndex is not None):
-        if propertyArrayIndex == 0:
-            value = Unsigned(value)
-        elif issubclass(datatype.subtype, Atomic):
-            value = datatype.subtype(value)
-        elif not isinstance(value, datatype.subtype):
-            raise TypeError, "invalid result datatype, expecting %s and got %s" \
-                % (datatype.subtype.__name__, type(value).__name__)
-    elif not isinstance(value, datatype):
-        raise TypeError, "invalid result datatype, expecting %s and got %s" \
-            % (datatype.__name__, type(value).__name__)
-    if _debug: ReadPropertyToAny._debug("    - encodeable value: %r", value)
-
-    # encode the value
-    result = Any()
-    result.cast_in(value)
-    if _debug: ReadPropertyToAny._debug("    - result: %r", result)
-
-    # return the object
-    return result
-
 #
 #   ReadPropertyToResultElement
 #
@@ -134,7 +87,7 @@ def ReadPropertyToResultElement(obj, propertyIdentifier, propertyArrayIndex=None
     read_result = ReadAccessResultElementChoice()
 
     try:
-        read_result.propertyValue = ReadPropertyToAny(obj, propertyIdentifier, propertyArrayIndex)
+        read_result.propertyValue = obj.ReadPropertyToAny(propertyIdentifier, propertyArrayIndex)
         if _debug: ReadPropertyToResultElement._debug("    - success")
     except PropertyError, error:
         if _debug: ReadPropertyToResultElement._debug("    - error: %r", error)
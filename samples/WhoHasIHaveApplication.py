@@ -58,6 +58,9 @@ class WhoHasIHaveApplication(BIPSimpleApplication):
         # count the times this has been received
         who_has_counter[key] += 1
 
+        # continue with the regular processing
+        BIPSimpleApplication.do_WhoHasRequest(self, apdu)
+
     def do_IHaveRequest(self, apdu):
         """Respond to a I-Have request."""
         if _debug: WhoHasIHaveApplication._debug("do_IHaveRequest %r", apdu)
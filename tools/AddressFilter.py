@@ -10,7 +10,7 @@ from bacpypes.debugging import Logging, function_debugging, ModuleLogger
 from bacpypes.consolelogging import ConsoleLogHandler
 
 from bacpypes.pdu import Address
-from bacpypes.analysis import trace, strftimestamp, Tracer
+from bacpypes.analysis import trace, trace_live, strftimestamp, Tracer
 
 # some debugging
 _debug = 0
@@ -116,9 +116,30 @@ try:
         if _debug: _log.debug("    - filterHost: %r", filterHost)
         del sys.argv[i:i+2]
 
-    # trace the file(s)
-    for fname in sys.argv[1:]:
-        trace(fname, [AddressFilterTracer])
+    # check for live capture, 'any' for all interfaces
+    if ('--live' in sys.argv):
+        i = sys.argv.index('--live')
+        live = sys.argv[i+1]
+        if _debug: _log.debug("    - live: %r", live)
+        del sys.argv[i:i+2]
+    else:
+        live = None
+
+    # check for parallel decoding
+    if ('--processes' in sys.argv):
+        i = sys.argv.index('--processes')
+        processes = int(sys.argv[i+1])
+        if _debug: _log.debug("    - processes: %r", processes)
+        del sys.argv[i:i+2]
+    else:
+        processes = None
+
+    # trace live traffic or the file(s)
+    if live:
+        trace_live(live, [AddressFilterTracer])
+    else:
+        for fname in sys.argv[1:]:
+            trace(fname, [AddressFilterTracer], processes)
 
 except KeyboardInterrupt:
     pass
@@ -0,0 +1,102 @@
+#!/usr/bin/python
+
+"""
+Columnar Export Filter - export a capture as a table and summarize the
+confirmed request rate and latency of each device
+"""
+
+import sys
+
+from bacpypes.debugging import Logging, function_debugging, ModuleLogger
+from bacpypes.consolelogging import ConsoleLogHandler
+
+from bacpypes.analysis import capture_to_columns, columns_to_numpy, columns_to_arrow
+
+import numpy
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+#
+#   summarize
+#
+
+@function_debugging
+def summarize(table):
+    """Print the request count, rate and latency percentiles of each
+    device that was sent confirmed requests."""
+    if _debug: summarize._debug("summarize ...")
+
+    requests = table[table['apduType'] == 0]
+    if not len(requests):
+        print "No requests"
+        return
+
+    # the length of the capture in minutes
+    minutes = max((table['timestamp'].max() - table['timestamp'].min()) / 60.0, 1.0 / 60.0)
+
+    print "%-24s %8s %8s %10s %10s %10s" % ("device", "requests", "/minute", "p50 ms", "p95 ms", "no reply")
+    for device in numpy.unique(requests['pduDestination']):
+        latency = requests['latency'][requests['pduDestination'] == device]
+        answered = latency[~numpy.isnan(latency)] * 1000.0
+
+        if len(answered):
+            p50, p95 = numpy.percentile(answered, [50, 95])
+        else:
+            p50 = p95 = float('nan')
+
+        print "%-24s %8d %8.1f %10.2f %10.2f %10d" % (device, len(latency), len(latency) / minutes,
+            p50, p95, len(latency) - len(answered))
+
+#
+#   __main__
+#
+
+try:
+    if ('--debug' in sys.argv):
+        indx = sys.argv.index('--debug')
+        for i in range(indx+1, len(sys.argv)):
+            ConsoleLogHandler(sys.argv[i])
+        del sys.argv[indx:]
+
+    if _debug: _log.debug("initialization")
+
+    # check for parallel decoding
+    if ('--processes' in sys.argv):
+        i = sys.argv.index('--processes')
+        processes = int(sys.argv[i+1])
+        if _debug: _log.debug("    - processes: %r", processes)
+        del sys.argv[i:i+2]
+    else:
+        processes = None
+
+    # check for an output file, .parquet or .npy
+    if ('--output' in sys.argv):
+        i = sys.argv.index('--output')
+        output = sys.argv[i+1]
+        if _debug: _log.debug("    - output: %r", output)
+        del sys.argv[i:i+2]
+    else:
+        output = None
+
+    # decode the file
+    columns = capture_to_columns(sys.argv[1], processes)
+    table = columns_to_numpy(columns)
+
+    # save it
+    if output and output.endswith('.parquet'):
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(columns_to_arrow(columns), output)
+    elif output:
+        numpy.save(output, table)
+
+    # print the summary
+    summarize(table)
+
+except KeyboardInterrupt:
+    pass
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    if _debug: _log.debug("finally")
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+
+"""
+Live Monitor - capture the traffic of an interface and periodically print
+the PDUs per minute, Who-Is storms and top talkers of a rolling window
+"""
+
+import sys
+
+from bacpypes.debugging import Logging, function_debugging, ModuleLogger
+from bacpypes.consolelogging import ConsoleLogHandler
+
+from bacpypes.analysis import trace_live, strftimestamp, RollingSummary
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+#
+#   print_summary
+#
+
+def print_summary(summary):
+    """Print the summary of the rolling window."""
+    print strftimestamp(summary['time']), "%d PDUs/min, %d Who-Is" % (summary['packetsPerMinute'], summary['whoIs'])
+    for source, count in summary['whoIsStorms']:
+        print "    Who-Is storm:", source, count
+    for source, count in summary['topTalkers']:
+        print "    %-24s %d" % (source, count)
+
+#
+#   __main__
+#
+
+try:
+    if ('--debug' in sys.argv):
+        indx = sys.argv.index('--debug')
+        for i in range(indx+1, len(sys.argv)):
+            ConsoleLogHandler(sys.argv[i])
+        del sys.argv[indx:]
+
+    if _debug: _log.debug("initialization")
+
+    # check for a custom window
+    if ('--window' in sys.argv):
+        i = sys.argv.index('--window')
+        window = int(sys.argv[i+1])
+        if _debug: _log.debug("    - window: %r", window)
+        del sys.argv[i:i+2]
+    else:
+        window = 60
+
+    # check for a custom period
+    if ('--period' in sys.argv):
+        i = sys.argv.index('--period')
+        period = int(sys.argv[i+1])
+        if _debug: _log.debug("    - period: %r", period)
+        del sys.argv[i:i+2]
+    else:
+        period = 10
+
+    # check for a Who-Is storm limit
+    if ('--whois' in sys.argv):
+        i = sys.argv.index('--whois')
+        whoIsLimit = int(sys.argv[i+1])
+        if _debug: _log.debug("    - whoIsLimit: %r", whoIsLimit)
+        del sys.argv[i:i+2]
+    else:
+        whoIsLimit = 100
+
+    # the interface, default is all of them
+    interface = sys.argv[1] if len(sys.argv) > 1 else None
+    if _debug: _log.debug("    - interface: %r", interface)
+
+    # publish every period until stopped
+    summary = RollingSummary(window, period, whoIsLimit=whoIsLimit, publisher=print_summary)
+    trace_live(interface, [], lazy=True, monitors=[summary])
+
+except KeyboardInterrupt:
+    pass
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    if _debug: _log.debug("finally")
@@ -10,7 +10,7 @@ from bacpypes.debugging import Logging, function_debugging, ModuleLogger
 from bacpypes.consolelogging import ConsoleLogHandler
 
 from bacpypes.pdu import Address
-from bacpypes.analysis import trace, strftimestamp, Tracer
+from bacpypes.analysis import trace, trace_live, strftimestamp, Tracer
 from bacpypes.apdu import ReadPropertyRequest, ReadPropertyACK
 
 try:
@@ -182,9 +182,30 @@ try:
     # start out with no unmatched requests
     requests = {}
 
-    # trace the file(s)
-    for fname in sys.argv[1:]:
-        trace(fname, [ReadPropertySummary])
+    # check for live capture, 'any' for all interfaces
+    if ('--live' in sys.argv):
+        i = sys.argv.index('--live')
+        live = sys.argv[i+1]
+        if _debug: _log.debug("    - live: %r", live)
+        del sys.argv[i:i+2]
+    else:
+        live = None
+
+    # check for parallel decoding
+    if ('--processes' in sys.argv):
+        i = sys.argv.index('--processes')
+        processes = int(sys.argv[i+1])
+        if _debug: _log.debug("    - processes: %r", processes)
+        del sys.argv[i:i+2]
+    else:
+        processes = None
+
+    # trace live traffic or the file(s)
+    if live:
+        trace_live(live, [ReadPropertySummary])
+    else:
+        for fname in sys.argv[1:]:
+            trace(fname, [ReadPropertySummary], processes)
 
     # print some stats at the end
     stats = Statistics()
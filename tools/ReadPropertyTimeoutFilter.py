@@ -160,8 +160,17 @@ try:
     # start out with no unmatched requests
     requests = {}
 
+    # check for parallel decoding
+    if ('--processes' in sys.argv):
+        i = sys.argv.index('--processes')
+        processes = int(sys.argv[i+1])
+        if _debug: _log.debug("    - processes: %r", processes)
+        del sys.argv[i:i+2]
+    else:
+        processes = None
+
     # trace the file
-    trace(sys.argv[1], [ReadPropertySummary])
+    trace(sys.argv[1], [ReadPropertySummary], processes)
 
     # dump the requests that failed
     for msg in traffic:
@@ -0,0 +1,108 @@
+#!/usr/bin/python
+
+"""
+Transaction Summary Filter - match the confirmed requests of every service
+with their responses and summarize the latency and retries of each device
+"""
+
+import sys
+
+from bacpypes.debugging import Logging, function_debugging, ModuleLogger
+from bacpypes.consolelogging import ConsoleLogHandler
+
+from bacpypes.analysis import match_transactions, strftimestamp, \
+    TransactionMatcher, LATENCY_BUCKETS
+
+# some debugging
+_debug = 0
+_log = ModuleLogger(globals())
+
+# globals
+showTimeouts = False
+
+#
+#   TimeoutMatcher
+#
+
+class TimeoutMatcher(TransactionMatcher, Logging):
+
+    def transaction_complete(self, txn):
+        if _debug: TimeoutMatcher._debug("transaction_complete %r", txn)
+
+        # print the requests that were never answered
+        if showTimeouts and (txn.responseType is None):
+            print strftimestamp(txn.requestTime), '\t', txn.client, '\t', txn.server, '\t', txn.service, '\t', txn.retries
+
+#
+#   __main__
+#
+
+try:
+    if ('--debug' in sys.argv):
+        indx = sys.argv.index('--debug')
+        for i in range(indx+1, len(sys.argv)):
+            ConsoleLogHandler(sys.argv[i])
+        del sys.argv[indx:]
+
+    if _debug: _log.debug("initialization")
+
+    # check for parallel decoding
+    if ('--processes' in sys.argv):
+        i = sys.argv.index('--processes')
+        processes = int(sys.argv[i+1])
+        if _debug: _log.debug("    - processes: %r", processes)
+        del sys.argv[i:i+2]
+    else:
+        processes = None
+
+    # check for a custom window
+    if ('--window' in sys.argv):
+        i = sys.argv.index('--window')
+        window = float(sys.argv[i+1])
+        if _debug: _log.debug("    - window: %r", window)
+        del sys.argv[i:i+2]
+    else:
+        window = 60.0
+
+    # check for listing the timeouts
+    if ('--timeouts' in sys.argv):
+        showTimeouts = True
+        sys.argv.remove('--timeouts')
+
+    # match the file(s), the statistics accumulate
+    matcher = TimeoutMatcher(window)
+    for fname in sys.argv[1:]:
+        match_transactions(fname, matcher, processes)
+
+    # dump the devices, slowest first
+    devices = sorted(matcher.devices.values(), key=lambda stats: stats.mean or 0.0, reverse=True)
+
+    print "%-24s %8s %8s %8s %8s %8s %8s %8s" % ("device", "requests", "retries", "timeouts", "errors", "mean ms", "p50 ms", "p95 ms")
+    for stats in devices:
+        mean = stats.mean
+        p50 = stats.percentile(50)
+        p95 = stats.percentile(95)
+
+        print "%-24s %8d %8d %8d %8d %8s %8s %8s" % (stats.address, stats.requests,
+            stats.retries, stats.timeouts, stats.errors + stats.rejects + stats.aborts,
+            "%.1f" % (mean * 1000,) if mean is not None else "-",
+            "<%g" % (p50 * 1000,) if p50 is not None else "-",
+            "<%g" % (p95 * 1000,) if p95 is not None else "-",
+            )
+
+    # dump the combined histogram
+    histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+    for stats in devices:
+        for i, count in enumerate(stats.histogram):
+            histogram[i] += count
+
+    print
+    for bound, count in zip(LATENCY_BUCKETS + (None,), histogram):
+        print "%10s %8d" % ("<%gms" % (bound * 1000,) if bound else "longer", count)
+
+except KeyboardInterrupt:
+    pass
+except Exception, e:
+    _log.exception("an error has occurred: %s", e)
+finally:
+    if _debug: _log.debug("finally")
@@ -138,6 +138,15 @@ try:
         if _debug: _log.debug("    - filterHost: %r", filterHost)
         del sys.argv[i:i+2]
 
+    # check for parallel decoding
+    if ('--processes' in sys.argv):
+        i = sys.argv.index('--processes')
+        processes = int(sys.argv[i+1])
+        if _debug: _log.debug("    - processes: %r", processes)
+        del sys.argv[i:i+2]
+    else:
+        processes = None
+
     # pcap_file
     pcap_file = sys.argv[1]
     if _debug: _log.debug("    - pcap_file: %r", pcap_file)
@@ -147,7 +156,7 @@ try:
     if _debug: _log.debug("    - filterDevice: %r:", filterDevice)
 
     # trace the file
-    trace(pcap_file, [WhoIsIAmDevice])
+    trace(pcap_file, [WhoIsIAmDevice], processes)
 
 except KeyboardInterrupt:
     pass
@@ -11,7 +11,7 @@ from bacpypes.debugging import Logging, function_debugging, ModuleLogger
 from bacpypes.consolelogging import ConsoleLogHandler
 
 from bacpypes.pdu import Address
-from bacpypes.analysis import trace, strftimestamp, Tracer
+from bacpypes.analysis import trace, trace_live, strftimestamp, Tracer, PacketFilter
 from bacpypes.apdu import WhoIsRequest, IAmRequest
 
 # some debugging
@@ -128,9 +128,34 @@ try:
         if _debug: _log.debug("    - filterHost: %r", filterHost)
         del sys.argv[i:i+2]
 
-    # trace the file(s)
-    for fname in sys.argv[1:]:
-        trace(fname, [WhoIsIAmSummary])
+    # check for live capture, 'any' for all interfaces
+    if ('--live' in sys.argv):
+        i = sys.argv.index('--live')
+        live = sys.argv[i+1]
+        if _debug: _log.debug("    - live: %r", live)
+        del sys.argv[i:i+2]
+    else:
+        live = None
+
+    # check for parallel decoding
+    if ('--processes' in sys.argv):
+        i = sys.argv.index('--processes')
+        processes = int(sys.argv[i+1])
+        if _debug: _log.debug("    - processes: %r", processes)
+        del sys.argv[i:i+2]
+    else:
+        processes = None
+
+    # trace live traffic or the file(s)
+    if live:
+        trace_live(live, [WhoIsIAmSummary],
+            prefilter=PacketFilter(apduClasses=[WhoIsRequest, IAmRequest]),
+            )
+    else:
+        for fname in sys.argv[1:]:
+            trace(fname, [WhoIsIAmSummary], processes,
+                prefilter=PacketFilter(apduClasses=[WhoIsRequest, IAmRequest]),
+                )
 
     # dump request counts
     print "----- Top 20 Who-Is -----"